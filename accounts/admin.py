@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
 
-from .models import Relation, Story
+from .models import Relation, Story, AccountDeletionJob
 from .forms import CustomUserCreationForm, CustomUserChangeForm
 
 
@@ -50,4 +50,12 @@ class RelationAdmin(admin.ModelAdmin):
 class StoryAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'created_at']
     list_filter = ['user', 'created_at']
-    search_fields = ['content']
\ No newline at end of file
+    search_fields = ['content']
+
+
+@admin.register(AccountDeletionJob)
+class AccountDeletionJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'username', 'status', 'step', 'deleted_count', 'get_throughput', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['username']
+    readonly_fields = ['user_id', 'step', 'deleted_count', 'started_at', 'finished_at']
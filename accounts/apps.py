@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from utils.caches import check_default_cache
+        from utils.sessions import check_session_cache
+
+        checks.register(check_default_cache, checks.Tags.caches)
+        checks.register(check_session_cache, checks.Tags.caches)
@@ -0,0 +1,113 @@
+import hashlib
+import logging
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .cache import bump_profile_generation
+
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+AVATAR_DIR = 'avatars'
+
+# extension -> (Pillow format, save options)
+AVATAR_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True}),
+}
+
+
+def get_avatar_name(avatar_hash, size, extension):
+    return f"{AVATAR_DIR}/{avatar_hash[:2]}/{avatar_hash}-{size}.{extension}"
+
+
+def get_avatar_size(size):
+    """The smallest generated size that is at least `size` pixels."""
+    for avatar_size in sorted(settings.AVATAR_SIZES):
+        if avatar_size >= size:
+            return avatar_size
+    return max(settings.AVATAR_SIZES)
+
+
+def save_variant(image, name, image_format, options, storage):
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def generate_avatar_variants(source, storage=default_storage):
+    """
+    Write square thumbnails of the image in `source` for every size in
+    AVATAR_SIZES and every format in AVATAR_FORMATS. Names are derived from
+    the content hash, so existing variants are reused and a new upload
+    never gets an old URL. Returns the hash.
+    """
+    data = source.read()
+    avatar_hash = hashlib.sha256(data).hexdigest()[:32]
+
+    with Image.open(BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+        for size in settings.AVATAR_SIZES:
+            thumbnail = None
+            for extension, (image_format, options) in AVATAR_FORMATS.items():
+                name = get_avatar_name(avatar_hash, size, extension)
+                if storage.exists(name):
+                    continue
+
+                if thumbnail is None:
+                    thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+                variant = thumbnail
+                if image_format == 'JPEG' and thumbnail.mode == 'RGBA':
+                    variant = Image.new('RGB', thumbnail.size, 'white')
+                    variant.paste(thumbnail, mask=thumbnail.getchannel('A'))
+                save_variant(variant, name, image_format, options, storage)
+
+    return avatar_hash
+
+
+def read_avatar_variants(user):
+    try:
+        with user.image.open('rb') as source:
+            return generate_avatar_variants(source)
+    except (OSError, ValueError):
+        logger.warning('Could not process the avatar of %s', user.username, exc_info=True)
+        return None
+
+
+def save_avatar_hash(user, avatar_hash):
+    # skipped if another image was uploaded in the meantime
+    updated = User.all_objects.filter(pk=user.pk, image=user.image.name).update(avatar_hash=avatar_hash)
+    if updated:
+        bump_profile_generation(user.pk)
+
+
+def process_avatar(user):
+    avatar_hash = read_avatar_variants(user)
+    if avatar_hash is not None:
+        save_avatar_hash(user, avatar_hash)
+    return avatar_hash
+
+
+def schedule_avatar_processing(user):
+    """
+    Call after saving a new image with an empty avatar_hash. The
+    process_avatars command picks it up, or the request itself after
+    commit in inline mode.
+    """
+    if settings.AVATAR_PROCESSING_INLINE and user.image:
+        transaction.on_commit(partial(process_avatar, user))
+
+
+def get_pending_avatars():
+    return User.objects.exclude(image='').exclude(image__isnull=True).filter(avatar_hash='')
@@ -0,0 +1,27 @@
+import time
+
+from django.core.cache import cache
+
+
+def get_profile_generation_key(user_id):
+    return f"accounts:profile_generation:{user_id}"
+
+
+def get_profile_generation(user_id):
+    """
+    Version of the cached profile fragments of a user. An evicted key
+    starts again from the current time, so stale fragments are never reused.
+    """
+    key = get_profile_generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_profile_generation(user_id):
+    try:
+        cache.incr(get_profile_generation_key(user_id))
+    except ValueError:
+        pass
@@ -0,0 +1,129 @@
+from collections import Counter
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from notifications.cache import forget_unread_counts
+from notifications.models import Notification, FanOutJob
+from posts.models import Post, Comment, Like, Save, TimelineEntry
+from search.backends import get_fts_connection, unindex_objects
+from utils.counters import update_counter
+from utils.deletion import delete_cascade
+from .cache import bump_profile_generation
+from .models import Relation, Story, AccountDeletionJob
+
+
+User = get_user_model()
+
+
+def delete_account(user):
+    """
+    Hide `user` everywhere right away and queue the purge of their data.
+    """
+    with transaction.atomic():
+        user.is_active = False
+        user.deleted_at = timezone.now()
+        user.save(update_fields=['is_active', 'deleted_at'])
+        job = AccountDeletionJob.objects.create(user_id=user.pk, username=user.username)
+
+    if settings.ACCOUNT_DELETION_INLINE:
+        transaction.on_commit(lambda: run_account_deletion_job(job))
+    return job
+
+
+def decrement_post_counters(field, post_ids):
+    for post_id, count in Counter(post_ids).items():
+        update_counter(Post, post_id, field, -count)
+
+
+def decrement_user_counters(field, user_ids):
+    for user_id, count in Counter(user_ids).items():
+        update_counter(User, user_id, field, -count)
+        transaction.on_commit(partial(bump_profile_generation, user_id))
+
+
+def forget_notified_unread_counts(user_ids):
+    transaction.on_commit(partial(forget_unread_counts, set(user_ids)))
+
+
+def unindex_posts(post_ids):
+    fts_connection = get_fts_connection(connection.alias)
+    if fts_connection is not None:
+        unindex_objects(Post, post_ids, fts_connection)
+
+
+def get_purge_steps(user_id):
+    """
+    (step, queryset, column, callback) for every table holding data of the
+    user, in purge order. `callback` gets the `column` values of each
+    deleted batch, to fix the counters that signals would have updated.
+    """
+    return [
+        ('timeline', TimelineEntry.objects.filter(user_id=user_id), None, None),
+        ('timeline_author', TimelineEntry.objects.filter(author_id=user_id), None, None),
+        ('received_notifications', Notification.objects.filter(to_user_id=user_id), None, None),
+        ('sent_notifications', Notification.objects.filter(from_user_id=user_id), 'to_user_id', forget_notified_unread_counts),
+        ('fanout_jobs', FanOutJob.objects.filter(from_user_id=user_id), None, None),
+        ('likes', Like.objects.filter(user_id=user_id), 'post_id', partial(decrement_post_counters, 'likes_count')),
+        ('comments', Comment.objects.filter(user_id=user_id), 'post_id', partial(decrement_post_counters, 'comments_count')),
+        ('saves', Save.objects.filter(user_id=user_id), 'post_id', partial(decrement_post_counters, 'saves_count')),
+        ('post_saves', Save.objects.filter(post__user_id=user_id), 'user_id', partial(decrement_user_counters, 'saved_posts_count')),
+        ('post_likes', Like.objects.filter(post__user_id=user_id), None, None),
+        ('post_comments', Comment.objects.filter(post__user_id=user_id), None, None),
+        ('following', Relation.objects.filter(from_user_id=user_id), 'to_user_id', partial(decrement_user_counters, 'followers_count')),
+        ('followers', Relation.objects.filter(to_user_id=user_id), 'from_user_id', partial(decrement_user_counters, 'following_count')),
+        ('stories', Story.objects.filter(user_id=user_id), None, None),
+        ('posts', Post.objects.filter(user_id=user_id), 'pk', unindex_posts),
+    ]
+
+
+def purge_batch(queryset, column, callback, batch_size):
+    rows = list(queryset.order_by('pk').values_list('pk', column or 'pk')[:batch_size])
+    if not rows:
+        return 0
+
+    delete_cascade(queryset.model.objects.filter(pk__in=[pk for pk, _ in rows]))
+    if callback is not None:
+        callback([value for _, value in rows])
+    return len(rows)
+
+
+def run_account_deletion_job(job, batch_size=None):
+    """
+    Delete the data of a deleted account table by table, in batches of
+    `batch_size` rows. Progress is saved with each batch, so an interrupted
+    job resumes at the table it was purging.
+    """
+    batch_size = batch_size or settings.ACCOUNT_DELETION_BATCH_SIZE
+
+    if job.status == 'pending':
+        job.status = 'running'
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+
+    steps = get_purge_steps(job.user_id)
+    step_names = [step for step, *_ in steps]
+    start = step_names.index(job.step) if job.step in step_names else 0
+
+    for step, queryset, column, callback in steps[start:]:
+        while True:
+            with transaction.atomic():
+                deleted = purge_batch(queryset, column, callback, batch_size)
+                job.step = step
+                job.deleted_count += deleted
+                job.save(update_fields=['step', 'deleted_count'])
+            if not deleted:
+                break
+
+    with transaction.atomic():
+        # only the user row and small tables (e.g. permissions) are left
+        deleted, _ = User.all_objects.filter(pk=job.user_id).delete()
+        job.status = 'done'
+        job.step = ''
+        job.deleted_count += deleted
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'step', 'deleted_count', 'finished_at'])
+    return job
@@ -98,19 +98,19 @@ class RegisterForm(BaseUserForm):
 
     def clean_username(self):
         username = self.cleaned_data.get('username')
-        if User.objects.filter(username=username).exists():
+        if User.all_objects.filter(username=username).exists():
             raise ValidationError('This username already exists')
         return username
     
     def clean_email(self):
         email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exists():
+        if User.all_objects.filter(email=email).exists():
             raise ValidationError('This email address already exists')
         return email
     
     def clean_phone_number(self):
         phone_number = self.cleaned_data.get('phone_number')
-        if User.objects.filter(phone_number=phone_number).exists():
+        if User.all_objects.filter(phone_number=phone_number).exists():
             raise ValidationError('This phone number already exists')
         return phone_number
     
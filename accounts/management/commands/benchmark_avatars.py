@@ -0,0 +1,49 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from accounts.avatars import AVATAR_FORMATS, generate_avatar_variants
+
+
+class Command(BaseCommand):
+    help = 'Measure avatar processing throughput with thread pools of different sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=100)
+        parser.add_argument('--size', type=int, default=1024, help='Width/height of the source images.')
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+
+    def handle(self, *args, **options):
+        size = options['size']
+        self.stdout.write(f"Generating {options['images']} {size}x{size} JPEG sources...")
+        sources = [self.make_source(size) for _ in range(options['images'])]
+        variants_per_image = len(settings.AVATAR_SIZES) * len(AVATAR_FORMATS)
+
+        for threads in options['threads']:
+            with tempfile.TemporaryDirectory() as location:
+                storage = FileSystemStorage(location=location)
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=threads) as executor:
+                    list(executor.map(lambda data: generate_avatar_variants(BytesIO(data), storage), sources))
+                elapsed = time.perf_counter() - started
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{threads} threads: {len(sources) / elapsed:.1f} images/s, "
+                    f"{len(sources) * variants_per_image / elapsed:.1f} variants/s ({elapsed:.2f}s)"
+                )
+            )
+
+    def make_source(self, size):
+        # random pixels, so every source has its own content hash
+        image = Image.frombytes('RGB', (size, size), os.urandom(size * size * 3))
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=90)
+        return buffer.getvalue()
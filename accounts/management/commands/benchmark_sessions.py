@@ -0,0 +1,119 @@
+import contextlib
+import io
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+from utils.benchmarks import get_default_host, get_viewer
+
+
+User = get_user_model()
+
+PROFILES = {
+    'db': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'MESSAGE_STORAGE': 'django.contrib.messages.storage.fallback.FallbackStorage',
+    },
+    'cache': {
+        'SESSION_ENGINE': settings.SESSION_ENGINE,
+        'MESSAGE_STORAGE': settings.MESSAGE_STORAGE,
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Walk through login, browsing, like/unlike, logout and the OTP password reset flow with the '
+        'database session engine and with the configured one, and report the queries per request '
+        '(all and on django_session) as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--viewer', help='Username to log in as (default: the user following the most people).')
+        parser.add_argument('--password', default='password', help='Password of the viewer (seed_social_graph default).')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+        parser.add_argument('--host', help='Host header to send (default: the first ALLOWED_HOSTS entry or localhost).')
+
+    def handle(self, *args, **options):
+        viewer = get_viewer(options['viewer'])
+        post = Post.objects.order_by('-pk').first()
+        if post is None:
+            raise CommandError('There are no posts, run seed_social_graph first.')
+
+        profiles = {}
+        for name, profile_settings in PROFILES.items():
+            with override_settings(**profile_settings):
+                profiles[name] = self.run_profile(viewer, post, options)
+
+        report = {
+            'viewer': viewer.username,
+            'iterations': options['iterations'],
+            'profiles': profiles,
+            'queries_saved_per_request': round(
+                profiles['db']['queries_per_request'] - profiles['cache']['queries_per_request'], 2
+            ),
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def get_steps(self, viewer, post, password):
+        return [
+            ('login', 'post', reverse('accounts:login'), lambda client: {'username': viewer.username, 'password': password}),
+            ('feed', 'get', reverse('posts:feed'), None),
+            ('explore', 'get', reverse('posts:posts'), None),
+            ('profile', 'get', viewer.get_profile_url(), None),
+            ('like', 'get', post.get_like_url(), None),
+            ('unlike', 'get', post.get_unlike_url(), None),
+            ('notifications', 'get', reverse('notifications:notifications'), None),
+            ('logout', 'get', reverse('accounts:logout'), None),
+            ('send_otp_code', 'post', reverse('accounts:send_otp_code'), lambda client: {'phone_number': viewer.phone_number}),
+            ('verify_otp_code', 'post', reverse('accounts:verify_otp_code'), lambda client: {'otp_code': client.session['otp_code']}),
+        ]
+
+    def run_profile(self, viewer, post, options):
+        steps = self.get_steps(viewer, post, options['password'])
+        counts = {name: {'requests': 0, 'queries': 0, 'session_queries': 0} for name, *_ in steps}
+
+        for _ in range(options['iterations']):
+            client = Client(SERVER_NAME=options['host'] or get_default_host())
+            for name, method, url, get_data in steps:
+                data = get_data(client) if get_data else None
+                # SendOTPCodeView prints the code
+                with CaptureQueriesContext(connection) as context, contextlib.redirect_stdout(io.StringIO()):
+                    response = getattr(client, method)(url, data, follow=True)
+                if response.status_code != 200:
+                    raise CommandError(f"{name} returned {response.status_code}")
+                counts[name]['requests'] += len(response.redirect_chain) + 1
+                counts[name]['queries'] += len(context)
+                counts[name]['session_queries'] += sum(
+                    '"django_session"' in query['sql'] for query in context.captured_queries
+                )
+
+        requests = sum(count['requests'] for count in counts.values())
+        return {
+            'queries_per_request': round(sum(count['queries'] for count in counts.values()) / requests, 2),
+            'session_queries_per_request': round(
+                sum(count['session_queries'] for count in counts.values()) / requests, 2
+            ),
+            'steps': {
+                name: {
+                    'requests': count['requests'] // options['iterations'],
+                    'queries': count['queries'] // options['iterations'],
+                    'session_queries': count['session_queries'] // options['iterations'],
+                }
+                for name, count in counts.items()
+            },
+        }
@@ -0,0 +1,89 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+from utils.benchmarks import get_default_host, get_viewer
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Request the main views through the test client and report latency percentiles and query counts as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--viewer', help='Username to log in as (default: the user following the most people).')
+        parser.add_argument('--search', default='python')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+        parser.add_argument('--host', help='Host header to send (default: the first ALLOWED_HOSTS entry or localhost).')
+
+    def handle(self, *args, **options):
+        viewer = get_viewer(options['viewer'])
+        popular_user = User.objects.order_by('-followers_count').first()
+        popular_post = Post.objects.order_by('-likes_count', '-comments_count').first()
+        if popular_post is None:
+            raise CommandError('There are no posts, run seed_social_graph first.')
+
+        client = Client(SERVER_NAME=options['host'] or get_default_host())
+        client.force_login(viewer)
+
+        urls = {
+            'feed': reverse('posts:feed'),
+            'explore': reverse('posts:posts'),
+            'explore_search': f"{reverse('posts:posts')}?search={options['search']}",
+            'people': reverse('accounts:people'),
+            'people_search': f"{reverse('accounts:people')}?search={options['search']}",
+            'profile': popular_user.get_profile_url(),
+            'followers': popular_user.get_followers_url(),
+            'following': viewer.get_following_url(),
+            'user_posts': popular_user.get_posts_url(),
+            'saved_posts': viewer.get_saved_posts_url(),
+            'post_detail': popular_post.get_absolute_url(),
+            'notifications': reverse('notifications:notifications'),
+        }
+
+        report = {
+            'viewer': viewer.username,
+            'iterations': options['iterations'],
+            'views': {name: self.measure(client, url, options['iterations']) for name, url in urls.items()},
+        }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def measure(self, client, url, iterations):
+        timings = []
+        queries = []
+        status = None
+
+        for _ in range(max(iterations, 2)):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(context))
+            status = response.status_code
+
+        percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+        return {
+            'url': url,
+            'status': status,
+            'p50_ms': round(percentiles[49], 2),
+            'p95_ms': round(percentiles[94], 2),
+            'p99_ms': round(percentiles[98], 2),
+            'queries': max(queries),
+        }
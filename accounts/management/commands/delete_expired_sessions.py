@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from utils.sessions import delete_expired_sessions_batch
+
+
+class Command(BaseCommand):
+    help = 'Delete expired logins from django_session in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.SESSION_SWEEP_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Keep sweeping on a schedule.')
+        parser.add_argument('--interval', type=float, default=60 * 60, help='Seconds between sweeps in loop mode.')
+
+    def handle(self, *args, **options):
+        while True:
+            self.sweep(options['batch_size'])
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def sweep(self, batch_size):
+        started = time.monotonic()
+        deleted_count = 0
+
+        while True:
+            deleted = delete_expired_sessions_batch(batch_size)
+            deleted_count += deleted
+            if deleted < batch_size:
+                break
+
+        elapsed = time.monotonic() - started
+        if deleted_count > 0:
+            self.stdout.write(
+                self.style.SUCCESS(f"{deleted_count} expired sessions deleted in {elapsed:.2f}s.")
+            )
+        else:
+            self.stdout.write(self.style.WARNING('There are no expired sessions.'))
@@ -1,32 +1,53 @@
-from datetime import timedelta
+import time
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils.translation import ngettext
-from django.utils import timezone
 
-from accounts.models import Story
+from accounts.stories import delete_expired_stories_batch
 
 
 class Command(BaseCommand):
     help = 'Delete Expired Stories'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.STORY_SWEEP_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Keep sweeping on a schedule.')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds between sweeps in loop mode.')
+
     def handle(self, *args, **options):
-        expired_time = timezone.now() - timedelta(hours=24)
-        deleted_count, _ = Story.objects.filter(
-            created_at__lt = expired_time
-        ).delete()
+        while True:
+            self.sweep(options['batch_size'])
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def sweep(self, batch_size):
+        started = time.monotonic()
+        deleted_count = notifications_count = 0
 
+        while True:
+            stories, notifications = delete_expired_stories_batch(batch_size)
+            deleted_count += stories
+            notifications_count += notifications
+            if stories < batch_size:
+                break
+
+        elapsed = time.monotonic() - started
         if deleted_count > 0:
             self.stdout.write(
                 self.style.SUCCESS(
                     ngettext(
-                        f"{deleted_count} expired story deleted.",
-                        f"{deleted_count} expired stories deleted.",
+                        f"{deleted_count} expired story deleted",
+                        f"{deleted_count} expired stories deleted",
                         deleted_count
                     )
+                    + f" with {notifications_count} notifications in {elapsed:.2f}s"
+                    f" ({int(deleted_count / elapsed) if elapsed else deleted_count} stories per second)."
                 )
             )
         else:
             self.stdout.write(
                 self.style.WARNING('There are no expired stories.')
-            )
\ No newline at end of file
+            )
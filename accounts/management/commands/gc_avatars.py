@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.avatars import AVATAR_DIR
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Delete avatar files (originals and variants) that no account uses anymore'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Only delete files older than this many seconds (uploads may not be committed yet).',
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        self.storage = default_storage
+        self.cutoff = timezone.now() - timedelta(seconds=options['min_age'])
+        self.dry_run = options['dry_run']
+
+        images = set(User.all_objects.exclude(image='').values_list('image', flat=True))
+        hashes = set(User.all_objects.exclude(avatar_hash='').values_list('avatar_hash', flat=True))
+
+        originals = self.collect('accounts', lambda name: name not in images)
+        variants = self.collect(AVATAR_DIR, lambda name: name.rsplit('/', 1)[1].split('-')[0] not in hashes)
+
+        verb = 'would be deleted' if self.dry_run else 'deleted'
+        if originals or variants:
+            self.stdout.write(
+                self.style.SUCCESS(f"{originals} original images and {variants} avatar variants {verb}.")
+            )
+        else:
+            self.stdout.write(self.style.WARNING('There are no orphaned avatar files.'))
+
+    def collect(self, root, is_orphan):
+        if not self.storage.exists(root):
+            return 0
+
+        deleted = 0
+        directories, _ = self.storage.listdir(root)
+        for directory in directories:
+            _, files = self.storage.listdir(f"{root}/{directory}")
+            for filename in files:
+                name = f"{root}/{directory}/{filename}"
+                if not is_orphan(name) or self.storage.get_modified_time(name) > self.cutoff:
+                    continue
+                if not self.dry_run:
+                    self.storage.delete(name)
+                deleted += 1
+        return deleted
@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from accounts.avatars import get_pending_avatars, read_avatar_variants, save_avatar_hash
+
+
+class Command(BaseCommand):
+    help = 'Generate the resized variants of newly uploaded avatars'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new avatars.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls in loop mode.')
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            while True:
+                self.process_pending(executor, options['batch_size'])
+
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+    def process_pending(self, executor, batch_size):
+        started = time.monotonic()
+        processed = failed = 0
+        last_pk = 0
+
+        while True:
+            users = list(get_pending_avatars().filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not users:
+                break
+            last_pk = users[-1].pk
+
+            # threads only resize and write files, the database is
+            # updated from this thread
+            for user, avatar_hash in zip(users, executor.map(read_avatar_variants, users)):
+                if avatar_hash is None:
+                    failed += 1
+                else:
+                    save_avatar_hash(user, avatar_hash)
+                    processed += 1
+
+        elapsed = time.monotonic() - started
+        if processed or failed:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{processed} avatars processed, {failed} failed in {elapsed:.2f}s "
+                    f"({round(processed / elapsed, 1) if elapsed else processed} per second)."
+                )
+            )
+        else:
+            self.stdout.write(self.style.WARNING('There are no pending avatars.'))
@@ -0,0 +1,46 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from accounts.models import Relation
+from posts.models import Post, Save
+from utils.counters import recount_counters
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Verify stored follower/following/post/saved counters of users and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drifted users, do not update them.',
+        )
+
+    def handle(self, *args, **options):
+        checked_count, drifted_count = recount_counters(
+            User,
+            {
+                'followers_count': (Relation, 'to_user'),
+                'following_count': (Relation, 'from_user'),
+                'posts_count': (Post, 'user'),
+                'saved_posts_count': (Save, 'user'),
+            },
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+
+        if drifted_count > 0:
+            action = 'found' if options['dry_run'] else 'repaired'
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{drifted_count} of {checked_count} users had drifted counters ({action})."
+                )
+            )
+        else:
+            self.stdout.write(
+                self.style.WARNING(f"All {checked_count} users have correct counters.")
+            )
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.deletion import run_account_deletion_job
+from accounts.models import AccountDeletionJob
+
+
+class Command(BaseCommand):
+    help = 'Purge the data of deleted accounts (resumes interrupted jobs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new jobs.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls in loop mode.')
+        parser.add_argument('--status', action='store_true', help='Only show progress of unfinished jobs.')
+
+    def handle(self, *args, **options):
+        if options['status']:
+            return self.show_status()
+
+        while True:
+            for job in AccountDeletionJob.objects.filter(status__in=['pending', 'running']):
+                job = run_account_deletion_job(job, batch_size=options['batch_size'])
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Job {job.pk}: {job.username} purged, {job.deleted_count} rows deleted "
+                        f"({job.get_throughput()} per second)."
+                    )
+                )
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def show_status(self):
+        jobs = AccountDeletionJob.objects.filter(status__in=['pending', 'running'])
+        if not jobs:
+            self.stdout.write(self.style.WARNING('There are no unfinished account deletions.'))
+        for job in jobs:
+            self.stdout.write(
+                f"Job {job.pk} [{job.status}] {job.username}: at {job.step or 'start'}, "
+                f"{job.deleted_count} rows deleted, {job.get_throughput()} per second"
+            )
@@ -0,0 +1,222 @@
+import itertools
+import random
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from accounts.models import Relation, Story
+from notifications.models import Notification
+from posts.models import Post, Comment, Like, Save, TimelineEntry
+
+
+User = get_user_model()
+
+WORDS = (
+    'django python social network post story like follow friend photo travel food music code '
+    'morning coffee weekend project release bug feature design city sunset book movie game'
+).split()
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic social graph (users, power-law follows, posts, comments, likes, saves, stories, notifications)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--avg-following', type=int, default=30)
+        parser.add_argument('--posts-per-user', type=int, default=5)
+        parser.add_argument('--comments-per-post', type=int, default=2)
+        parser.add_argument('--likes-per-post', type=int, default=5)
+        parser.add_argument('--saves-per-user', type=int, default=3)
+        parser.add_argument('--stories-per-user', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='seed', help='Username prefix, must be unique per run.')
+        parser.add_argument('--password', default='password')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        user_ids = self.create_users(options['users'], options['prefix'], options['password'])
+        # Zipf weights: a few accounts get most of the followers
+        weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(user_ids))))
+
+        self.create_follows(user_ids, weights, options['avg_following'])
+        post_ids = self.create_posts(user_ids, options['posts_per_user'])
+        self.create_post_activity(user_ids, weights, post_ids, options)
+        self.create_stories(user_ids, options['stories_per_user'])
+
+        self.stdout.write('Recounting counters and rebuilding indexes...')
+        call_command('recount_user_counters', stdout=self.stdout)
+        call_command('recount_post_counters', stdout=self.stdout)
+        self.fill_timelines(user_ids)
+        if 'search' in settings.INSTALLED_APPS:
+            call_command('rebuild_search_index', stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(f"Seeded {len(user_ids)} users."))
+
+    def insert(self, model, rows, label):
+        """
+        Stream `rows` (a generator of unsaved instances) into the table in
+        batches, each in its own transaction. Conflicting rows are skipped,
+        so the reported count is the number of rows actually added.
+        """
+        existing_count = model.objects.count()
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+        count = model.objects.count() - existing_count
+        self.stdout.write(f"{count} {label}")
+        return count
+
+    def pick(self, ids, weights, k):
+        return self.rng.choices(ids, cum_weights=weights, k=k)
+
+    def sentence(self, length):
+        return ' '.join(self.rng.choices(WORDS, k=length))
+
+    def create_users(self, count, prefix, password):
+        # the phone number repeats the username, which is unique per prefix
+        phone_max_length = User._meta.get_field('phone_number').max_length
+        if len(f"{prefix}_{count - 1}") > phone_max_length:
+            raise CommandError(
+                f"--prefix is too long, '{prefix}_{count - 1}' must fit in {phone_max_length} characters."
+            )
+
+        password = make_password(password)
+        self.insert(
+            User,
+            (
+                User(
+                    username=f"{prefix}_{i}",
+                    email=f"{prefix}_{i}@example.com",
+                    phone_number=f"{prefix}_{i}",
+                    first_name='Seed',
+                    last_name='User',
+                    bio=self.sentence(8),
+                    password=password,
+                )
+                for i in range(count)
+            ),
+            'users',
+        )
+        return list(
+            User.objects.filter(username__startswith=f"{prefix}_").order_by('pk').values_list('pk', flat=True)
+        )
+
+    def create_follows(self, user_ids, weights, avg_following):
+        def rows():
+            for user_id in user_ids:
+                following = self.rng.randint(0, avg_following * 2)
+                for target_id in set(self.pick(user_ids, weights, following)):
+                    if target_id != user_id:
+                        yield Relation(from_user_id=user_id, to_user_id=target_id)
+
+        self.insert(Relation, rows(), 'relations')
+        self.insert(
+            Notification,
+            (
+                Notification(
+                    from_user_id=from_user_id,
+                    to_user_id=to_user_id,
+                    notification_type='follow',
+                )
+                for from_user_id, to_user_id in Relation.objects.filter(
+                    from_user_id__in=user_ids,
+                ).values_list('from_user_id', 'to_user_id').iterator()
+            ),
+            'follow notifications',
+        )
+
+    def create_posts(self, user_ids, posts_per_user):
+        self.insert(
+            Post,
+            (
+                Post(user_id=user_id, body=self.sentence(self.rng.randint(5, 40)))
+                for user_id in user_ids
+                for _ in range(self.rng.randint(0, posts_per_user * 2))
+            ),
+            'posts',
+        )
+        return list(Post.objects.filter(user_id__in=user_ids).values_list('pk', 'user_id'))
+
+    def create_post_activity(self, user_ids, weights, posts, options):
+        self.insert(
+            Comment,
+            (
+                Comment(user_id=user_id, post_id=post_id, body=self.sentence(10))
+                for post_id, _ in posts
+                for user_id in self.pick(user_ids, weights, self.rng.randint(0, options['comments_per_post'] * 2))
+            ),
+            'comments',
+        )
+        self.insert(
+            Like,
+            (
+                Like(user_id=user_id, post_id=post_id)
+                for post_id, _ in posts
+                for user_id in set(self.pick(user_ids, weights, self.rng.randint(0, options['likes_per_post'] * 2)))
+            ),
+            'likes',
+        )
+        self.insert(
+            Save,
+            (
+                Save(user_id=user_id, post_id=post_id)
+                for user_id in user_ids
+                for post_id, _ in self.rng.sample(posts, min(len(posts), options['saves_per_user']))
+            ),
+            'saves',
+        )
+
+        authors = dict(posts)
+        for model, notification_type in ((Like, 'like'), (Comment, 'comment')):
+            self.insert(
+                Notification,
+                (
+                    Notification(
+                        from_user_id=user_id,
+                        to_user_id=authors[post_id],
+                        notification_type=notification_type,
+                        post_id=post_id,
+                    )
+                    for user_id, post_id in model.objects.filter(
+                        post_id__in=authors,
+                    ).values_list('user_id', 'post_id').iterator()
+                    if user_id != authors[post_id]
+                ),
+                f"{notification_type} notifications",
+            )
+
+    def create_stories(self, user_ids, stories_per_user):
+        self.insert(
+            Story,
+            (
+                Story(user_id=user_id, content=self.sentence(6))
+                for user_id in user_ids
+                for _ in range(stories_per_user)
+            ),
+            'stories',
+        )
+
+    def fill_timelines(self, user_ids):
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {qn(TimelineEntry._meta.db_table)} (user_id, post_id, author_id) "
+                f"SELECT r.from_user_id, p.id, p.user_id "
+                f"FROM {qn(Post._meta.db_table)} p "
+                f"JOIN {qn(Relation._meta.db_table)} r ON r.to_user_id = p.user_id "
+                f"JOIN {qn(User._meta.db_table)} u ON u.id = p.user_id "
+                f"WHERE u.followers_count < %s AND p.user_id BETWEEN %s AND %s",
+                [settings.FEED_CELEBRITY_FOLLOWERS_THRESHOLD, min(user_ids, default=0), max(user_ids, default=0)],
+            )
+            self.stdout.write(f"{cursor.rowcount} timeline entries")
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+def backfill_counters(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    Relation = apps.get_model('accounts', 'Relation')
+    Story = apps.get_model('accounts', 'Story')
+    Post = apps.get_model('posts', 'Post')
+    Save = apps.get_model('posts', 'Save')
+    CustomUser.objects.update(
+        followers_count=count_subquery(Relation, 'to_user'),
+        following_count=count_subquery(Relation, 'from_user'),
+        posts_count=count_subquery(Post, 'user'),
+        saved_posts_count=count_subquery(Save, 'user'),
+        stories_count=count_subquery(Story, 'user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_story'),
+        ('posts', '0004_post_counters'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='saved_posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='stories_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['-followers_count'], name='user_followers_count_idx'),
+        ),
+    ]
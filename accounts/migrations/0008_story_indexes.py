@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['created_at'], name='story_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['user', '-created_at'], name='story_user_created_idx'),
+        ),
+    ]
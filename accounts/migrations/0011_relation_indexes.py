@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_customuser_avatar_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='relation',
+            index=models.Index(fields=['to_user', 'from_user'], name='relation_to_from_idx'),
+        ),
+    ]
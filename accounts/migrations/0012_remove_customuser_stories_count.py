@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:34
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_relation_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='customuser',
+            name='stories_count',
+        ),
+    ]
@@ -1,13 +1,15 @@
 from datetime import timedelta
 
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.validators import FileExtensionValidator
 from django.conf import settings
 from django.urls import reverse
 from django.db import models
 from django.utils import timezone
 
+from notifications.cache import get_unread_count
 from posts.models import Post
+from utils.jobs import get_throughput
 from utils.paths import get_user_image_upload_path
 from utils.validators import (
     UsernameValidator,
@@ -19,6 +21,13 @@ from utils.validators import (
 User = settings.AUTH_USER_MODEL
 
 
+class CustomUserManager(UserManager):
+    # Deleted accounts are hidden (and cannot log in) until their data
+    # has been purged. Use CustomUser.all_objects to see them.
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class CustomUser(AbstractUser):
     username = models.CharField(
         max_length=150,
@@ -63,6 +72,8 @@ class CustomUser(AbstractUser):
         null=True,
         validators=[FileExtensionValidator(allowed_extensions=['png', 'jpg', 'jpeg', 'gif'])],
     )
+    # content hash of the processed image, see accounts.avatars
+    avatar_hash = models.CharField(max_length=64, blank=True)
     website_url = models.URLField(
         max_length=100,
         blank=True,
@@ -71,12 +82,25 @@ class CustomUser(AbstractUser):
         validators=[URLValidator()],
     )
 
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    posts_count = models.PositiveIntegerField(default=0)
+    saved_posts_count = models.PositiveIntegerField(default=0)
+
+    deleted_at = models.DateTimeField(blank=True, null=True)
+
+    objects = CustomUserManager()
+    all_objects = UserManager()
+
     REQUIRED_FIELDS = ['email', 'first_name', 'last_name', 'phone_number']
 
     class Meta:
         ordering = ['username']
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            models.Index(fields=['-followers_count'], name='user_followers_count_idx'),
+        ]
 
     def get_profile_url(self):
         return reverse('accounts:profile', args=[self.username])
@@ -96,11 +120,14 @@ class CustomUser(AbstractUser):
     def get_unfollow_url(self):
         return reverse('accounts:unfollow', args=[self.username])
 
+    def get_follow_api_url(self):
+        return reverse('accounts:api_follow', args=[self.username])
+
     def get_followers_count(self):
-        return self.followers.count()
+        return self.followers_count
 
     def get_following_count(self):
-        return self.following.count()
+        return self.following_count
 
     def get_followers(self):
         return CustomUser.objects.filter(following__to_user=self)
@@ -118,7 +145,7 @@ class CustomUser(AbstractUser):
         return reverse('posts:create_post')
     
     def get_posts_count(self):
-        return self.posts.count()
+        return self.posts_count
     
     def get_posts_url(self):
         return reverse('accounts:posts', args=[self.username])
@@ -127,19 +154,19 @@ class CustomUser(AbstractUser):
         return reverse('accounts:saved_posts', args=[self.username])
     
     def get_saved_posts_count(self):
-        return self.saved_posts.count()
+        return self.saved_posts_count
     
     def get_saved_posts(self):
         return Post.objects.filter(saves__user=self)
     
     def get_notifications_count(self):
-        return self.notifications.filter(is_read=False).count()
+        return get_unread_count(self)
     
     def get_create_story_url(self):
         return reverse('accounts:create_story', args=[self.username])
     
     def get_stories_count(self):
-        return self.stories.count()
+        return self.stories.active().count()
 
 
 class Relation(models.Model):
@@ -150,18 +177,44 @@ class Relation(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['from_user', 'to_user']
+        indexes = [
+            # followers of a user, covering for fan-out batches
+            models.Index(fields=['to_user', 'from_user'], name='relation_to_from_idx'),
+        ]
     
     def __str__(self):
         return f'{self.from_user} followed {self.to_user}'
 
 
+def get_story_expiry_time():
+    return timezone.now() - timedelta(seconds=settings.STORY_LIFETIME)
+
+
+class StoryQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(created_at__gte=get_story_expiry_time())
+
+    def expired(self):
+        return self.filter(created_at__lt=get_story_expiry_time())
+
+    def get_next_expiry(self):
+        created_at = self.active().order_by('created_at').values_list('created_at', flat=True).first()
+        return created_at and created_at + timedelta(seconds=settings.STORY_LIFETIME)
+
+
 class Story(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stories')
     content = models.TextField(max_length=120)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = StoryQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='story_created_at_idx'),
+            models.Index(fields=['user', '-created_at'], name='story_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.get_short_content()}"
@@ -170,7 +223,40 @@ class Story(models.Model):
         return (self.content[:20] + '...') if len(self.content) > 20 else self.content
     
     def is_expired(self):
-        return self.created_at < timezone.now() - timedelta(minutes=1)
+        return self.created_at < get_story_expiry_time()
     
     def get_delete_story_url(self):
-        return reverse('accounts:delete_story', args=[self.user.username, self.pk])
\ No newline at end of file
+        return reverse('accounts:delete_story', args=[self.user.username, self.pk])
+
+
+class AccountDeletionJob(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+    )
+
+    # not a foreign key, the job outlives the account
+    user_id = models.BigIntegerField()
+    username = models.CharField(max_length=150)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # name of the table being purged, the job resumes there
+    step = models.CharField(max_length=50, blank=True)
+    deleted_count = models.PositiveBigIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='deletion_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.username} {self.status}"
+
+    def get_throughput(self):
+        return get_throughput(self.deleted_count, self.started_at, self.finished_at)
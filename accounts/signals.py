@@ -0,0 +1,58 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from posts.models import Post, Save
+from utils.counters import update_counter
+from .cache import bump_profile_generation
+from .models import Relation, Story
+
+
+User = get_user_model()
+
+
+def get_user_counters(sender, instance):
+    if sender is Relation:
+        return [
+            (instance.to_user_id, 'followers_count'),
+            (instance.from_user_id, 'following_count'),
+        ]
+    if sender is Post:
+        return [(instance.user_id, 'posts_count')]
+    return [(instance.user_id, 'saved_posts_count')]
+
+
+@receiver(post_save, sender=Relation)
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Save)
+def increment_user_counters(sender, instance, created, **kwargs):
+    if created:
+        for user_id, field in get_user_counters(sender, instance):
+            update_counter(User, user_id, field, 1)
+            transaction.on_commit(partial(bump_profile_generation, user_id))
+
+
+@receiver(post_delete, sender=Relation)
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Save)
+def decrement_user_counters(sender, instance, **kwargs):
+    for user_id, field in get_user_counters(sender, instance):
+        update_counter(User, user_id, field, -1)
+        transaction.on_commit(partial(bump_profile_generation, user_id))
+
+
+@receiver(post_save, sender=Story)
+@receiver(post_delete, sender=Story)
+def bump_story_profile(sender, instance, **kwargs):
+    # the stories fragment is cached per profile generation
+    transaction.on_commit(partial(bump_profile_generation, instance.user_id))
+
+
+@receiver(post_save, sender=User)
+def bump_edited_profile(sender, instance, created, update_fields, **kwargs):
+    # last_login updates do not change the profile
+    if not created and update_fields != frozenset(['last_login']):
+        transaction.on_commit(partial(bump_profile_generation, instance.pk))
@@ -0,0 +1,40 @@
+from functools import partial
+
+from django.db import transaction
+
+from notifications.cache import forget_unread_counts
+from notifications.models import Notification, FanOutJob
+from utils.deletion import delete_rows
+from .cache import bump_profile_generation
+from .models import Story
+
+
+def delete_expired_stories_batch(batch_size):
+    """
+    Delete the oldest `batch_size` expired stories together with their
+    notifications and fan-out jobs. Returns (stories, notifications) deleted.
+    """
+    stories = list(
+        Story.objects.expired().order_by('created_at', 'pk').values_list('pk', 'user_id')[:batch_size]
+    )
+    if not stories:
+        return 0, 0
+
+    story_ids = [pk for pk, _ in stories]
+    with transaction.atomic():
+        unread_user_ids = list(
+            Notification.objects.filter(story_id__in=story_ids, is_read=False)
+            .order_by()
+            .values_list('to_user_id', flat=True)
+            .distinct()
+        )
+        notifications_deleted = delete_rows(Notification.objects.filter(story_id__in=story_ids))
+        delete_rows(FanOutJob.objects.filter(story_id__in=story_ids))
+        stories_deleted = delete_rows(Story.objects.filter(pk__in=story_ids))
+
+        # post_delete signals do not run for raw deletes
+        for user_id in {user_id for _, user_id in stories}:
+            transaction.on_commit(partial(bump_profile_generation, user_id))
+        transaction.on_commit(partial(forget_unread_counts, unread_user_ids))
+
+    return stories_deleted, notifications_deleted
@@ -0,0 +1,44 @@
+from django import template
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from accounts.avatars import get_avatar_name, get_avatar_size
+
+
+register = template.Library()
+
+
+def get_srcset(avatar_hash, extension):
+    return ', '.join(
+        f"{default_storage.url(get_avatar_name(avatar_hash, size, extension))} {size}w"
+        for size in sorted(settings.AVATAR_SIZES)
+    )
+
+
+@register.filter
+def avatar_url(user, size=128):
+    """
+    URL of the smallest JPEG variant of `user`'s avatar that is at least
+    `size` pixels, the original image while it is processed, or ''.
+    """
+    if user.avatar_hash:
+        return default_storage.url(get_avatar_name(user.avatar_hash, get_avatar_size(int(size)), 'jpg'))
+    if user.image:
+        return user.image.url
+    return ''
+
+
+@register.inclusion_tag('accounts/avatar.html')
+def avatar(user, size, css_class=''):
+    """
+    <picture> with WebP and JPEG srcsets, the browser picks the variant
+    that fits `size` CSS pixels on its screen.
+    """
+    return {
+        'user': user,
+        'size': size,
+        'css_class': css_class,
+        'src': avatar_url(user, size),
+        'webp_srcset': get_srcset(user.avatar_hash, 'webp') if user.avatar_hash else '',
+        'jpg_srcset': get_srcset(user.avatar_hash, 'jpg') if user.avatar_hash else '',
+    }
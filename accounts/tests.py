@@ -1,3 +1,713 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import io
+import json
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from notifications.models import FanOutJob, Notification
+from posts.models import Comment, Like, Post, Save, TimelineEntry
+from utils.caches import check_default_cache
+from utils.instrumentation import RequestMetrics, current_metrics
+from utils.routers import ReplicaRouter, RequestRouting, current_routing
+from utils.sessions import KEY_PREFIX, SessionStore, check_session_cache
+from utils.testing import create_user
+from . import deletion, stories, views
+from .avatars import get_avatar_name, process_avatar, save_avatar_hash
+from .deletion import delete_account, get_purge_steps, run_account_deletion_job
+from .models import AccountDeletionJob, Relation, Story
+from .forms import AccountEditForm
+from .templatetags.avatars import avatar_url
+from .toggles import follow_user, unfollow_user
+
+
+REPLICAS = ['replica1', 'replica2']
+
+
+class RecordingRouter(ReplicaRouter):
+    # records the decisions but keeps reading from the test database
+    reads = []
+
+    def db_for_read(self, model, **hints):
+        self.reads.append(super().db_for_read(model, **hints))
+        return DEFAULT_DB_ALIAS
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.routing = RequestRouting()
+        self.routing.replica_reads = True
+        self.token = current_routing.set(self.routing)
+
+    def tearDown(self):
+        current_routing.reset(self.token)
+
+    def test_replica_reads_use_one_replica_per_request(self):
+        replicas = {self.router.db_for_read(Post) for _ in range(20)}
+        self.assertEqual(len(replicas), 1)
+        self.assertIn(replicas.pop(), REPLICAS)
+
+    def test_reads_outside_requests_use_the_primary(self):
+        current_routing.set(None)
+        self.assertEqual(self.router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+    def test_reads_of_other_views_use_the_primary(self):
+        self.routing.replica_reads = False
+        self.assertEqual(self.router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+    def test_pinned_clients_read_from_the_primary(self):
+        self.routing.pinned = True
+        self.assertEqual(self.router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+    def test_reads_after_a_write_use_the_primary(self):
+        self.assertIn(self.router.db_for_read(Post), REPLICAS)
+        self.assertEqual(self.router.db_for_write(Post), DEFAULT_DB_ALIAS)
+        self.assertTrue(self.routing.wrote)
+        self.assertEqual(self.router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_reads_use_the_primary_without_replicas(self):
+        self.assertEqual(self.router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+    def test_replicas_are_not_migrated(self):
+        self.assertIs(self.router.allow_migrate('replica1', 'posts'), False)
+        self.assertIsNone(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'posts'))
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS, DATABASE_ROUTERS=['accounts.tests.RecordingRouter'])
+class ReplicaRoutingViewTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = create_user('alice')
+        self.bob = create_user('bob')
+        Relation.objects.create(from_user=self.bob, to_user=self.alice)
+        self.post = Post.objects.create(user=self.alice, body='hello')
+        self.client.force_login(self.bob)
+
+    def get_reads(self, method, url):
+        RecordingRouter.reads.clear()
+        response = getattr(self.client, method)(url)
+        self.assertLess(response.status_code, 400)
+        return response, list(RecordingRouter.reads)
+
+    def test_list_views_read_from_one_replica(self):
+        urls = [
+            reverse('posts:posts'),
+            reverse('accounts:people'),
+            self.alice.get_followers_url(),
+            self.bob.get_following_url(),
+            reverse('notifications:notifications'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                _, reads = self.get_reads('get', url)
+                replicas = set(reads) - {DEFAULT_DB_ALIAS}
+                self.assertEqual(len(replicas), 1)
+                self.assertTrue(replicas <= set(REPLICAS))
+
+    def test_other_views_read_from_the_primary(self):
+        for url in [self.post.get_absolute_url(), self.alice.get_profile_url()]:
+            with self.subTest(url=url):
+                _, reads = self.get_reads('get', url)
+                self.assertEqual(set(reads), {DEFAULT_DB_ALIAS})
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        response, _ = self.get_reads('post', self.post.get_like_api_url())
+        cookie = response.cookies['primary_pin']
+        self.assertEqual(cookie['max-age'], 10)
+
+        _, reads = self.get_reads('get', reverse('posts:posts'))
+        self.assertEqual(set(reads), {DEFAULT_DB_ALIAS})
+
+        # the cookie expired
+        del self.client.cookies['primary_pin']
+        _, reads = self.get_reads('get', reverse('posts:posts'))
+        self.assertTrue(set(reads) & set(REPLICAS))
+
+    def test_reads_do_not_pin_the_client(self):
+        response, _ = self.get_reads('get', reverse('posts:posts'))
+        self.assertNotIn('primary_pin', response.cookies)
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=1)
+class RequestInstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+
+    def setUp(self):
+        self.client.force_login(self.alice)
+
+    def get_records(self, url, level='INFO'):
+        with self.assertLogs('project.requests', level) as logs:
+            response = self.client.get(url)
+        return response, [json.loads(record.getMessage()) for record in logs.records]
+
+    def test_sampled_requests_are_logged(self):
+        response, [record] = self.get_records(reverse('posts:posts'))
+
+        self.assertEqual(record['view'], 'posts:posts')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        # the session, the unread count and the profile of the header
+        self.assertGreaterEqual(record['cache_hits'] + record['cache_misses'], 2)
+        self.assertIn(f'desc="{record["queries"]} queries"', response['Server-Timing'])
+        self.assertIn(
+            f'cache;desc="{record["cache_hits"]} hits, {record["cache_misses"]} misses"', response['Server-Timing'],
+        )
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_measured(self):
+        with self.assertNoLogs('project.requests'):
+            response = self.client.get(reverse('posts:posts'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(INSTRUMENTATION_QUERY_BUDGETS={'posts:posts': 1})
+    def test_query_budgets(self):
+        _, records = self.get_records(reverse('posts:posts'), 'WARNING')
+        self.assertEqual([record['event'] for record in records], ['query_budget_exceeded'])
+        self.assertEqual(records[0]['budget'], 1)
+
+    async def test_concurrent_requests_keep_their_own_metrics(self):
+        async def measure(lookups):
+            metrics = RequestMetrics()
+            token = current_metrics.set(metrics)
+            try:
+                for _ in range(lookups):
+                    await sync_to_async(cache.get)('missing')
+                    await asyncio.sleep(0)
+            finally:
+                current_metrics.reset(token)
+            return metrics.cache_misses
+
+        self.assertEqual(await asyncio.gather(measure(1), measure(3)), [1, 3])
+        self.assertIsNone(current_metrics.get())
+
+
+class CacheSessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+
+    def setUp(self):
+        caches[settings.SESSION_CACHE_ALIAS].clear()
+
+    def login(self):
+        response = self.client.post(reverse('accounts:login'), {'username': 'alice', 'password': 'password'})
+        self.assertEqual(response.status_code, 302)
+        return Session.objects.get()
+
+    def get_session_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, follow=True)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in context.captured_queries if '"django_session"' in query['sql']]
+
+    def test_only_the_login_is_written_to_the_database(self):
+        session = self.login()
+        self.assertEqual(session.get_decoded()[SESSION_KEY], str(self.alice.pk))
+        self.assertEqual(self.client.session[SESSION_KEY], str(self.alice.pk))
+
+        # messages are in a cookie, the session is read from the cache
+        self.assertEqual(self.get_session_queries(reverse('posts:posts')), [])
+        self.assertEqual(self.get_session_queries(reverse('notifications:notifications')), [])
+
+    def test_logins_survive_cache_eviction(self):
+        self.login()
+        caches[settings.SESSION_CACHE_ALIAS].clear()
+
+        self.assertEqual(len(self.get_session_queries(reverse('posts:posts'))), 1)
+        # loaded back into the cache
+        self.assertEqual(self.get_session_queries(reverse('posts:posts')), [])
+
+    def test_otp_codes_are_not_written_to_the_database(self):
+        # the view prints the code
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.client.post(reverse('accounts:send_otp_code'), {'phone_number': 'alice'})
+        self.assertIn('otp_code', self.client.session)
+        self.assertFalse(Session.objects.exists())
+
+    def test_logout_deletes_the_login(self):
+        self.login()
+        self.get_session_queries(reverse('accounts:logout'))
+        self.assertFalse(Session.objects.exists())
+
+    def test_active_logins_renew_their_row(self):
+        session = self.login()
+        expire_date = timezone.now() + timedelta(hours=1)
+        Session.objects.filter(pk=session.pk).update(expire_date=expire_date)
+        cache = caches[settings.SESSION_CACHE_ALIAS]
+        data, _ = cache.get(KEY_PREFIX + session.pk)
+        cache.set(KEY_PREFIX + session.pk, (data, expire_date))
+
+        store = SessionStore(session.pk)
+        store['theme'] = 'dark'
+        store.save()
+        session.refresh_from_db()
+        self.assertGreater(session.expire_date, timezone.now() + timedelta(days=1))
+        self.assertNotIn('theme', session.get_decoded())
+
+        # renewed once
+        with self.assertNumQueries(0):
+            store = SessionStore(session.pk)
+            store['theme'] = 'light'
+            store.save()
+
+    def test_process_local_session_cache_is_refused(self):
+        self.assertEqual(check_session_cache(None), [])
+        caches_setting = {**settings.CACHES, 'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=caches_setting):
+            self.assertEqual([error.id for error in check_session_cache(None)], ['utils.sessions.E001'])
+
+    def test_delete_expired_sessions(self):
+        session = self.login()
+        Session.objects.create(session_key='expired', session_data='', expire_date=timezone.now() - timedelta(days=1))
+
+        stdout = io.StringIO()
+        call_command('delete_expired_sessions', stdout=stdout)
+        self.assertIn('1 expired sessions deleted', stdout.getvalue())
+        self.assertQuerySetEqual(Session.objects.all(), [session])
+
+
+class OwnerGuardedViewQueryTests(TestCase):
+    """
+    The object a permission mixin resolves is reused by the view and the
+    signed in user is not looked up again.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        cls.bob = create_user('bob')
+
+    def setUp(self):
+        self.client.force_login(self.alice)
+        # the header's unread count is cached after the first page
+        self.client.get(reverse('posts:posts'))
+
+    def get_user_lookups(self, url):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        # rows loaded as users, not e.g. the lock notify() takes
+        return [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT "accounts_customuser"."id", "accounts_customuser"."password"')
+        ]
+
+    def test_edit_account(self):
+        # the signed in user
+        with self.assertNumQueries(1):
+            response = self.client.get(self.alice.get_edit_url())
+        self.assertEqual(response.status_code, 200)
+
+    def test_saved_posts(self):
+        # the signed in user and the page
+        with self.assertNumQueries(2):
+            response = self.client.get(self.alice.get_saved_posts_url())
+        self.assertEqual(response.status_code, 200)
+
+    def test_create_story(self):
+        # the signed in user, the story, the fan-out job and the savepoint
+        with self.assertNumQueries(5):
+            response = self.client.post(self.alice.get_create_story_url(), {'content': 'hello'})
+        self.assertRedirects(response, self.alice.get_profile_url(), fetch_redirect_response=False)
+        self.assertTrue(self.alice.stories.exists())
+
+    def test_access_denied(self):
+        # the signed in user and bob
+        with self.assertNumQueries(2):
+            response = self.client.get(self.bob.get_edit_url())
+        self.assertRedirects(response, reverse('social_network'), fetch_redirect_response=False)
+
+    def test_edit_account_keeps_concurrent_counter_updates(self):
+        is_valid = AccountEditForm.is_valid
+
+        def follow_then_validate(form):
+            follow_user(self.bob, self.alice)
+            return is_valid(form)
+
+        with mock.patch.object(AccountEditForm, 'is_valid', follow_then_validate):
+            self.client.post(self.alice.get_edit_url(), {
+                'username': 'alice', 'email': 'alice@example.com', 'first_name': 'Alice', 'last_name': 'A',
+                'phone_number': 'alice', 'bio': '', 'website_url': '',
+            })
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.first_name, 'Alice')
+        self.assertEqual(self.alice.followers_count, 1)
+
+    def test_delete_profile_image_keeps_concurrent_counter_updates(self):
+        resolve = views.get_resolved_user
+
+        def resolve_then_follow(request, username):
+            user = resolve(request, username)
+            follow_user(self.bob, self.alice)
+            return user
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            self.alice.image = SimpleUploadedFile('alice.jpg', b'image')
+            self.alice.save(update_fields=['image'])
+            with mock.patch.object(views, 'get_resolved_user', resolve_then_follow):
+                self.client.get(self.alice.get_delete_profile_image_url())
+        self.alice.refresh_from_db()
+        self.assertFalse(self.alice.image)
+        self.assertEqual(self.alice.followers_count, 1)
+
+    def test_follow(self):
+        # the signed in user and bob, the toggle only writes
+        self.assertEqual(len(self.get_user_lookups(self.bob.get_follow_url())), 2)
+        self.assertTrue(Relation.objects.filter(from_user=self.alice, to_user=self.bob).exists())
+
+
+class UnfollowTests(TestCase):
+    def test_unfollow_deletes_notifications_of_the_relation(self):
+        alice, bob = create_user('alice'), create_user('bob')
+        relation = Relation.objects.create(from_user=bob, to_user=alice)
+        # notifications created before grouping point at the relation
+        Notification.objects.create(from_user=bob, to_user=alice, notification_type='follow', relation=relation)
+
+        self.assertEqual(unfollow_user(bob, alice)[0], True)
+        connection.check_constraints()
+        self.assertFalse(Relation.objects.exists())
+        self.assertFalse(Notification.objects.filter(relation_id=relation.pk).exists())
+
+
+class RecountUserCountersTests(TestCase):
+    def test_drifted_counters_are_repaired(self):
+        alice, bob = create_user('alice'), create_user('bob')
+        Relation.objects.create(from_user=bob, to_user=alice)
+        post = Post.objects.create(user=alice, body='hello')
+        Save.objects.create(user=bob, post=post)
+        get_user_model().objects.update(followers_count=0, following_count=0, posts_count=0, saved_posts_count=0)
+        get_user_model().objects.filter(pk=bob.pk).update(following_count=1, saved_posts_count=1)
+        get_user_model().objects.filter(pk=alice.pk).update(followers_count=4, posts_count=0)
+
+        stdout = io.StringIO()
+        call_command('recount_user_counters', '--dry-run', stdout=stdout)
+        self.assertIn('1 of 2 users had drifted counters (found)', stdout.getvalue())
+        alice.refresh_from_db()
+        self.assertEqual(alice.followers_count, 4)
+
+        stdout = io.StringIO()
+        call_command('recount_user_counters', '--batch-size', '1', stdout=stdout)
+        self.assertIn('1 of 2 users had drifted counters (repaired)', stdout.getvalue())
+        alice.refresh_from_db()
+        self.assertEqual((alice.followers_count, alice.following_count, alice.posts_count), (1, 0, 1))
+
+        stdout = io.StringIO()
+        call_command('recount_user_counters', stdout=stdout)
+        self.assertIn('All 2 users have correct counters', stdout.getvalue())
+
+
+class FollowAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        cls.bob = create_user('bob')
+
+    def setUp(self):
+        self.client.force_login(self.alice)
+
+    def test_follow_and_unfollow(self):
+        response = self.client.post(self.bob.get_follow_api_url())
+        self.assertEqual(response.json(), {'followed': True, 'followers_count': 1})
+        self.assertTrue(Relation.objects.filter(from_user=self.alice, to_user=self.bob).exists())
+
+        # following twice keeps one relation
+        response = self.client.post(self.bob.get_follow_api_url())
+        self.assertEqual(response.json(), {'followed': True, 'followers_count': 1})
+
+        response = self.client.delete(self.bob.get_follow_api_url())
+        self.assertEqual(response.json(), {'followed': False, 'followers_count': 0})
+        self.assertFalse(Relation.objects.exists())
+
+    def test_errors(self):
+        response = self.client.post(reverse('accounts:api_follow', args=['nobody']))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': 'User not found'})
+
+        response = self.client.post(self.alice.get_follow_api_url())
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {'error': 'You cannot follow yourself'})
+
+        self.client.logout()
+        response = self.client.post(self.bob.get_follow_api_url())
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Relation.objects.exists())
+
+
+class ProfileFragmentCacheTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.alice = create_user('alice')
+        self.bob = create_user('bob')
+        self.client.force_login(self.alice)
+
+    def test_process_local_default_cache_is_refused(self):
+        self.assertEqual(check_default_cache(None), [])
+        caches_setting = {**settings.CACHES, 'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=caches_setting):
+            self.assertEqual([error.id for error in check_default_cache(None)], ['utils.caches.E001'])
+
+    def test_follows_update_the_counters(self):
+        self.assertContains(self.client.get(self.bob.get_profile_url()), 'Followers 0')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(self.bob.get_follow_url())
+        self.assertContains(self.client.get(self.bob.get_profile_url()), 'Followers 1')
+
+    def test_new_posts_update_the_counters(self):
+        self.assertContains(self.client.get(self.alice.get_profile_url()), 'Posts 0')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.alice.get_create_post_url(), {'body': 'hello'})
+        self.assertContains(self.client.get(self.alice.get_profile_url()), 'Posts 1')
+
+    def test_edits_update_the_card(self):
+        self.assertNotContains(self.client.get(self.alice.get_profile_url()), 'Alice')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.alice.get_edit_url(), {
+                'username': 'alice', 'email': 'alice@example.com', 'first_name': 'Alice', 'last_name': 'A',
+                'phone_number': 'alice', 'bio': '', 'website_url': '',
+            })
+        self.assertContains(self.client.get(self.alice.get_profile_url()), 'Alice')
+
+    def test_expired_stories_leave_the_cached_fragment(self):
+        Story.objects.create(user=self.alice, content='old news')
+        self.assertContains(self.client.get(self.alice.get_profile_url()), 'old news')
+
+        # the story expires without a write that bumps the profile generation
+        Story.objects.update(created_at=timezone.now() - timedelta(seconds=settings.STORY_LIFETIME + 1))
+        self.assertNotContains(self.client.get(self.alice.get_profile_url()), 'old news')
+
+
+class Interrupted(Exception):
+    pass
+
+
+class AccountDeletionTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = create_user('alice'), create_user('bob'), create_user('carol')
+        Relation.objects.create(from_user=self.alice, to_user=self.bob)
+        Relation.objects.create(from_user=self.carol, to_user=self.alice)
+        self.alice_post = Post.objects.create(user=self.alice, body='alice')
+        self.bob_post = Post.objects.create(user=self.bob, body='bob')
+        for user, post in [(self.alice, self.bob_post), (self.bob, self.alice_post)]:
+            Like.objects.create(user=user, post=post)
+            Comment.objects.create(user=user, post=post, body='hi')
+        Save.objects.create(user=self.alice, post=self.bob_post)
+        Save.objects.create(user=self.carol, post=self.alice_post)
+        Notification.objects.create(from_user=self.alice, to_user=self.bob, notification_type='follow')
+        Notification.objects.create(from_user=self.bob, to_user=self.alice, notification_type='like', post=self.alice_post)
+        Story.objects.create(user=self.alice, content='hello')
+        TimelineEntry.objects.create(user=self.bob, post=self.alice_post, author=self.alice)
+
+    def assertPurged(self, job):
+        connection.check_constraints()
+        self.assertEqual(job.status, 'done')
+        self.assertFalse(get_user_model().all_objects.filter(pk=self.alice.pk).exists())
+        self.bob.refresh_from_db()
+        self.carol.refresh_from_db()
+        self.bob_post.refresh_from_db()
+        self.assertEqual((self.bob.followers_count, self.bob.posts_count), (0, 1))
+        self.assertEqual((self.carol.following_count, self.carol.saved_posts_count), (0, 0))
+        self.assertEqual(
+            (self.bob_post.likes_count, self.bob_post.comments_count, self.bob_post.saves_count), (0, 0, 0),
+        )
+
+    def test_deleted_accounts_are_hidden_until_purged(self):
+        delete_account(self.alice)
+        self.client.force_login(self.bob)
+
+        self.assertFalse(get_user_model().objects.filter(pk=self.alice.pk).exists())
+        self.assertTrue(get_user_model().all_objects.filter(pk=self.alice.pk, is_active=False).exists())
+        self.assertEqual(self.client.get(self.alice.get_profile_url()).status_code, 404)
+        self.assertFalse(Post.objects.visible().filter(user=self.alice).exists())
+        self.assertFalse(self.client.login(username='alice', password='password'))
+
+    def test_tombstoned_usernames_cannot_register_again(self):
+        delete_account(self.alice)
+        response = self.client.post(reverse('accounts:register'), {
+            'username': 'alice', 'email': 'new@example.com', 'phone_number': '09120000000',
+            'first_name': 'Alice', 'last_name': 'A', 'password': 'secret', 'confirm_password': 'secret',
+        })
+        self.assertFormError(response.context['form'], 'username', 'This username already exists')
+
+    def test_purge_repairs_the_counters_of_other_users(self):
+        job = run_account_deletion_job(delete_account(self.alice), batch_size=1)
+        self.assertPurged(job)
+        # 13 rows and the user
+        self.assertEqual(job.deleted_count, 14)
+
+    def test_interrupted_jobs_resume_at_their_step(self):
+        job = delete_account(self.alice)
+        steps = [(name, str(queryset.query)) for name, queryset, *_ in get_purge_steps(self.alice.pk)]
+        purge_batch = deletion.purge_batch
+
+        for i, (step, sql) in enumerate(steps):
+            with self.subTest(step=step), transaction.atomic():
+                def interrupt(queryset, *args):
+                    if str(queryset.query) == sql:
+                        raise Interrupted
+                    return purge_batch(queryset, *args)
+
+                with mock.patch.object(deletion, 'purge_batch', interrupt), self.assertRaises(Interrupted):
+                    run_account_deletion_job(job, batch_size=1)
+                job.refresh_from_db()
+                self.assertEqual((job.status, job.step), ('running', steps[i - 1][0] if i else ''))
+
+                self.assertPurged(run_account_deletion_job(job, batch_size=1))
+                transaction.set_rollback(True)
+            job = AccountDeletionJob.objects.get(pk=job.pk)
+
+
+class ExpiredStorySweepTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        cls.bob = create_user('bob')
+
+    def create_story(self, age):
+        story = Story.objects.create(user=self.alice, content='hello')
+        Story.objects.filter(pk=story.pk).update(created_at=timezone.now() - timedelta(seconds=age))
+        Notification.objects.create(from_user=self.alice, to_user=self.bob, notification_type='story', story=story)
+        FanOutJob.objects.create(from_user=self.alice, notification_type='story', story=story)
+        return story
+
+    def sweep(self, batch_size):
+        stdout = io.StringIO()
+        batch = stories.delete_expired_stories_batch
+        with mock.patch(
+            'accounts.management.commands.delete_expired_stories.delete_expired_stories_batch', wraps=batch,
+        ) as delete_batch:
+            call_command('delete_expired_stories', '--batch-size', str(batch_size), stdout=stdout)
+        return stdout.getvalue(), delete_batch.call_count
+
+    def test_batches_delete_the_oldest_expired_stories(self):
+        expired = [self.create_story(settings.STORY_LIFETIME + age) for age in (30, 20, 10)]
+        active = self.create_story(0)
+
+        self.assertEqual(stories.delete_expired_stories_batch(2), (2, 2))
+        connection.check_constraints()
+        self.assertQuerySetEqual(Story.objects.order_by('created_at'), [expired[2], active])
+        self.assertFalse(FanOutJob.objects.filter(story__in=expired[:2]).exists())
+
+    def test_sweep_stops_after_a_short_batch(self):
+        for age in range(5):
+            self.create_story(settings.STORY_LIFETIME + age + 1)
+        active = self.create_story(0)
+
+        output, batches = self.sweep(2)
+        self.assertEqual(batches, 3)
+        self.assertIn('5 expired stories deleted with 5 notifications', output)
+        self.assertQuerySetEqual(Story.objects.all(), [active])
+        self.assertEqual(Notification.objects.get().story, active)
+
+    def test_sweep_stops_after_an_empty_batch(self):
+        for age in range(4):
+            self.create_story(settings.STORY_LIFETIME + age + 1)
+
+        output, batches = self.sweep(2)
+        self.assertEqual(batches, 3)
+        self.assertIn('4 expired stories deleted', output)
+
+    def test_nothing_to_sweep(self):
+        self.create_story(0)
+        output, batches = self.sweep(2)
+        self.assertEqual(batches, 1)
+        self.assertIn('There are no expired stories.', output)
+
+
+def create_image(color, size=(600, 400), image_format='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGBA', size, color).save(buffer, image_format)
+    return SimpleUploadedFile(f"avatar.{image_format.lower()}", buffer.getvalue())
+
+
+@override_settings(AVATAR_SIZES=(48, 128))
+class AvatarTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.alice = create_user('alice')
+
+    def upload(self, user, color):
+        user.image = create_image(color)
+        user.avatar_hash = ''
+        user.save(update_fields=['image', 'avatar_hash'])
+        return user
+
+    def test_variants_are_square_thumbnails_of_every_size_and_format(self):
+        # translucent, JPEG variants are flattened onto white
+        avatar_hash = process_avatar(self.upload(self.alice, (255, 0, 0, 128)))
+
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.avatar_hash, avatar_hash)
+        for size in (48, 128):
+            for extension, (image_format, mode) in {'webp': ('WEBP', 'RGBA'), 'jpg': ('JPEG', 'RGB')}.items():
+                with default_storage.open(get_avatar_name(avatar_hash, size, extension)) as variant:
+                    with Image.open(variant) as image:
+                        self.assertEqual((image.format, image.size, image.mode), (image_format, (size, size), mode))
+
+    def test_variant_names_are_content_hashed(self):
+        bob = create_user('bob')
+        red = process_avatar(self.upload(self.alice, 'red'))
+        with mock.patch('accounts.avatars.save_variant') as save_variant:
+            # the same picture uploaded again reuses the variants
+            self.assertEqual(process_avatar(self.upload(bob, 'red')), red)
+        save_variant.assert_not_called()
+
+        blue = process_avatar(self.upload(self.alice, 'blue'))
+        self.assertNotEqual(blue, red)
+        self.alice.refresh_from_db()
+        self.assertEqual(avatar_url(self.alice, 100), default_storage.url(get_avatar_name(blue, 128, 'jpg')))
+        self.assertEqual(avatar_url(self.alice, 600), default_storage.url(get_avatar_name(blue, 128, 'jpg')))
+
+    def test_originals_are_shown_while_processing(self):
+        self.upload(self.alice, 'red')
+        self.assertEqual(avatar_url(self.alice), self.alice.image.url)
+        self.assertEqual(avatar_url(create_user('bob')), '')
+
+    def test_hash_of_a_replaced_image_is_not_saved(self):
+        stale = get_user_model().objects.get(pk=self.upload(self.alice, 'red').pk)
+        self.upload(self.alice, 'blue')
+        save_avatar_hash(stale, 'stale')
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.avatar_hash, '')
+
+    def test_garbage_collection(self):
+        red = process_avatar(self.upload(self.alice, 'red'))
+        red_image = self.alice.image.name
+        blue = process_avatar(self.upload(self.alice, 'blue'))
+        self.alice.refresh_from_db()
+
+        def gc(*args):
+            stdout = io.StringIO()
+            call_command('gc_avatars', '--min-age', '0', *args, stdout=stdout)
+            return stdout.getvalue()
+
+        self.assertIn('1 original images and 4 avatar variants would be deleted', gc('--dry-run'))
+        self.assertTrue(default_storage.exists(red_image))
+        self.assertIn('1 original images and 4 avatar variants deleted', gc())
+        self.assertFalse(default_storage.exists(red_image))
+        self.assertFalse(default_storage.exists(get_avatar_name(red, 48, 'jpg')))
+        self.assertTrue(default_storage.exists(self.alice.image.name))
+        self.assertTrue(default_storage.exists(get_avatar_name(blue, 48, 'jpg')))
+        self.assertIn('There are no orphaned avatar files.', gc())
@@ -0,0 +1,49 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from notifications.grouping import notify
+from posts.feed import backfill_following, prune_following
+from utils.counters import update_counter, update_counter_returning
+from utils.deletion import delete_cascade
+from utils.upserts import insert_ignore
+from .cache import bump_profile_generation
+from .models import Relation
+
+
+User = get_user_model()
+
+# Same contract as posts.toggles: one INSERT ... ON CONFLICT DO NOTHING or
+# DELETE, counters kept here, returns (changed, followers_count).
+
+
+def bump_profile_generations(*user_ids):
+    for user_id in user_ids:
+        transaction.on_commit(partial(bump_profile_generation, user_id))
+
+
+def follow_user(from_user, to_user):
+    with transaction.atomic():
+        if not insert_ignore(Relation, from_user=from_user, to_user=to_user):
+            return False, to_user.followers_count
+
+        followers_count = update_counter_returning(User, to_user.pk, 'followers_count', 1)
+        update_counter(User, from_user.pk, 'following_count', 1)
+        bump_profile_generations(from_user.pk, to_user.pk)
+        notify(from_user, to_user, 'follow')
+        backfill_following(from_user, to_user)
+    return True, followers_count
+
+
+def unfollow_user(from_user, to_user):
+    with transaction.atomic():
+        # older follow notifications still point at the relation
+        if not delete_cascade(Relation.objects.filter(from_user=from_user, to_user=to_user)):
+            return False, to_user.followers_count
+
+        followers_count = update_counter_returning(User, to_user.pk, 'followers_count', -1)
+        update_counter(User, from_user.pk, 'following_count', -1)
+        bump_profile_generations(from_user.pk, to_user.pk)
+        prune_following(from_user, to_user)
+    return True, followers_count
@@ -15,6 +15,8 @@ urlpatterns = [
     path('verify-otp-code/', views.VerifyOTPCodeView.as_view(), name='verify_otp_code'),
     path('reset-password/', views.ResetPasswordView.as_view(), name='reset_password'),
     
+    path('api/<username>/follow/', views.FollowAPIView.as_view(), name='api_follow'),
+
     path('<username>/', views.ProfileView.as_view(), name='profile'),
 
     path('<username>/edit/', views.AccountEditView.as_view(), name='edit_account'),
@@ -1,21 +1,34 @@
 import random
 
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth import login, logout, authenticate, get_user_model
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
-from django.db.models import Q, Count
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 
-from notifications.models import Notification
-from utils.pagination import get_pagination_context
+from notifications.fanout import enqueue_fanout
+from search.backends import search_queryset, SEARCH_ORDERING
+from utils.pagination import get_cursor_pagination_context
 from utils.base import send_otp_code
 from utils.mixins import (
+    LoginRequiredMixin,
     AnonymousRequiredMixin,
     OwnerRequiredMixin,
     SelfForbiddenMixin,
+    ReplicaReadMixin,
+    get_resolved_user,
+    aget_resolved_user,
 )
+from utils.viewer_state import attach_post_viewer_state, attach_user_viewer_state
+from .avatars import schedule_avatar_processing
+from .cache import get_profile_generation
+from .deletion import delete_account
 from .models import Relation, Story
+from .toggles import follow_user, unfollow_user
 from .forms import (
     RegisterForm,
     LoginForm,
@@ -29,27 +42,22 @@ from .forms import (
 User = get_user_model()
 
 
-class PeopleView(LoginRequiredMixin, View):
+class PeopleView(LoginRequiredMixin, ReplicaReadMixin, View):
     template_name = 'accounts/people.html'
 
     def get(self, request):
-        # users = User.objects.all()
-        users = User.objects.annotate(
-            followers_count=Count('followers'),
-        ).order_by('-followers_count')
+        users = User.objects.all()
+        ordering = ('-followers_count', '-pk')
 
         if request.GET.get('search'):
             search = request.GET['search']
-            users = users.filter(
-                Q(username__icontains=search) |
-                Q(email__icontains=search) |
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(bio__icontains=search)
-            )
+            users = search_queryset(users, search)
+            ordering = SEARCH_ORDERING
 
+        page_obj = get_cursor_pagination_context(request, users, 10, ordering=ordering)
+        attach_user_viewer_state(request.user, page_obj)
         return render(request, self.template_name, {
-            'page_obj': get_pagination_context(request, users, 10),
+            'page_obj': page_obj,
         })
 
 
@@ -75,7 +83,7 @@ class RegisterView(AnonymousRequiredMixin, View):
             user.first_name = cd['first_name']
             user.last_name = cd['last_name']
             user.phone_number = cd['phone_number']
-            user.save()
+            user.save(update_fields=['first_name', 'last_name', 'phone_number'])
             messages.success(request, 'Successfully registered', 'info')
             return redirect('accounts:login')
         return render(request, self.template_name, {
@@ -193,7 +201,7 @@ class ResetPasswordView(AnonymousRequiredMixin, View):
 
             user = get_object_or_404(User, phone_number=phone_number)
             user.set_password(cd['password'])
-            user.save()
+            user.save(update_fields=['password'])
 
             del request.session['phone_number']
             del request.session['otp_code']
@@ -212,13 +220,22 @@ class ProfileView(LoginRequiredMixin, View):
     template_name = 'accounts/profile.html'
 
     def get(self, request, **kwargs):
-        user = get_object_or_404(User, username=kwargs['username'])
-        stories = user.stories.all()
-        is_followed = Relation.objects.filter(from_user=request.user, to_user=user).exists()
+        user = get_object_or_404(
+            User.objects.annotate(
+                is_followed=Exists(Relation.objects.filter(from_user=request.user, to_user=OuterRef('pk'))),
+            ),
+            username=kwargs['username'],
+        )
         return render(request, self.template_name, {
             'user': user,
-            'stories': stories,
-            'is_followed': is_followed,
+            # only evaluated when the cached fragment is rendered
+            'stories': user.stories.active(),
+            # the stories fragment is rendered again once the oldest one expires
+            'stories_expiry': user.stories.get_next_expiry(),
+            'is_followed': user.is_followed,
+            'is_owner': request.user == user,
+            'profile_generation': get_profile_generation(user.pk),
+            'profile_cache_timeout': settings.PROFILE_FRAGMENT_CACHE_TIMEOUT,
         })
 
 
@@ -226,12 +243,8 @@ class AccountEditView(LoginRequiredMixin, OwnerRequiredMixin, View):
     template_name = 'accounts/account_edit.html'
     form_class = AccountEditForm
 
-    def setup(self, request, *args, **kwargs):
-        self.user_instance = get_object_or_404(User, username=kwargs['username'])
-        return super().setup(request, *args, **kwargs)
-
     def get(self, request, **kwargs):
-        user = self.user_instance
+        user = get_resolved_user(request, kwargs['username'])
         return render(request, self.template_name, {
             'form': self.form_class(initial={
                 'username': user.username,
@@ -249,13 +262,13 @@ class AccountEditView(LoginRequiredMixin, OwnerRequiredMixin, View):
 
         if form.is_valid():
             cd = form.cleaned_data
-            user = self.user_instance
+            user = get_resolved_user(request, kwargs['username'])
 
-            if User.objects.filter(username=cd['username']).exclude(username=user.username).exists():
+            if User.all_objects.filter(username=cd['username']).exclude(username=user.username).exists():
                 form.add_error('username', 'This username already exists')
-            elif User.objects.filter(email=cd['email']).exclude(email=user.email).exists():
+            elif User.all_objects.filter(email=cd['email']).exclude(email=user.email).exists():
                 form.add_error('email', 'This email address already exists')
-            elif User.objects.filter(phone_number=cd['phone_number']).exclude(phone_number=cd['phone_number']).exists():
+            elif User.all_objects.filter(phone_number=cd['phone_number']).exclude(phone_number=cd['phone_number']).exists():
                 form.add_error('phone_number', 'This phone number already exists.')
             else:
                 user.username = cd['username']
@@ -265,11 +278,19 @@ class AccountEditView(LoginRequiredMixin, OwnerRequiredMixin, View):
                 user.phone_number = cd['phone_number']
                 user.bio = cd['bio']
                 user.website_url = cd['website_url']
+                # the counters may have changed since the user was loaded
+                update_fields = [
+                    'username', 'email', 'first_name', 'last_name', 'phone_number', 'bio', 'website_url',
+                ]
 
                 if cd['image'] is not None:
                     user.image = cd['image']
+                    user.avatar_hash = ''
+                    update_fields += ['image', 'avatar_hash']
 
-                user.save()
+                user.save(update_fields=update_fields)
+                if cd['image'] is not None:
+                    schedule_avatar_processing(user)
                 messages.success(request, 'Successfully edited account', 'info')
                 return redirect(user.get_profile_url())
             return render(request, self.template_name, {
@@ -279,10 +300,12 @@ class AccountEditView(LoginRequiredMixin, OwnerRequiredMixin, View):
 
 class ProfileImageDeleteView(LoginRequiredMixin, OwnerRequiredMixin, View):
     def get(self, request, **kwargs):
-        user = get_object_or_404(User, username=kwargs['username'])
+        user = get_resolved_user(request, kwargs['username'])
 
         if user.image:
-            user.image.delete()
+            user.avatar_hash = ''
+            user.image.delete(save=False)
+            user.save(update_fields=['image', 'avatar_hash'])
             messages.success(request, 'Successfully deleted profile image', 'info')
         return redirect(user.get_profile_url())
 
@@ -301,10 +324,11 @@ class AccountDeleteView(LoginRequiredMixin, OwnerRequiredMixin, View):
 
         if form.is_valid():
             cd = form.cleaned_data
-            user = get_object_or_404(User, username=kwargs['username'])
+            user = get_resolved_user(request, kwargs['username'])
             
             if user.username == cd['username']:
-                user.delete()
+                delete_account(user)
+                logout(request)
                 messages.success(request, 'Successfully deleted account', 'info')
                 return redirect('social_network')
             form.add_error('username', 'Wrong username')
@@ -314,75 +338,88 @@ class AccountDeleteView(LoginRequiredMixin, OwnerRequiredMixin, View):
 
 
 class FollowView(LoginRequiredMixin, SelfForbiddenMixin, View):
-    def get(self, request, **kwargs):
-        user = get_object_or_404(User, username=kwargs['username'])
+    async def get(self, request, **kwargs):
+        user = await aget_resolved_user(request, kwargs['username'])
 
-        if not Relation.objects.filter(from_user=request.user, to_user=user).exists():
-            relation = Relation.objects.create(from_user=request.user, to_user=user)
-            Notification.objects.create(
-                from_user=request.user,
-                to_user=user,
-                notification_type='follow',
-                relation=relation,
-            )
+        followed, _ = await sync_to_async(follow_user)(request.user, user)
+        if followed:
             messages.success(request, f"Successfully followed `{user.username}`", 'info')
         return redirect(user.get_profile_url())
 
 
 class UnfollowView(LoginRequiredMixin, SelfForbiddenMixin, View):
-    def get(self, request, **kwargs):
-        user = get_object_or_404(User, username=kwargs['username'])
-        relation = Relation.objects.filter(from_user=request.user, to_user=user)
-        
-        if relation.exists():
-            relation.delete()
+    async def get(self, request, **kwargs):
+        user = await aget_resolved_user(request, kwargs['username'])
+
+        unfollowed, _ = await sync_to_async(unfollow_user)(request.user, user)
+        if unfollowed:
             messages.success(request, f"Successfully unfollowed `{user.username}`", 'info')
         return redirect(user.get_profile_url())
 
 
-class FollowersView(LoginRequiredMixin, View):
+class FollowAPIView(LoginRequiredMixin, View):
+    """
+    POST follows and DELETE unfollows, both return the new state and the
+    followers count as JSON.
+    """
+    raise_exception = True
+
+    async def toggle(self, request, toggle, state):
+        user = await User.objects.filter(username=self.kwargs['username']).afirst()
+        if user is None:
+            return JsonResponse({'error': 'User not found'}, status=404)
+        if user == request.user:
+            return JsonResponse({'error': 'You cannot follow yourself'}, status=403)
+
+        _, followers_count = await sync_to_async(toggle)(request.user, user)
+        return JsonResponse({'followed': state, 'followers_count': followers_count})
+
+    async def post(self, request, **kwargs):
+        return await self.toggle(request, follow_user, True)
+
+    async def delete(self, request, **kwargs):
+        return await self.toggle(request, unfollow_user, False)
+
+
+class FollowersView(LoginRequiredMixin, ReplicaReadMixin, View):
     template_name = 'accounts/followers.html'
 
     def get(self, request, **kwargs):
         user = get_object_or_404(User, username=kwargs['username'])
         followers = user.get_followers()
+        ordering = ('username',)
 
         if request.GET.get('search'):
             search = request.GET['search']
-            followers = followers.filter(
-                Q(username__contains=search) |
-                Q(email__contains=search) |
-                Q(first_name__contains=search) |
-                Q(last_name__contains=search) |
-                Q(bio__contains=search)
-            )
+            followers = search_queryset(followers, search)
+            ordering = SEARCH_ORDERING
 
+        page_obj = get_cursor_pagination_context(request, followers, 10, ordering=ordering)
+        attach_user_viewer_state(request.user, page_obj)
         return render(request, self.template_name, {
             'user': user,
-            'page_obj': get_pagination_context(request, followers, 10),
+            'page_obj': page_obj,
         })
 
 
-class FollowingView(LoginRequiredMixin, View):
+class FollowingView(LoginRequiredMixin, ReplicaReadMixin, View):
     template_name = 'accounts/following.html'
 
     def get(self, request, **kwargs):
         user = get_object_or_404(User, username=kwargs['username'])
         following = user.get_following()
+        ordering = ('username',)
 
         if request.GET.get('search'):
             search = request.GET['search']
-            following = following.filter(
-                Q(username__icontains=search) |
-                Q(email__icontains=search) |
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(bio__icontains=search)
-            )
+            following = search_queryset(following, search)
+            ordering = SEARCH_ORDERING
 
+        page_obj = get_cursor_pagination_context(request, following, 10, ordering=ordering)
+        attach_user_viewer_state(request.user, page_obj)
         return render(request, self.template_name, {
             'user': user,
-            'page_obj': get_pagination_context(request, following, 10),
+            'page_obj': page_obj,
         })
 
 
@@ -391,19 +428,19 @@ class PostsView(LoginRequiredMixin, View):
 
     def get(self, request, **kwargs):
         user = get_object_or_404(User, username=kwargs['username'])
-        # posts = user.posts.all()
-        posts = user.posts.annotate(
-            likes_count=Count('likes'),
-            comments_count=Count('comments'),
-        ).order_by('-likes_count', '-comments_count', '-created_at')
+        posts = user.posts.all()
+        ordering = ('-likes_count', '-comments_count', '-created_at', '-pk')
 
         if request.GET.get('search'):
             search = request.GET['search']
-            posts = posts.filter(body__icontains=search)
+            posts = search_queryset(posts, search)
+            ordering = SEARCH_ORDERING
 
+        page_obj = get_cursor_pagination_context(request, posts, 10, ordering=ordering)
+        attach_post_viewer_state(request.user, page_obj)
         return render(request, self.template_name, {
             'user': user,
-            'page_obj': get_pagination_context(request, posts, 10),
+            'page_obj': page_obj,
         })
 
 
@@ -411,16 +448,20 @@ class SavedPostsView(LoginRequiredMixin, OwnerRequiredMixin, View):
     template_name = 'accounts/saved_posts.html'
 
     def get(self, request, **kwargs):
-        user = get_object_or_404(User, username=kwargs['username'])
-        posts = user.get_saved_posts()
+        user = get_resolved_user(request, kwargs['username'])
+        posts = user.get_saved_posts().visible().select_related('user')
+        ordering = ('-created_at', '-pk')
         
         if request.GET.get('search'):
             search = request.GET['search']
-            posts = posts.filter(body__icontains=search)
+            posts = search_queryset(posts, search)
+            ordering = SEARCH_ORDERING
 
+        page_obj = get_cursor_pagination_context(request, posts, 10, ordering=ordering)
+        attach_post_viewer_state(request.user, page_obj)
         return render(request, self.template_name, {
             'user': user,
-            'page_obj': get_pagination_context(request, posts, 10),
+            'page_obj': page_obj,
         })
 
 
@@ -437,24 +478,12 @@ class StoryCreateView(LoginRequiredMixin, OwnerRequiredMixin, View):
         form = self.form_class(request.POST)
 
         if form.is_valid():
-            user = get_object_or_404(User, username=kwargs['username'])
+            user = get_resolved_user(request, kwargs['username'])
             story = form.save(commit=False)
             story.user = user
-            story.save()
-
-            followers = user.get_followers()
-            
-            notifications = [
-                Notification(
-                    from_user=user,
-                    to_user=f,
-                    notification_type='story',
-                    story=story,
-                )
-                for f in followers
-            ]
-
-            Notification.objects.bulk_create(notifications)
+            with transaction.atomic():
+                story.save()
+                enqueue_fanout(user, 'story', story=story)
 
             messages.success(request, 'Successfully created story', 'info')
             return redirect(user.get_profile_url())
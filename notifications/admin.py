@@ -1,10 +1,21 @@
 from django.contrib import admin
 
-from .models import Notification
+from .models import Notification, FanOutJob
 
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ['id', 'from_user', 'to_user', 'notification_type', 'is_read', 'created_at']
     list_filter = ['from_user', 'to_user', 'notification_type', 'is_read', 'created_at']
-    search_fields = ['from_user__username', 'to_user__username']
\ No newline at end of file
+    search_fields = ['from_user__username', 'to_user__username']
+
+
+@admin.register(FanOutJob)
+class FanOutJobAdmin(admin.ModelAdmin):
+    list_display = [
+        'id', 'from_user', 'notification_type', 'status', 'sent_count',
+        'get_progress', 'get_throughput', 'created_at', 'finished_at',
+    ]
+    list_filter = ['notification_type', 'status', 'created_at']
+    search_fields = ['from_user__username']
+    readonly_fields = ['last_follower_id', 'sent_count', 'started_at', 'finished_at']
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+
+def get_unread_count_key(user_id):
+    return f"notifications:unread:{user_id}"
+
+
+def get_unread_count(user):
+    key = get_unread_count_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        # counted on the primary, a lagging replica would be cached
+        count = user.notifications.using(DEFAULT_DB_ALIAS).filter(is_read=False).count()
+        cache.set(key, count, settings.NOTIFICATIONS_UNREAD_CACHE_TIMEOUT)
+    return count
+
+
+def increment_unread_counts(user_ids, delta=1):
+    # Missing keys are left alone, the next read recounts them from the DB.
+    for user_id in user_ids:
+        try:
+            if cache.incr(get_unread_count_key(user_id), delta) < 0:
+                cache.delete(get_unread_count_key(user_id))
+        except ValueError:
+            pass
+
+
+def reset_unread_count(user_id):
+    cache.set(get_unread_count_key(user_id), 0, settings.NOTIFICATIONS_UNREAD_CACHE_TIMEOUT)
+
+
+def forget_unread_counts(user_ids):
+    cache.delete_many([get_unread_count_key(user_id) for user_id in user_ids])
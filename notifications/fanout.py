@@ -0,0 +1,113 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.models import Relation
+from posts.feed import fan_out_post
+from .cache import increment_unread_counts
+from .models import Notification, FanOutJob
+
+
+def enqueue_fanout(from_user, notification_type, post=None, story=None):
+    job = FanOutJob.objects.create(
+        from_user=from_user,
+        notification_type=notification_type,
+        post=post,
+        story=story,
+    )
+    if settings.NOTIFICATIONS_FANOUT_INLINE:
+        transaction.on_commit(lambda: run_fanout_job(job))
+    return job
+
+
+def get_follower_batch(job, batch_size):
+    follower_ids = (
+        Relation.objects.filter(to_user_id=job.from_user_id, from_user_id__gt=job.last_follower_id)
+        .order_by('from_user_id')
+        .values_list('from_user_id', flat=True)[:batch_size]
+    )
+    return list(follower_ids.iterator())
+
+
+def get_lease_expiry():
+    return timezone.now() + timedelta(seconds=settings.NOTIFICATIONS_FANOUT_LEASE)
+
+
+def get_claimable_jobs():
+    now = timezone.now()
+    return FanOutJob.objects.filter(
+        Q(status='pending')
+        | Q(status='running', lease_expires_at__lt=now)
+        | Q(status='running', lease_expires_at__isnull=True)
+    )
+
+
+def claim_fanout_job(job):
+    """
+    Mark `job` as running with a fresh lease, unless another worker holds
+    it. Returns whether this worker got it.
+    """
+    claimed = get_claimable_jobs().filter(pk=job.pk).update(
+        status='running',
+        started_at=Coalesce('started_at', timezone.now()),
+        lease_expires_at=get_lease_expiry(),
+    )
+    if claimed:
+        job.refresh_from_db()
+    return bool(claimed)
+
+
+def run_fanout_job(job, batch_size=None):
+    """
+    Notify the followers of `job.from_user` in batches of `batch_size`.
+    Progress is saved in the same transaction as each batch, so a crashed
+    job resumes after the last follower it notified once its lease
+    expires. Returns None when another worker runs the job.
+    """
+    batch_size = batch_size or settings.NOTIFICATIONS_FANOUT_BATCH_SIZE
+
+    if not claim_fanout_job(job):
+        return None
+
+    while True:
+        follower_ids = get_follower_batch(job, batch_size)
+        if not follower_ids:
+            break
+
+        with transaction.atomic():
+            # advances only from where this worker read the followers, a
+            # worker that took over the job after the lease expired wins
+            advanced = FanOutJob.objects.filter(pk=job.pk, last_follower_id=job.last_follower_id).update(
+                last_follower_id=follower_ids[-1],
+                sent_count=F('sent_count') + len(follower_ids),
+                lease_expires_at=get_lease_expiry(),
+            )
+            if not advanced:
+                return None
+
+            Notification.objects.bulk_create([
+                Notification(
+                    from_user_id=job.from_user_id,
+                    to_user_id=follower_id,
+                    notification_type=job.notification_type,
+                    post_id=job.post_id,
+                    story_id=job.story_id,
+                )
+                for follower_id in follower_ids
+            ])
+            if job.notification_type == 'post':
+                fan_out_post(job.post, follower_ids)
+
+            job.last_follower_id = follower_ids[-1]
+            job.sent_count += len(follower_ids)
+        increment_unread_counts(follower_ids)
+
+    job.status = 'done'
+    job.finished_at = timezone.now()
+    job.lease_expires_at = None
+    job.save(update_fields=['status', 'finished_at', 'lease_expires_at'])
+    return job
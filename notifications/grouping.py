@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from posts.models import Post
+from utils.upserts import insert_ignore
+from .models import Notification, NotificationActor
+
+
+User = get_user_model()
+
+GROUPED_TYPES = ('follow', 'like', 'comment')
+RECENT_ACTORS_LIMIT = 3
+
+
+def lock_group_target(to_user, post):
+    """
+    Make concurrent notify() calls for one target wait here instead of both
+    missing the group and inserting two. SQLite has no SELECT ... FOR
+    UPDATE, there a no-op UPDATE of the target takes the database write
+    lock for the rest of the transaction.
+    """
+    target = Post.objects.filter(pk=post.pk) if post is not None else User.objects.filter(pk=to_user.pk)
+    if connections[router.db_for_write(target.model)].features.has_select_for_update:
+        list(target.select_for_update().values_list('pk'))
+    else:
+        target.update(id=F('id'))
+
+
+def notify(from_user, to_user, notification_type, post=None):
+    """
+    Create a notification, or fold it into an unread notification of the
+    same type and target received within NOTIFICATIONS_GROUP_WINDOW
+    ("alice, bob and 41 others liked your post").
+    """
+    if notification_type not in GROUPED_TYPES:
+        return Notification.objects.create(
+            from_user=from_user,
+            to_user=to_user,
+            notification_type=notification_type,
+            post=post,
+            recent_actors=[from_user.username],
+        )
+
+    with transaction.atomic():
+        lock_group_target(to_user, post)
+        since = timezone.now() - timedelta(seconds=settings.NOTIFICATIONS_GROUP_WINDOW)
+        group = Notification.objects.filter(
+            to_user=to_user,
+            notification_type=notification_type,
+            post=post,
+            is_read=False,
+            created_at__gte=since,
+        ).order_by('-created_at').first()
+
+        if group is None:
+            group = Notification.objects.create(
+                from_user=from_user,
+                to_user=to_user,
+                notification_type=notification_type,
+                post=post,
+                recent_actors=[from_user.username],
+            )
+            NotificationActor.objects.create(notification=group, user=from_user)
+            return group
+
+        is_new_actor = insert_ignore(NotificationActor, notification=group, user=from_user)
+        recent_actors = [from_user.username] + [
+            username for username in group.recent_actors if username != from_user.username
+        ]
+        Notification.objects.filter(pk=group.pk).update(
+            from_user=from_user,
+            actors_count=F('actors_count') + int(is_new_actor),
+            recent_actors=recent_actors[:RECENT_ACTORS_LIMIT],
+            created_at=timezone.now(),
+        )
+    return group
@@ -0,0 +1,105 @@
+import gzip
+import os
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from notifications.retention import (
+    RetentionPolicy, compact_expired_batch, compact_user_batch, get_users_over_limit,
+)
+
+
+def optional_int(value):
+    return None if value.lower() == 'none' else int(value)
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete notifications past the retention policy (NOTIFICATIONS_KEEP_UNREAD_DAYS, '
+        'NOTIFICATIONS_KEEP_READ_DAYS and NOTIFICATIONS_MAX_PER_USER) in batches'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATIONS_COMPACTION_BATCH_SIZE)
+        parser.add_argument('--keep-unread-days', type=optional_int, default=settings.NOTIFICATIONS_KEEP_UNREAD_DAYS)
+        parser.add_argument('--keep-read-days', type=optional_int, default=settings.NOTIFICATIONS_KEEP_READ_DAYS)
+        parser.add_argument('--max-per-user', type=optional_int, default=settings.NOTIFICATIONS_MAX_PER_USER)
+        parser.add_argument(
+            '--archive', help='Append the deleted notifications as JSON lines to this gzip file.',
+        )
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--loop', action='store_true', help='Keep compacting on a schedule.')
+        parser.add_argument('--interval', type=float, default=60 * 60, help='Seconds between runs in loop mode.')
+
+    def handle(self, *args, **options):
+        policy = RetentionPolicy(
+            keep_unread_days=options['keep_unread_days'],
+            keep_read_days=options['keep_read_days'],
+            max_per_user=options['max_per_user'],
+        )
+        while True:
+            self.compact(policy, options)
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def compact(self, policy, options):
+        started = time.monotonic()
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        archive_path = None if dry_run else options['archive']
+        archive_size = self.get_file_size(archive_path)
+        free_bytes = self.get_free_bytes()
+
+        expired = over_limit = 0
+        with gzip.open(archive_path, 'at') if archive_path else nullcontext() as archive:
+            last_pk = 0
+            while last_pk is not None:
+                last_pk, deleted = compact_expired_batch(policy, last_pk, batch_size, archive, dry_run)
+                expired += deleted
+
+            for user_id, count in get_users_over_limit(policy):
+                if dry_run:
+                    over_limit += count - policy.max_per_user
+                    continue
+                while True:
+                    deleted = compact_user_batch(policy, user_id, batch_size, archive)
+                    over_limit += deleted
+                    if deleted < batch_size:
+                        break
+
+        elapsed = time.monotonic() - started
+        deleted = expired + over_limit
+        if not deleted:
+            self.stdout.write(self.style.WARNING('There are no notifications to compact.'))
+            return
+
+        verb = 'would be deleted' if dry_run else 'deleted'
+        message = (
+            f"{deleted} notifications {verb} ({expired} expired, {over_limit} over the per-user limit)"
+            f" in {elapsed:.2f}s ({int(deleted / elapsed) if elapsed else deleted} per second)."
+        )
+        if free_bytes is not None and not dry_run:
+            message += f" {self.get_free_bytes() - free_bytes} bytes reclaimed in the database."
+        if archive_path:
+            message += f" {self.get_file_size(archive_path) - archive_size} bytes archived to {archive_path}."
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def get_file_size(self, path):
+        return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+    def get_free_bytes(self):
+        # pages of deleted rows go to the SQLite freelist and are reused by
+        # later inserts, VACUUM returns them to the filesystem
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor != 'sqlite':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA freelist_count')
+            free_pages = cursor.fetchone()[0]
+            cursor.execute('PRAGMA page_size')
+            return free_pages * cursor.fetchone()[0]
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.fanout import get_claimable_jobs, run_fanout_job
+from notifications.models import FanOutJob
+
+
+class Command(BaseCommand):
+    help = 'Send post/story notifications of pending fan-out jobs to followers (resumes interrupted jobs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new jobs.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls in loop mode.')
+        parser.add_argument('--status', action='store_true', help='Only show progress of unfinished jobs.')
+
+    def handle(self, *args, **options):
+        if options['status']:
+            return self.show_status()
+
+        while True:
+            for job in get_claimable_jobs().select_related('from_user'):
+                job = run_fanout_job(job, batch_size=options['batch_size'])
+                # claimed by another worker in the meantime
+                if job is None:
+                    continue
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Job {job.pk}: {job.sent_count} notifications sent "
+                        f"({job.get_throughput()} per second)."
+                    )
+                )
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def show_status(self):
+        jobs = FanOutJob.objects.filter(status__in=['pending', 'running']).select_related('from_user')
+        if not jobs:
+            self.stdout.write(self.style.WARNING('There are no unfinished fan-out jobs.'))
+        for job in jobs:
+            self.stdout.write(
+                f"Job {job.pk} [{job.status}] {job.from_user}: {job.sent_count} sent, "
+                f"{job.get_progress()}% done, {job.get_throughput()} per second"
+            )
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:26
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def set_post_targets(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    Like = apps.get_model('posts', 'Like')
+    Comment = apps.get_model('posts', 'Comment')
+
+    for notification_type, model, field in (('like', Like, 'like'), ('comment', Comment, 'comment')):
+        Notification.objects.filter(
+            notification_type=notification_type,
+            post__isnull=True,
+        ).update(
+            post_id=Subquery(model.objects.filter(pk=OuterRef(f"{field}_id")).values('post_id')),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_fanoutjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actors_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='recent_actors',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(set_post_targets, migrations.RunPython.noop),
+    ]
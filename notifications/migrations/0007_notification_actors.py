@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def add_recent_actors(apps, schema_editor):
+    # only unread groups are folded into, their older actors are unknown
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationActor = apps.get_model('notifications', 'NotificationActor')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+
+    groups = Notification.objects.filter(
+        notification_type__in=['follow', 'like', 'comment'], is_read=False,
+    ).values_list('pk', 'recent_actors')
+    for pk, recent_actors in groups.iterator():
+        user_ids = User.objects.filter(username__in=recent_actors).values_list('pk', flat=True)
+        NotificationActor.objects.bulk_create(
+            [NotificationActor(notification_id=pk, user_id=user_id) for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0006_fanoutjob_lease'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationActor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actors', to='notifications.notification')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('notification', 'user')},
+            },
+        ),
+        migrations.RunPython(add_recent_actors, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,7 @@ from django.urls import reverse
 
 from accounts.models import Relation, Story
 from posts.models import Post, Comment, Like
+from utils.jobs import get_throughput
 
 
 User = settings.AUTH_USER_MODEL
@@ -15,7 +16,7 @@ class Notification(models.Model):
         ('post', 'Post'),
         ('comment', 'Comment'),
         ('like', 'Like'),
-        {'story', 'Story'}
+        ('story', 'Story'),
     )
 
     from_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_notifications')
@@ -30,17 +31,91 @@ class Notification(models.Model):
     like = models.ForeignKey(Like, on_delete=models.CASCADE, blank=True, null=True)
     story = models.ForeignKey(Story, on_delete=models.CASCADE, blank=True, null=True)
 
+    # grouped notifications: from_user is the latest actor
+    actors_count = models.PositiveIntegerField(default=1)
+    recent_actors = models.JSONField(default=list, blank=True)
+
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # the inbox, paginated by ('-created_at', '-pk')
+            models.Index(fields=['to_user', '-created_at', '-id'], name='notification_inbox_idx'),
+            # unread counts, "read all" and grouping only touch unread rows
+            models.Index(fields=['to_user'], condition=models.Q(is_read=False), name='notification_unread_idx'),
+        ]
     
     def __str__(self):
         return f"{self.from_user} -> {self.to_user} [{self.notification_type}]"
+
+    def get_other_actors_count(self):
+        return max(self.actors_count - len(self.recent_actors), 0)
     
     def get_read_url(self):
         return reverse('notifications:read', args=[self.pk])
     
     def get_delete_url(self):
-        return reverse('notifications:delete', args=[self.pk])
\ No newline at end of file
+        return reverse('notifications:delete', args=[self.pk])
+
+
+class NotificationActor(models.Model):
+    """
+    Every user folded into a grouped notification, actors_count counts
+    each of them once even if they undo and repeat the action.
+    """
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='actors')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        unique_together = ('notification', 'user')
+
+    def __str__(self):
+        return f"{self.user} -> {self.notification}"
+
+
+class FanOutJob(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+    )
+    NOTIFICATION_TYPES = (
+        ('post', 'Post'),
+        ('story', 'Story'),
+    )
+
+    from_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='fanout_jobs')
+    notification_type = models.CharField(max_length=20, choices=NOTIFICATION_TYPES)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, blank=True, null=True)
+    story = models.ForeignKey(Story, on_delete=models.CASCADE, blank=True, null=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # id of the last follower notified, the job resumes after it
+    last_follower_id = models.BigIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    # a running job whose lease expired can be claimed by another worker
+    lease_expires_at = models.DateTimeField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='fanout_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.from_user} [{self.notification_type}] {self.status}"
+
+    def get_progress(self):
+        total = self.from_user.followers_count
+        if self.status == 'done' or not total:
+            return 100
+        return min(100, round(self.sent_count * 100 / total))
+
+    def get_throughput(self):
+        return get_throughput(self.sent_count, self.started_at, self.finished_at)
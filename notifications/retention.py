@@ -0,0 +1,106 @@
+import json
+from datetime import timedelta
+from functools import partial
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from utils.deletion import delete_cascade
+from .cache import forget_unread_counts
+from .models import Notification
+
+
+class RetentionPolicy:
+    """
+    Unread notifications are kept `keep_unread_days` days, read ones
+    `keep_read_days` days, and every user keeps at most `max_per_user` of
+    the newest ones. None disables a rule.
+    """
+
+    def __init__(self, keep_unread_days=None, keep_read_days=None, max_per_user=None):
+        self.keep_unread_days = keep_unread_days
+        self.keep_read_days = keep_read_days
+        self.max_per_user = max_per_user
+
+    def get_expired_filter(self):
+        now = timezone.now()
+        expired = Q(pk__in=[])
+        if self.keep_unread_days is not None:
+            expired |= Q(is_read=False, created_at__lt=now - timedelta(days=self.keep_unread_days))
+        if self.keep_read_days is not None:
+            expired |= Q(is_read=True, created_at__lt=now - timedelta(days=self.keep_read_days))
+        return expired
+
+
+def archive_notifications(notifications, archive):
+    for notification in notifications.order_by('pk').values():
+        archive.write(json.dumps(notification, cls=DjangoJSONEncoder) + '\n')
+
+
+def delete_notifications(notifications, archive=None):
+    """
+    Delete `notifications` (a queryset over a bounded set of primary keys),
+    writing them to the `archive` text file first. Returns the number deleted.
+    """
+    with transaction.atomic():
+        if archive is not None:
+            archive_notifications(notifications, archive)
+        unread_user_ids = list(
+            notifications.filter(is_read=False).order_by().values_list('to_user_id', flat=True).distinct()
+        )
+        # with the actors of grouped notifications
+        deleted = delete_cascade(notifications)
+        transaction.on_commit(partial(forget_unread_counts, unread_user_ids))
+    return deleted
+
+
+def compact_expired_batch(policy, last_pk, batch_size, archive=None, dry_run=False):
+    """
+    Delete the expired notifications among the next `batch_size` rows after
+    `last_pk`, so each batch is a primary key range scan. Returns
+    (last_pk, deleted), last_pk is None when the table has been walked.
+    """
+    pks = list(
+        Notification.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if not pks:
+        return None, 0
+
+    expired = Notification.objects.filter(pk__gte=pks[0], pk__lte=pks[-1]).filter(policy.get_expired_filter())
+    if dry_run:
+        return pks[-1], expired.count()
+    return pks[-1], delete_notifications(expired, archive)
+
+
+def get_users_over_limit(policy):
+    """
+    (user id, count) of the users with more than `max_per_user` notifications
+    that have not expired, so a dry run does not count expired rows twice.
+    """
+    if policy.max_per_user is None:
+        return []
+    return list(
+        Notification.objects.exclude(policy.get_expired_filter())
+        .order_by()
+        .values('to_user_id')
+        .annotate(count=Count('pk'))
+        .filter(count__gt=policy.max_per_user)
+        .values_list('to_user_id', 'count')
+    )
+
+
+def compact_user_batch(policy, user_id, batch_size, archive=None):
+    """
+    Delete up to `batch_size` of the oldest notifications of the user that
+    are over the per-user limit, read through the inbox index.
+    """
+    pks = list(
+        Notification.objects.filter(to_user_id=user_id)
+        .order_by('-created_at', '-id')
+        .values_list('pk', flat=True)[policy.max_per_user:policy.max_per_user + batch_size]
+    )
+    if not pks:
+        return 0
+    return delete_notifications(Notification.objects.filter(pk__in=pks), archive)
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .cache import increment_unread_counts
+from .models import Notification
+
+
+@receiver(post_save, sender=Notification)
+def increment_unread_count(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        increment_unread_counts([instance.to_user_id])
@@ -1,3 +1,291 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Relation
+from posts.models import Post
+from posts.toggles import like_post, unlike_post
+from utils.pagination import CursorPaginator
+from utils.testing import create_user
+from .cache import get_unread_count, get_unread_count_key, increment_unread_counts
+from .fanout import run_fanout_job
+from .grouping import notify
+from .models import FanOutJob, Notification
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return '\n'.join(row[-1] for row in cursor.fetchall())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class NotificationInboxIndexTests(TestCase):
+    """
+    The inbox queries must read notifications through notification_inbox_idx
+    and the unread ones through the partial notification_unread_idx.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        cls.bob = create_user('bob')
+        for notification_type in ('follow', 'like', 'comment'):
+            Notification.objects.create(from_user=cls.bob, to_user=cls.alice, notification_type=notification_type)
+        Notification.objects.create(from_user=cls.bob, to_user=cls.alice, notification_type='post', is_read=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.alice)
+
+    def get_notification_plans(self, url):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        return [
+            (query['sql'], explain(query['sql']))
+            for query in context.captured_queries
+            if '"notifications_notification"' in query['sql']
+        ]
+
+    def assertPlanUses(self, plan, index, sql):
+        message = f"{sql}\n{plan}"
+        self.assertIn(f"SEARCH notifications_notification USING INDEX {index}", plan, message)
+        self.assertNotIn('SCAN notifications_notification', plan, message)
+        self.assertNotIn('USE TEMP B-TREE', plan, message)
+
+    def test_inbox_page(self):
+        plans = self.get_notification_plans(reverse('notifications:notifications'))
+        page = [(sql, plan) for sql, plan in plans if 'ORDER BY' in sql]
+        unread = [(sql, plan) for sql, plan in plans if 'ORDER BY' not in sql]
+
+        self.assertEqual(len(page), 1)
+        self.assertPlanUses(page[0][1], 'notification_inbox_idx', page[0][0])
+        # can_read_all and the header's unread count
+        self.assertEqual(len(unread), 2)
+        for sql, plan in unread:
+            self.assertPlanUses(plan, 'notification_unread_idx', sql)
+
+    def test_next_inbox_page(self):
+        paginator = CursorPaginator(self.alice.notifications.all(), 1, ('-created_at', '-pk'))
+        cursor = paginator.get_page(None).next_cursor
+        plans = self.get_notification_plans(f"{reverse('notifications:notifications')}?cursor={cursor}")
+        page = [(sql, plan) for sql, plan in plans if 'ORDER BY' in sql]
+
+        self.assertEqual(len(page), 1)
+        self.assertPlanUses(page[0][1], 'notification_inbox_idx', page[0][0])
+
+    def test_read_all_updates_only_unread_rows(self):
+        plans = self.get_notification_plans(reverse('notifications:read_all'))
+        updates = [(sql, plan) for sql, plan in plans if sql.startswith('UPDATE')]
+
+        self.assertEqual(len(updates), 1)
+        self.assertPlanUses(updates[0][1], 'notification_unread_idx', updates[0][0])
+        self.assertFalse(Notification.objects.filter(to_user=self.alice, is_read=False).exists())
+
+
+class UnreadCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        cls.bob = create_user('bob')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.alice)
+
+    def notify(self, **fields):
+        return Notification.objects.create(from_user=self.bob, to_user=self.alice, notification_type='follow', **fields)
+
+    def test_counts_are_recounted_when_missing(self):
+        self.notify()
+        self.notify(is_read=True)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_unread_count(self.alice), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.alice), 1)
+
+    def test_new_notifications_increment_the_count(self):
+        self.assertEqual(get_unread_count(self.alice), 0)
+        self.notify()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.alice), 1)
+        # another worker's connection to the cache
+        self.assertEqual(caches.create_connection('default').get(get_unread_count_key(self.alice.pk)), 1)
+
+    def test_increments_leave_missing_counts_to_the_next_read(self):
+        self.notify()
+        cache.clear()
+        increment_unread_counts([self.alice.pk])
+        self.assertIsNone(cache.get(get_unread_count_key(self.alice.pk)))
+        self.assertEqual(get_unread_count(self.alice), 1)
+
+    def test_negative_counts_are_recounted(self):
+        cache.set(get_unread_count_key(self.alice.pk), 0)
+        increment_unread_counts([self.alice.pk], -1)
+        self.assertIsNone(cache.get(get_unread_count_key(self.alice.pk)))
+
+    def test_reading_and_deleting_decrement_the_count(self):
+        notifications = [self.notify() for _ in range(3)]
+        self.assertEqual(get_unread_count(self.alice), 3)
+
+        self.client.get(reverse('notifications:read', args=[notifications[0].pk]))
+        self.assertEqual(get_unread_count(self.alice), 2)
+        # already read
+        self.client.get(reverse('notifications:read', args=[notifications[0].pk]))
+        self.assertEqual(get_unread_count(self.alice), 2)
+        self.client.get(reverse('notifications:delete', args=[notifications[1].pk]))
+        self.assertEqual(get_unread_count(self.alice), 1)
+        self.client.get(reverse('notifications:read_all'))
+        self.assertEqual(get_unread_count(self.alice), 0)
+
+
+class CompactNotificationsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        cls.bob = create_user('bob')
+
+    def create_notification(self, days, is_read=False, to_user=None):
+        notification = Notification.objects.create(
+            from_user=self.bob, to_user=to_user or self.alice, notification_type='follow', is_read=is_read,
+        )
+        Notification.objects.filter(pk=notification.pk).update(created_at=timezone.now() - timedelta(days=days))
+        return notification
+
+    def compact(self, *args):
+        stdout = io.StringIO()
+        call_command(
+            'compact_notifications', '--keep-unread-days', '10', '--keep-read-days', '5',
+            '--batch-size', '2', *args, stdout=stdout,
+        )
+        return stdout.getvalue()
+
+    def test_expired_notifications_are_deleted(self):
+        kept = [self.create_notification(9), self.create_notification(4, is_read=True)]
+        self.create_notification(11)
+        self.create_notification(6, is_read=True)
+        self.create_notification(30, to_user=self.bob)
+
+        output = self.compact('--max-per-user', 'none')
+        self.assertIn('3 notifications deleted (3 expired, 0 over the per-user limit)', output)
+        self.assertQuerySetEqual(Notification.objects.order_by('pk'), kept)
+
+    def test_newest_notifications_are_kept_per_user(self):
+        notifications = [self.create_notification(days) for days in range(5)]
+        self.create_notification(1, to_user=self.bob)
+
+        output = self.compact('--max-per-user', '2')
+        self.assertIn('3 notifications deleted (0 expired, 3 over the per-user limit)', output)
+        self.assertQuerySetEqual(Notification.objects.filter(to_user=self.alice).order_by('pk'), notifications[:2])
+        self.assertEqual(Notification.objects.filter(to_user=self.bob).count(), 1)
+
+    def test_unread_counts_are_forgotten(self):
+        cache.clear()
+        self.create_notification(11)
+        self.assertEqual(get_unread_count(self.alice), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.compact()
+        self.assertEqual(get_unread_count(self.alice), 0)
+
+    def test_dry_run(self):
+        self.create_notification(11)
+        output = self.compact('--dry-run')
+        self.assertIn('1 notifications would be deleted (1 expired, 0 over the per-user limit)', output)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_dry_run_counts_expired_notifications_once(self):
+        for days in (0, 1, 11, 12):
+            self.create_notification(days)
+        output = self.compact('--dry-run', '--max-per-user', '1')
+        self.assertIn('3 notifications would be deleted (2 expired, 1 over the per-user limit)', output)
+        output = self.compact('--max-per-user', '1')
+        self.assertIn('3 notifications deleted (2 expired, 1 over the per-user limit)', output)
+
+    def test_archive(self):
+        expired = [self.create_notification(11), self.create_notification(12)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'notifications.jsonl.gz')
+            output = self.compact('--archive', path)
+            with gzip.open(path, 'rt') as archive:
+                rows = [json.loads(line) for line in archive]
+        self.assertEqual([row['id'] for row in rows], [notification.pk for notification in expired])
+        self.assertIn(f"archived to {path}", output)
+        self.assertFalse(Notification.objects.exists())
+
+
+class FanOutClaimTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        for username in ('bob', 'carol', 'dave'):
+            Relation.objects.create(from_user=create_user(username), to_user=cls.alice)
+        cls.post = Post.objects.create(user=cls.alice, body='hello')
+
+    def create_job(self, **fields):
+        return FanOutJob.objects.create(from_user=self.alice, notification_type='post', post=self.post, **fields)
+
+    def test_leased_jobs_are_not_run_twice(self):
+        job = self.create_job(status='running', lease_expires_at=timezone.now() + timedelta(minutes=1))
+        self.assertIsNone(run_fanout_job(job))
+        self.assertFalse(Notification.objects.exists())
+
+    def test_jobs_with_an_expired_lease_resume(self):
+        first_follower = Relation.objects.filter(to_user=self.alice).order_by('from_user_id').first()
+        job = self.create_job(
+            status='running',
+            lease_expires_at=timezone.now() - timedelta(seconds=1),
+            last_follower_id=first_follower.from_user_id,
+            sent_count=1,
+        )
+        job = run_fanout_job(job, batch_size=1)
+        self.assertEqual((job.status, job.sent_count), ('done', 3))
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_finished_jobs_are_not_run_again(self):
+        job = self.create_job()
+        stale = FanOutJob.objects.get(pk=job.pk)
+        run_fanout_job(job)
+        self.assertIsNone(run_fanout_job(stale))
+        self.assertEqual(Notification.objects.count(), 3)
+
+
+class NotificationGroupingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        cls.post = Post.objects.create(user=cls.alice, body='hello')
+
+    def test_repeated_actions_count_the_actor_once(self):
+        bob = create_user('bob')
+        like_post(bob, self.post.pk)
+        # bob drops out of the recent actors
+        for username in ('carol', 'dave', 'erin'):
+            like_post(create_user(username), self.post.pk)
+        unlike_post(bob, self.post.pk)
+        like_post(bob, self.post.pk)
+
+        group = Notification.objects.get()
+        self.assertEqual(group.actors_count, 4)
+        self.assertEqual(group.recent_actors, ['bob', 'erin', 'dave'])
+        self.assertEqual(group.actors.count(), 4)
 
-# Create your tests here.
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite has no SELECT ... FOR UPDATE')
+    def test_sqlite_takes_the_write_lock_before_looking_up_the_group(self):
+        bob = create_user('bob')
+        with CaptureQueriesContext(connection) as context:
+            notify(bob, self.alice, 'like', post=self.post)
+        statements = [query['sql'].split()[0] for query in context if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(statements[:2], ['UPDATE', 'SELECT'])
@@ -1,19 +1,25 @@
-from django.contrib.auth.mixins import LoginRequiredMixin
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
 
-from utils.pagination import get_pagination_context
+from utils.mixins import LoginRequiredMixin, ReplicaReadMixin
+from utils.pagination import aget_cursor_pagination_context
+from .cache import increment_unread_counts, reset_unread_count
 from .models import Notification
 
 
-class NotificationsView(LoginRequiredMixin, View):
+class NotificationsView(LoginRequiredMixin, ReplicaReadMixin, View):
     template_name = 'notifications/notifications.html'
 
-    def get(self, request):
-        notifications = request.user.notifications.all()
-        can_read_all = notifications.filter(is_read=False).exists()
-        return render(request, self.template_name, {
-            'page_obj': get_pagination_context(request, notifications, 10),
+    async def get(self, request):
+        notifications = request.user.notifications.filter(
+            from_user__deleted_at__isnull=True,
+        ).select_related('from_user', 'post', 'story')
+        can_read_all = await notifications.filter(is_read=False).aexists()
+        page_obj = await aget_cursor_pagination_context(request, notifications, 10)
+        # the header may still query (e.g. the unread count), render in a thread
+        return await sync_to_async(render)(request, self.template_name, {
+            'page_obj': page_obj,
             'can_read_all': can_read_all,
         })
 
@@ -24,23 +30,30 @@ class NotificationReadView(LoginRequiredMixin, View):
 
         if not notification.is_read:
             notification.is_read = True
-            notification.save()
+            notification.save(update_fields=['is_read'])
+            increment_unread_counts([request.user.pk], -1)
         return redirect('notifications:notifications')
 
 
 class NotificationReadAllView(LoginRequiredMixin, View):
     def get(self, request):
         request.user.notifications.filter(is_read=False).update(is_read=True)
+        reset_unread_count(request.user.pk)
         return redirect('notifications:notifications')
 
 
 class NotificationDeleteView(LoginRequiredMixin, View):
     def get(self, request, **kwargs):
-        get_object_or_404(Notification, pk=kwargs['pk'], to_user=request.user).delete()
+        notification = get_object_or_404(Notification, pk=kwargs['pk'], to_user=request.user)
+        notification.delete()
+
+        if not notification.is_read:
+            increment_unread_counts([request.user.pk], -1)
         return redirect('notifications:notifications')
 
 
 class NotificationDeleteAllView(LoginRequiredMixin, View):
     def get(self, request):
         request.user.notifications.all().delete()
+        reset_unread_count(request.user.pk)
         return redirect('notifications:notifications')
\ No newline at end of file
@@ -0,0 +1,73 @@
+from django.conf import settings
+
+from accounts.models import Relation
+from .models import Post, TimelineEntry
+
+
+def is_celebrity(user):
+    return user.followers_count >= settings.FEED_CELEBRITY_FOLLOWERS_THRESHOLD
+
+
+def fan_out_post(post, follower_ids):
+    """
+    Push a new post into the timelines of the given followers of its author.
+    Posts of celebrity accounts are skipped, they are pulled at read time.
+    """
+    author = post.user
+    if is_celebrity(author):
+        return
+
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=follower_id, post=post, author=author)
+            for follower_id in follower_ids
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def backfill_following(user, followed):
+    if is_celebrity(followed):
+        return
+
+    post_ids = followed.posts.order_by('-pk').values_list('pk', flat=True)[:settings.FEED_BACKFILL_POSTS]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user=user, post_id=post_id, author=followed)
+            for post_id in post_ids
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def prune_following(user, unfollowed):
+    TimelineEntry.objects.filter(user=user, author=unfollowed).delete()
+
+
+def get_feed(user, before=None, limit=10):
+    """
+    Return (posts, next_cursor) for the home timeline of `user`.
+    Fanned-out entries are read with a range scan over (user, post), posts of
+    followed celebrity accounts and the user's own posts are merged in.
+    """
+    entries = TimelineEntry.objects.filter(user=user)
+    pull_user_ids = list(
+        Relation.objects.filter(
+            from_user=user,
+            to_user__followers_count__gte=settings.FEED_CELEBRITY_FOLLOWERS_THRESHOLD,
+        ).values_list('to_user_id', flat=True)
+    )
+    pull_user_ids.append(user.pk)
+    pulled = Post.objects.filter(user_id__in=pull_user_ids)
+
+    if before is not None:
+        entries = entries.filter(post_id__lt=before)
+        pulled = pulled.filter(pk__lt=before)
+
+    post_ids = set(entries.order_by('-post_id').values_list('post_id', flat=True)[:limit + 1])
+    post_ids.update(pulled.order_by('-pk').values_list('pk', flat=True)[:limit + 1])
+    post_ids = sorted(post_ids, reverse=True)
+
+    next_cursor = post_ids[limit - 1] if len(post_ids) > limit else None
+    posts = Post.objects.visible().filter(pk__in=post_ids[:limit]).select_related('user').order_by('-pk')
+    return posts, next_cursor
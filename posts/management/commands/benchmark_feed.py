@@ -0,0 +1,75 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import Relation
+from posts.feed import get_feed
+from posts.models import Post, TimelineEntry
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measure home feed read latency while the follow graph grows (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 5000])
+        parser.add_argument('--posts-per-user', type=int, default=5)
+        parser.add_argument('--reads', type=int, default=50)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'following':>10} {'entries':>10} {'p50 ms':>10} {'p95 ms':>10}")
+
+        for size in options['sizes']:
+            with transaction.atomic():
+                entries_count, timings = self.run_size(size, options['posts_per_user'], options['reads'])
+                transaction.set_rollback(True)
+
+            timings.sort()
+            p50 = statistics.median(timings)
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            self.stdout.write(f"{size:>10} {entries_count:>10} {p50:>10.3f} {p95:>10.3f}")
+
+    def run_size(self, size, posts_per_user, reads):
+        prefix = f"feedbench{size}_"
+        users = User.objects.bulk_create([
+            User(
+                username=f"{prefix}{i}",
+                email=f"{prefix}{i}@example.com",
+                phone_number=f"{size}{i}",
+                first_name='Bench',
+                last_name='User',
+            )
+            for i in range(size + 1)
+        ])
+        viewer, authors = users[0], users[1:]
+
+        Relation.objects.bulk_create(
+            [Relation(from_user=viewer, to_user=author) for author in authors],
+            batch_size=1000,
+        )
+        posts = Post.objects.bulk_create(
+            [
+                Post(user=author, body=f"post {i} of {author.username}")
+                for author in authors
+                for i in range(posts_per_user)
+            ],
+            batch_size=1000,
+        )
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user=viewer, post=post, author_id=post.user_id) for post in posts],
+            batch_size=1000,
+        )
+
+        timings = []
+        before = None
+        for _ in range(reads):
+            start = time.perf_counter()
+            page, before = get_feed(viewer, before=before)
+            list(page)
+            timings.append((time.perf_counter() - start) * 1000)
+        return len(posts), timings
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post, Comment, Like, Save
+from utils.counters import recount_counters
+
+
+class Command(BaseCommand):
+    help = 'Recount stored like/comment/save counters of posts and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drifted posts, do not update them.',
+        )
+
+    def handle(self, *args, **options):
+        checked_count, drifted_count = recount_counters(
+            Post,
+            {
+                'likes_count': (Like, 'post'),
+                'comments_count': (Comment, 'post'),
+                'saves_count': (Save, 'post'),
+            },
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+
+        if drifted_count > 0:
+            action = 'found' if options['dry_run'] else 'repaired'
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{drifted_count} of {checked_count} posts had drifted counters ({action})."
+                )
+            )
+        else:
+            self.stdout.write(
+                self.style.WARNING(f"All {checked_count} posts have correct counters.")
+            )
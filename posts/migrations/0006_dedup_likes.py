@@ -0,0 +1,65 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:54
+
+from django.db import migrations, transaction
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+BATCH_SIZE = 1000
+
+
+def delete_duplicate_likes(apps, likes):
+    """
+    Delete the likes in `likes` that repeat an earlier (user, post) like
+    and recount the affected posts. Returns the number deleted.
+    """
+    Like = apps.get_model('posts', 'Like')
+    Post = apps.get_model('posts', 'Post')
+
+    earlier = Like.objects.filter(user=OuterRef('user'), post=OuterRef('post'), pk__lt=OuterRef('pk'))
+    duplicates = list(likes.filter(Exists(earlier)).values_list('pk', 'post_id'))
+    if not duplicates:
+        return 0
+
+    Like.objects.filter(pk__in=[pk for pk, _ in duplicates]).delete()
+    Post.objects.filter(pk__in={post_id for _, post_id in duplicates}).update(
+        likes_count=Coalesce(
+            Subquery(
+                Like.objects.filter(post=OuterRef('pk'))
+                .order_by()
+                .values('post')
+                .annotate(count=Count('pk'))
+                .values('count')
+            ),
+            0,
+        )
+    )
+    return len(duplicates)
+
+
+def dedup_likes(apps, schema_editor):
+    # One short transaction per batch of primary keys, so the table stays
+    # writable while the migration runs. Likes added meanwhile are caught
+    # by the final pass in the next migration.
+    Like = apps.get_model('posts', 'Like')
+    last_pk = 0
+
+    while True:
+        pks = list(Like.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE])
+        if not pks:
+            break
+        with transaction.atomic():
+            delete_duplicate_likes(apps, Like.objects.filter(pk__gte=pks[0], pk__lte=pks[-1]))
+        last_pk = pks[-1]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('posts', '0005_timelineentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedup_likes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:54
+
+import importlib
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+dedup_likes_migration = importlib.import_module('posts.migrations.0006_dedup_likes')
+
+
+def dedup_recent_likes(apps, schema_editor):
+    # duplicates created while 0006 ran, in the same transaction as the
+    # unique constraint
+    Like = apps.get_model('posts', 'Like')
+    dedup_likes_migration.delete_duplicate_likes(apps, Like.objects.all())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_dedup_likes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(dedup_recent_likes, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='like',
+            unique_together={('user', 'post')},
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created_at'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['post', '-created_at'], name='like_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='save',
+            index=models.Index(fields=['post', '-created_at'], name='save_post_created_idx'),
+        ),
+    ]
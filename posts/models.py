@@ -6,14 +6,35 @@ from django.urls import reverse
 User = settings.AUTH_USER_MODEL
 
 
+class PostQuerySet(models.QuerySet):
+    def visible(self):
+        # posts of deleted accounts that are waiting to be purged
+        return self.filter(user__deleted_at__isnull=True)
+
+
 class Post(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     body = models.TextField(max_length=500)
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    saves_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['-likes_count', '-comments_count', '-created_at'],
+                name='post_ranking_idx',
+            ),
+            models.Index(
+                fields=['user', '-likes_count', '-comments_count', '-created_at'],
+                name='post_user_ranking_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.get_short_body()
@@ -31,13 +52,13 @@ class Post(models.Model):
         return reverse('posts:delete_post', args=[self.pk])
     
     def get_likes_count(self):
-        return self.likes.count()
+        return self.likes_count
     
     def get_comments_count(self):
-        return self.comments.count()
+        return self.comments_count
     
     def get_saves_count(self):
-        return self.saves.count()
+        return self.saves_count
     
     def get_like_url(self):
         return reverse('posts:like_post', args=[self.pk])
@@ -51,6 +72,12 @@ class Post(models.Model):
     def get_unsave_url(self):
         return reverse('posts:unsave_post', args=[self.pk])
 
+    def get_like_api_url(self):
+        return reverse('posts:api_like_post', args=[self.pk])
+
+    def get_save_api_url(self):
+        return reverse('posts:api_save_post', args=[self.pk])
+
 
 class Comment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
@@ -60,6 +87,9 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['post', '-created_at'], name='comment_post_created_idx'),
+        ]
     
     def __str__(self):
         return (self.body + '...') if len(self.body) > 20 else self.body
@@ -72,6 +102,10 @@ class Like(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        unique_together = ['user', 'post']
+        indexes = [
+            models.Index(fields=['post', '-created_at'], name='like_post_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user} liked {self.post}"
@@ -85,6 +119,25 @@ class Save(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['user', 'post']
+        indexes = [
+            models.Index(fields=['post', '-created_at'], name='save_post_created_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} saved {self.post.get_short_body()}"
\ No newline at end of file
+        return f"{self.user.username} saved {self.post.get_short_body()}"
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        ordering = ['-post_id']
+        unique_together = ['user', 'post']
+        indexes = [
+            models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.post} in {self.user}'s timeline"
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from utils.counters import update_counter
+from .models import Post, Comment, Like, Save
+
+
+COUNTER_FIELDS = {
+    Like: 'likes_count',
+    Comment: 'comments_count',
+    Save: 'saves_count',
+}
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Save)
+def increment_post_counter(sender, instance, created, **kwargs):
+    if created:
+        update_counter(Post, instance.post_id, COUNTER_FIELDS[sender], 1)
+
+
+@receiver(post_delete, sender=Like)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Save)
+def decrement_post_counter(sender, instance, **kwargs):
+    update_counter(Post, instance.post_id, COUNTER_FIELDS[sender], -1)
@@ -1,3 +1,531 @@
-from django.test import TestCase
+import io
+from contextlib import contextmanager
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core import signing
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.views import View
+
+from accounts.models import Relation
+from accounts.toggles import follow_user, unfollow_user
+from notifications.models import Notification
+from utils.mixins import (
+    AnonymousRequiredMixin,
+    LoginRequiredMixin,
+    OwnerRequiredMixin,
+    PostOwnerRequiredMixin,
+    aget_resolved_object,
+)
+from utils.pagination import CursorPaginator
+from utils.testing import create_user
+from utils.viewer_state import attach_post_viewer_state, attach_user_viewer_state
+from .feed import fan_out_post, get_feed
+from .forms import PostCreateEditForm
+from .models import Post, Comment, Like, Save, TimelineEntry
+from . import toggles
+from .toggles import like_post, unlike_post
+
+
+def get_unique_index(model, columns):
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return next(
+        name for name, constraint in constraints.items()
+        if constraint['unique'] and constraint['index'] and constraint['columns'] == columns
+    )
+
+
+@contextmanager
+def dropped_index(name):
+    # SQLite DDL is transactional, the index is back after the block
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+        yield
+        transaction.set_rollback(True)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class PostActivityIndexTests(TestCase):
+    """
+    Capture the query plans of the like/save/comment/relation access paths
+    with and without their composite index.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        cls.post = Post.objects.create(user=cls.alice, body='hello')
+
+    def get_plans(self, queryset, index):
+        with dropped_index(index):
+            before = queryset.explain()
+        return before, queryset.explain()
+
+    def assertUsesIndex(self, queryset, index, covering=False):
+        before, after = self.get_plans(queryset, index)
+        plans = f"before:\n{before}\nafter:\n{after}"
+        self.assertNotIn(index, before, plans)
+        self.assertIn(f"USING {'COVERING ' if covering else ''}INDEX {index}", after, plans)
+        self.assertNotIn('USE TEMP B-TREE', after, plans)
+        return before, after
+
+    def test_liked_posts_of_a_viewer(self):
+        # utils.viewer_state
+        queryset = (
+            Like.objects.filter(user=self.alice, post_id__in=[1, 2, 3])
+            .order_by().values_list('post_id', flat=True)
+        )
+        self.assertUsesIndex(queryset, get_unique_index(Like, ['user_id', 'post_id']), covering=True)
+
+    def test_saved_posts_of_a_viewer(self):
+        queryset = (
+            Save.objects.filter(user=self.alice, post_id__in=[1, 2, 3])
+            .order_by().values_list('post_id', flat=True)
+        )
+        self.assertUsesIndex(queryset, get_unique_index(Save, ['user_id', 'post_id']), covering=True)
+
+    def test_newest_likes_of_a_post(self):
+        before, _ = self.assertUsesIndex(
+            Like.objects.filter(post=self.post).order_by('-created_at'), 'like_post_created_idx',
+        )
+        self.assertIn('USE TEMP B-TREE FOR ORDER BY', before)
+
+    def test_newest_saves_of_a_post(self):
+        self.assertUsesIndex(Save.objects.filter(post=self.post).order_by('-created_at'), 'save_post_created_idx')
+
+    def test_newest_comments_of_a_post(self):
+        # the post page, paginated by ('-created_at', '-pk')
+        self.assertUsesIndex(Comment.objects.filter(post=self.post).order_by('-created_at'), 'comment_post_created_idx')
+
+    def test_follower_batch(self):
+        # notifications.fanout.get_follower_batch
+        queryset = (
+            Relation.objects.filter(to_user=self.alice, from_user_id__gt=0)
+            .order_by('from_user_id')
+            .values_list('from_user_id', flat=True)
+        )
+        self.assertUsesIndex(queryset, 'relation_to_from_idx', covering=True)
+
+
+class LikeUniqueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        cls.post = Post.objects.create(user=cls.alice, body='hello')
+
+    def test_duplicate_likes_are_rejected(self):
+        Like.objects.create(user=self.alice, post=self.post)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Like.objects.create(user=self.alice, post=self.post)
+
+    def test_repeated_likes_are_counted_once(self):
+        self.assertEqual(like_post(self.alice, self.post.pk), (True, 1))
+        self.assertEqual(like_post(self.alice, self.post.pk), (False, 1))
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+
+    def test_like_statements(self):
+        bob = create_user('bob')
+        # the savepoint, the insert, the counter and the release
+        with mock.patch.object(toggles, 'notify_like') as notify_like, self.assertNumQueries(4):
+            self.assertEqual(like_post(bob, self.post.pk), (True, 1))
+        notify_like.assert_called_once_with(bob, self.post.pk)
+
+        unlike_post(bob, self.post.pk)
+        like_post(bob, self.post.pk)
+        self.assertTrue(Notification.objects.filter(to_user=self.alice, notification_type='like').exists())
+
+    def test_unlike_deletes_notifications_of_the_like(self):
+        bob = create_user('bob')
+        like = Like.objects.create(user=bob, post=self.post)
+        # notifications created before grouping point at the like
+        Notification.objects.create(from_user=bob, to_user=self.alice, notification_type='like', like=like)
+
+        self.assertEqual(unlike_post(bob, self.post.pk)[0], True)
+        connection.check_constraints()
+        self.assertFalse(Notification.objects.filter(like_id=like.pk).exists())
+
+
+@override_settings(FEED_CELEBRITY_FOLLOWERS_THRESHOLD=2)
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        cls.bob = create_user('bob')
+        cls.carol = create_user('carol', followers_count=2)
+
+    def test_pushed_and_pulled_posts_are_merged(self):
+        follow_user(self.alice, self.bob)
+        follow_user(self.alice, self.carol)
+        own = Post.objects.create(user=self.alice, body='mine')
+        pushed = Post.objects.create(user=self.bob, body='pushed')
+        fan_out_post(pushed, [self.alice.pk])
+        pulled = Post.objects.create(user=self.carol, body='pulled')
+        fan_out_post(pulled, [self.alice.pk])
+        Post.objects.create(user=create_user('dave'), body='not followed')
+
+        # only the post of the account below the threshold is pushed
+        self.assertQuerySetEqual(TimelineEntry.objects.values_list('post', flat=True), [pushed.pk])
+        posts, next_cursor = get_feed(self.alice)
+        self.assertQuerySetEqual(posts, [pulled, pushed, own])
+        self.assertIsNone(next_cursor)
+
+        posts, next_cursor = get_feed(self.alice, limit=2)
+        self.assertQuerySetEqual(posts, [pulled, pushed])
+        self.assertQuerySetEqual(get_feed(self.alice, before=next_cursor, limit=2)[0], [own])
+
+    def test_unfollow_removes_the_timeline_entries(self):
+        post = Post.objects.create(user=self.bob, body='hello')
+        follow_user(self.alice, self.bob)
+        self.assertTrue(TimelineEntry.objects.filter(user=self.alice, post=post).exists())
+
+        unfollow_user(self.alice, self.bob)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertQuerySetEqual(get_feed(self.alice)[0], [])
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        cls.bob = create_user('bob')
+        cls.posts = [Post.objects.create(user=cls.alice, body=f"hello {i}") for i in range(12)]
+
+    def setUp(self):
+        self.client.force_login(self.alice)
+
+    def get_page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.context['page_obj']
+
+    def test_next_and_previous_pages(self):
+        paginator = CursorPaginator(Post.objects.all(), 5, ('-pk',))
+        newest = self.posts[::-1]
+
+        first = paginator.get_page(None)
+        self.assertEqual(list(first), newest[:5])
+        self.assertFalse(first.has_previous())
+        second = paginator.get_page(first.next_cursor)
+        self.assertEqual(list(second), newest[5:10])
+        last = paginator.get_page(second.next_cursor)
+        self.assertEqual(list(last), newest[10:])
+        self.assertFalse(last.has_next())
+
+        self.assertEqual(list(paginator.get_page(last.previous_cursor)), newest[5:10])
+        back = paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back), newest[:5])
+        self.assertFalse(back.has_previous())
+
+    def test_search_pages(self):
+        url = reverse('posts:posts')
+        first = self.get_page(f"{url}?search=hello")
+        self.assertIn('search=hello', first.next_query)
+        second = self.get_page(f"{url}?{first.next_query}")
+
+        self.assertEqual(len(first), 10)
+        self.assertFalse(second.has_next())
+        self.assertCountEqual([*first, *second], self.posts)
+
+    def test_tampered_cursors_fall_back_to_the_first_page(self):
+        url = reverse('posts:posts')
+        cursor = self.get_page(url).next_cursor
+        self.assertEqual(list(self.get_page(f"{url}?cursor={cursor}x")), list(self.get_page(url)))
+
+    def test_cursors_of_other_lists_fall_back_to_the_first_page(self):
+        # a cursor of the people list, ordered by followers_count
+        paginator = CursorPaginator(get_user_model().objects.all(), 1, ('-followers_count', '-pk'))
+        cursor = paginator.get_page(None).next_cursor
+        for url in [reverse('notifications:notifications'), self.alice.get_saved_posts_url()]:
+            self.assertFalse(self.get_page(f"{url}?cursor={cursor}").has_previous())
+
+    def test_invalid_cursor_values_fall_back_to_the_first_page(self):
+        paginator = CursorPaginator(Post.objects.all(), 5, ('-created_at', '-pk'))
+        cursor = signing.dumps(['next', [1, 'a']], salt=paginator.salt, compress=True)
+        self.assertEqual(list(paginator.get_page(cursor)), list(paginator.get_page(None)))
+
+
+class ViewerStateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        cls.bob = create_user('bob')
+        cls.carol = create_user('carol')
+        cls.posts = [Post.objects.create(user=cls.bob, body=f"post {i}") for i in range(3)]
+        Like.objects.create(user=cls.alice, post=cls.posts[0])
+        Save.objects.create(user=cls.alice, post=cls.posts[1])
+        Relation.objects.create(from_user=cls.alice, to_user=cls.bob)
+
+    def setUp(self):
+        self.client.force_login(self.alice)
+        # the header's unread count is cached after the first page
+        self.client.get(reverse('posts:posts'))
+
+    def test_post_state(self):
+        posts = list(Post.objects.filter(pk__in=[post.pk for post in self.posts]))
+        with self.assertNumQueries(2):
+            posts = attach_post_viewer_state(self.alice, posts)
+        self.assertEqual(
+            {post.pk: (post.is_liked, post.is_saved) for post in posts},
+            {self.posts[0].pk: (True, False), self.posts[1].pk: (False, True), self.posts[2].pk: (False, False)},
+        )
+
+    def test_user_state(self):
+        users = list(get_user_model().objects.order_by('pk'))
+        with self.assertNumQueries(1):
+            users = attach_user_viewer_state(self.alice, users)
+        self.assertEqual(
+            [(user.is_followed, user.is_self) for user in users], [(False, True), (True, False), (False, False)],
+        )
+
+    def test_anonymous_viewers(self):
+        with self.assertNumQueries(0):
+            posts = attach_post_viewer_state(AnonymousUser(), self.posts)
+        self.assertFalse(any(post.is_liked or post.is_saved for post in posts))
+
+    def test_list_queries_do_not_grow_with_the_page(self):
+        # the signed in user, the page, the liked and the saved posts
+        with self.assertNumQueries(4):
+            self.client.get(reverse('posts:posts'))
+        for i in range(10):
+            Like.objects.create(user=self.alice, post=Post.objects.create(user=self.carol, body=f"more {i}"))
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('posts:posts'))
+        self.assertEqual(sum(post.is_liked for post in response.context['page_obj']), 10)
+
+        # the signed in user, the page and the followed users
+        with self.assertNumQueries(3):
+            self.client.get(reverse('accounts:people'))
+
+
+class PostDetailViewQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        cls.post = Post.objects.create(user=cls.alice, body='hello')
+        for username in ('bob', 'carol', 'dave'):
+            Comment.objects.create(user=create_user(username), post=cls.post, body=f"hi from {username}")
+
+    def setUp(self):
+        self.client.force_login(self.alice)
+        # the header's unread count is cached after the first page
+        self.client.get(reverse('posts:posts'))
+
+    def test_post_detail(self):
+        # the signed in user, the post with the viewer's like and save, and
+        # the comments with their authors
+        with self.assertNumQueries(3):
+            response = self.client.get(self.post.get_absolute_url())
+        self.assertContains(response, 'hi from dave')
+
+    def test_invalid_comment(self):
+        with self.assertNumQueries(3):
+            response = self.client.post(self.post.get_absolute_url(), {'body': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+        self.assertEqual(self.post.comments.count(), 3)
+
+
+class AsyncOwnerView(LoginRequiredMixin, OwnerRequiredMixin, View):
+    async def get(self, request, **kwargs):
+        return HttpResponse('ok')
+
+
+class AsyncPostOwnerView(LoginRequiredMixin, PostOwnerRequiredMixin, View):
+    async def get(self, request, **kwargs):
+        post = await aget_resolved_object(request, Post, pk=kwargs['pk'])
+        return HttpResponse(post.body)
+
+
+class AsyncAnonymousView(AnonymousRequiredMixin, View):
+    async def get(self, request):
+        return HttpResponse('ok')
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        cls.bob = create_user('bob')
+        cls.post = Post.objects.create(user=cls.alice, body='hello')
+
+    async def call(self, view_class, user, **kwargs):
+        request = AsyncRequestFactory().get('/')
+
+        async def auser():
+            return user
+
+        request.auser = auser
+        request._messages = CookieStorage(request)
+        return await view_class.as_view()(request, **kwargs)
+
+    async def test_anonymous_users_are_sent_to_login(self):
+        response = await self.async_client.get(self.post.get_like_url())
+        self.assertRedirects(response, f"{reverse('accounts:login')}?next={self.post.get_like_url()}", fetch_redirect_response=False)
+        self.assertFalse(await Like.objects.aexists())
+
+    async def test_toggle_views(self):
+        await self.async_client.aforce_login(self.bob)
+
+        response = await self.async_client.get(self.post.get_like_url())
+        self.assertRedirects(response, self.post.get_absolute_url(), fetch_redirect_response=False)
+        self.assertTrue(await Like.objects.filter(user=self.bob, post=self.post).aexists())
+        await self.async_client.get(self.post.get_unlike_url())
+        self.assertFalse(await Like.objects.aexists())
+
+        response = await self.async_client.get(reverse('posts:like_post', args=[self.post.pk + 100]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_pages(self):
+        await self.async_client.aforce_login(self.bob)
+        for url in [self.post.get_absolute_url(), reverse('notifications:notifications')]:
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    async def test_users_cannot_follow_themselves(self):
+        await self.async_client.aforce_login(self.alice)
+        response = await self.async_client.get(self.alice.get_follow_url())
+        self.assertRedirects(response, reverse('social_network'), fetch_redirect_response=False)
+
+        response = await self.async_client.get(self.bob.get_follow_url())
+        self.assertRedirects(response, self.bob.get_profile_url(), fetch_redirect_response=False)
+        self.assertTrue(await Relation.objects.filter(from_user=self.alice, to_user=self.bob).aexists())
+
+    async def test_owner_mixin(self):
+        response = await self.call(AsyncOwnerView, self.alice, username='alice')
+        self.assertEqual(response.status_code, 200)
+        response = await self.call(AsyncOwnerView, self.alice, username='bob')
+        self.assertRedirects(response, reverse('social_network'), fetch_redirect_response=False)
+        response = await self.call(AsyncOwnerView, AnonymousUser(), username='alice')
+        self.assertEqual(response.status_code, 302)
+
+    def test_post_owner_mixin(self):
+        # the view reuses the post the mixin loaded
+        with self.assertNumQueries(1):
+            response = async_to_sync(self.call)(AsyncPostOwnerView, self.alice, pk=self.post.pk)
+        self.assertContains(response, 'hello')
+        response = async_to_sync(self.call)(AsyncPostOwnerView, self.bob, pk=self.post.pk)
+        self.assertRedirects(response, self.post.get_absolute_url(), fetch_redirect_response=False)
+
+    async def test_anonymous_required_mixin(self):
+        response = await self.call(AsyncAnonymousView, AnonymousUser())
+        self.assertEqual(response.status_code, 200)
+        response = await self.call(AsyncAnonymousView, self.alice)
+        self.assertRedirects(response, reverse('social_network'), fetch_redirect_response=False)
+
+
+class RecountPostCountersTests(TestCase):
+    def test_drifted_counters_are_repaired(self):
+        alice, bob = create_user('alice'), create_user('bob')
+        post = Post.objects.create(user=alice, body='hello')
+        other = Post.objects.create(user=alice, body='other')
+        Like.objects.create(user=bob, post=post)
+        Save.objects.create(user=bob, post=post)
+        Comment.objects.create(user=bob, post=post, body='hi')
+        Post.objects.filter(pk=post.pk).update(likes_count=5, comments_count=0, saves_count=3)
+        Post.objects.filter(pk=other.pk).update(likes_count=0, comments_count=0, saves_count=0)
+
+        stdout = io.StringIO()
+        call_command('recount_post_counters', '--dry-run', stdout=stdout)
+        self.assertIn('1 of 2 posts had drifted counters (found)', stdout.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 5)
+
+        stdout = io.StringIO()
+        call_command('recount_post_counters', '--batch-size', '1', stdout=stdout)
+        self.assertIn('1 of 2 posts had drifted counters (repaired)', stdout.getvalue())
+        post.refresh_from_db()
+        self.assertEqual((post.likes_count, post.comments_count, post.saves_count), (1, 1, 1))
+
+        stdout = io.StringIO()
+        call_command('recount_post_counters', stdout=stdout)
+        self.assertIn('All 2 posts have correct counters', stdout.getvalue())
+
+
+class PostAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        cls.bob = create_user('bob')
+        cls.post = Post.objects.create(user=cls.alice, body='hello')
+
+    def setUp(self):
+        self.client.force_login(self.bob)
+
+    def test_like_and_unlike(self):
+        response = self.client.post(self.post.get_like_api_url())
+        self.assertEqual(response.json(), {'liked': True, 'likes_count': 1})
+        response = self.client.post(self.post.get_like_api_url())
+        self.assertEqual(response.json(), {'liked': True, 'likes_count': 1})
+        self.assertEqual(Like.objects.count(), 1)
+
+        response = self.client.delete(self.post.get_like_api_url())
+        self.assertEqual(response.json(), {'liked': False, 'likes_count': 0})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_save_and_unsave(self):
+        response = self.client.post(self.post.get_save_api_url())
+        self.assertEqual(response.json(), {'saved': True, 'saves_count': 1})
+        response = self.client.delete(self.post.get_save_api_url())
+        self.assertEqual(response.json(), {'saved': False, 'saves_count': 0})
+        self.assertFalse(Save.objects.exists())
+
+    def test_errors(self):
+        for name in ['posts:api_like_post', 'posts:api_save_post']:
+            with self.subTest(name=name):
+                response = self.client.post(reverse(name, args=[self.post.pk + 100]))
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {'error': 'Post not found'})
+
+        self.client.logout()
+        response = self.client.post(self.post.get_like_api_url())
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Like.objects.exists())
+
+
+class PostOwnerViewQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice')
+        cls.bob = create_user('bob')
+        cls.post = Post.objects.create(user=cls.alice, body='hello')
+
+    def setUp(self):
+        self.client.force_login(self.alice)
+        # the header's unread count is cached after the first page
+        self.client.get(reverse('posts:posts'))
+
+    def test_edit_post(self):
+        # the signed in user and the post, the mixin's post is reused
+        with self.assertNumQueries(2):
+            response = self.client.get(self.post.get_edit_url())
+        self.assertEqual(response.status_code, 200)
+
+    def test_edit_post_of_another_user(self):
+        self.client.force_login(self.bob)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.post.get_edit_url())
+        self.assertRedirects(response, self.post.get_absolute_url(), fetch_redirect_response=False)
+
+    def test_edit_post_keeps_concurrent_counter_updates(self):
+        is_valid = PostCreateEditForm.is_valid
+
+        def like_then_validate(form):
+            like_post(self.bob, self.post.pk)
+            return is_valid(form)
+
+        with mock.patch.object(PostCreateEditForm, 'is_valid', like_then_validate):
+            self.client.post(self.post.get_edit_url(), {'body': 'edited'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.body, 'edited')
+        self.assertEqual(self.post.likes_count, 1)
@@ -0,0 +1,81 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from accounts.cache import bump_profile_generation
+from notifications.grouping import notify
+from utils.counters import update_counter, update_counter_returning
+from utils.deletion import delete_cascade, delete_rows
+from utils.upserts import insert_ignore
+from .models import Post, Like, Save
+
+
+User = get_user_model()
+
+# Each toggle is one INSERT ... ON CONFLICT DO NOTHING (or one DELETE)
+# plus one statement that returns the post's counter, so repeated and
+# concurrent clicks are safe. They return (changed, count), or None when
+# the post does not exist. Signals are not sent, counters are kept here.
+
+
+def get_post_counter(post_id, field):
+    return Post.objects.visible().filter(pk=post_id).values_list(field, flat=True).first()
+
+
+def notify_like(user, post_id):
+    post = Post.objects.select_related('user').get(pk=post_id)
+    if post.user != user:
+        notify(user, post.user, 'like', post=post)
+
+
+def like_post(user, post_id):
+    """
+    The toggle itself is two statements. A new like also runs
+    notify_like(), about ten more statements when the notification is
+    grouped, in the same transaction so the like and its notification
+    commit together.
+    """
+    with transaction.atomic():
+        if insert_ignore(Like, where=Post.objects.visible().filter(pk=post_id), user=user, post_id=post_id):
+            likes_count = update_counter_returning(Post, post_id, 'likes_count', 1)
+            notify_like(user, post_id)
+            return True, likes_count
+
+    likes_count = get_post_counter(post_id, 'likes_count')
+    return None if likes_count is None else (False, likes_count)
+
+
+def unlike_post(user, post_id):
+    with transaction.atomic():
+        # older like notifications still point at the like
+        deleted = delete_cascade(Like.objects.filter(user=user, post_id=post_id))
+        if deleted:
+            return True, update_counter_returning(Post, post_id, 'likes_count', -deleted)
+
+    likes_count = get_post_counter(post_id, 'likes_count')
+    return None if likes_count is None else (False, likes_count)
+
+
+def save_post(user, post_id):
+    with transaction.atomic():
+        if insert_ignore(Save, where=Post.objects.visible().filter(pk=post_id), user=user, post_id=post_id):
+            saves_count = update_counter_returning(Post, post_id, 'saves_count', 1)
+            update_counter(User, user.pk, 'saved_posts_count', 1)
+            transaction.on_commit(partial(bump_profile_generation, user.pk))
+            return True, saves_count
+
+    saves_count = get_post_counter(post_id, 'saves_count')
+    return None if saves_count is None else (False, saves_count)
+
+
+def unsave_post(user, post_id):
+    with transaction.atomic():
+        if delete_rows(Save.objects.filter(user=user, post_id=post_id)):
+            saves_count = update_counter_returning(Post, post_id, 'saves_count', -1)
+            update_counter(User, user.pk, 'saved_posts_count', -1)
+            transaction.on_commit(partial(bump_profile_generation, user.pk))
+            return True, saves_count
+
+    saves_count = get_post_counter(post_id, 'saves_count')
+    return None if saves_count is None else (False, saves_count)
@@ -6,6 +6,7 @@ from . import views
 app_name = 'posts'
 urlpatterns = [
     path('', views.PostsView.as_view(), name='posts'),
+    path('feed/', views.FeedView.as_view(), name='feed'),
 
     path('create-post/', views.PostCreateView.as_view(), name='create_post'),
 
@@ -19,4 +20,7 @@ urlpatterns = [
 
     path('<int:pk>/save/', views.PostSaveView.as_view(), name='save_post'),
     path('<int:pk>/unsave/', views.PostUnSaveView.as_view(), name='unsave_post'),
+
+    path('api/<int:pk>/like/', views.PostLikeAPIView.as_view(), name='api_like_post'),
+    path('api/<int:pk>/save/', views.PostSaveAPIView.as_view(), name='api_save_post'),
 ]
\ No newline at end of file
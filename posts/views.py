@@ -1,36 +1,58 @@
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth import get_user_model
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, JsonResponse
+from django.shortcuts import render, redirect, aget_object_or_404
 from django.views import View
-from django.db.models import Count
-
-from notifications.models import Notification
-from utils.pagination import get_pagination_context
-from utils.mixins import PostOwnerRequiredMixin
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from notifications.fanout import enqueue_fanout
+from notifications.grouping import notify
+from search.backends import search_queryset, SEARCH_ORDERING
+from utils.pagination import get_cursor_pagination_context, aget_cursor_pagination_context
+from utils.mixins import LoginRequiredMixin, PostOwnerRequiredMixin, ReplicaReadMixin, get_resolved_object
+from utils.viewer_state import attach_post_viewer_state
 from .models import Post, Like, Save
+from .feed import get_feed
 from .forms import CommentForm, PostCreateEditForm
+from .toggles import like_post, unlike_post, save_post, unsave_post
 
 
 User = get_user_model()
 
 
-class PostsView(LoginRequiredMixin, View):
+class PostsView(LoginRequiredMixin, ReplicaReadMixin, View):
     template_name = 'posts/posts.html'
 
     def get(self, request):
-        # posts = Post.objects.all()
-        posts = Post.objects.annotate(
-            likes_count=Count('likes'),
-            comments_count=Count('comments'),
-        ).order_by('-likes_count', '-comments_count', '-created_at')
+        posts = Post.objects.visible().select_related('user')
+        ordering = ('-likes_count', '-comments_count', '-created_at', '-pk')
 
         if request.GET.get('search'):
             search = request.GET['search']
-            posts = posts.filter(body__icontains=search)
+            posts = search_queryset(posts, search)
+            ordering = SEARCH_ORDERING
 
+        page_obj = get_cursor_pagination_context(request, posts, 10, ordering=ordering)
+        attach_post_viewer_state(request.user, page_obj)
         return render(request, self.template_name, {
-            'page_obj': get_pagination_context(request, posts, 10),
+            'page_obj': page_obj,
+        })
+
+
+class FeedView(LoginRequiredMixin, View):
+    template_name = 'posts/feed.html'
+
+    def get(self, request):
+        before = request.GET.get('before')
+        posts, next_cursor = get_feed(
+            request.user,
+            before=int(before) if before and before.isdigit() else None,
+        )
+        return render(request, self.template_name, {
+            'posts': attach_post_viewer_state(request.user, posts),
+            'next_cursor': next_cursor,
         })
 
 
@@ -50,21 +72,9 @@ class PostCreateView(LoginRequiredMixin, View):
             user = request.user
             post = form.save(commit=False)
             post.user = user
-            post.save()
-
-            followers = user.get_followers()
-            
-            notifications = [
-                Notification(
-                    from_user=post.user,
-                    to_user=f,
-                    notification_type='post',
-                    post=post,
-                )
-                for f in followers
-            ]
-
-            Notification.objects.bulk_create(notifications)
+            with transaction.atomic():
+                post.save()
+                enqueue_fanout(user, 'post', post=post)
 
             messages.success(request, 'Successfully created post', 'info')
             return redirect(user.get_profile_url())
@@ -77,72 +87,64 @@ class PostDetailView(LoginRequiredMixin, View):
     template_name = 'posts/post_detail.html'
     form_class = CommentForm
 
-    def setup(self, request, *args, **kwargs):
-        self.post_instance = get_object_or_404(Post, pk=kwargs['pk'])
-        return super().setup(request, *args, **kwargs)
+    async def get_post(self, request, pk):
+        posts = Post.objects.visible().select_related('user').annotate(
+            is_liked=Exists(Like.objects.filter(user=request.user, post=OuterRef('pk'))),
+            is_saved=Exists(Save.objects.filter(user=request.user, post=OuterRef('pk'))),
+        )
+        return await aget_object_or_404(posts, pk=pk)
 
-    def get(self, request, **kwargs):
-        post = self.post_instance
-        is_liked = Like.objects.filter(user=request.user, post=post).exists() or False
-        is_saved = Save.objects.filter(user=request.user, post=post) or False
-        comments = post.comments.all()
-        return render(request, self.template_name, {
+    async def render_post(self, request, post, form):
+        comments = post.comments.filter(user__deleted_at__isnull=True).select_related('user')
+        return await sync_to_async(render)(request, self.template_name, {
             'post': post,
-            'is_liked': is_liked,
-            'is_saved': is_saved,
-            'comments': comments,
-            'form': self.form_class(),
+            'comments': await aget_cursor_pagination_context(request, comments, 20),
+            'form': form,
         })
 
-    def post(self, request, **kwargs):
-        post = self.post_instance
-        comments = post.comments.all()
+    async def get(self, request, **kwargs):
+        post = await self.get_post(request, kwargs['pk'])
+        return await self.render_post(request, post, self.form_class())
+
+    async def post(self, request, **kwargs):
+        post = await self.get_post(request, kwargs['pk'])
         form = self.form_class(request.POST)
 
         if form.is_valid():
+            await sync_to_async(self.create_comment)(request.user, post, form)
+            messages.success(request, 'Successfully sent comment', 'info')
+            return redirect(post.get_absolute_url())
+        return await self.render_post(request, post, form)
+
+    def create_comment(self, user, post, form):
+        with transaction.atomic():
             comment = form.save(commit=False)
-            comment.user = request.user
+            comment.user = user
             comment.post = post
             comment.save()
-            
-            if not request.user == post.user:
-                Notification.objects.create(
-                    from_user=request.user,
-                    to_user=post.user,
-                    notification_type='comment',
-                    comment=comment,
-                )
-            messages.success(request, 'Successfully sent comment', 'info')
-            return redirect(post.get_absolute_url())
-        return render(request, self.template_name, {
-            'post': post,
-            'comments': comments,
-            'form': form,
-        })
+
+            if not user == post.user:
+                notify(user, post.user, 'comment', post=post)
 
 
 class PostEditView(LoginRequiredMixin, PostOwnerRequiredMixin, View):
     template_name = 'posts/post_edit.html'
     form_class = PostCreateEditForm
 
-    def setup(self, request, *args, **kwargs):
-        self.post_instance = get_object_or_404(Post, pk=kwargs['pk'])
-        return super().setup(request, *args, **kwargs)
-
     def get(self, request, **kwargs):
-        post = self.post_instance
+        post = get_resolved_object(request, Post, pk=kwargs['pk'])
         return render(request, self.template_name, {
             'form': self.form_class(instance=post),
         })
 
     def post(self, request, **kwargs):
-        post = self.post_instance
+        post = get_resolved_object(request, Post, pk=kwargs['pk'])
         form = self.form_class(request.POST, instance=post)
 
         if form.is_valid():
-            post = form.save()
-            post.user = request.user
-            post.save()
+            post = form.save(commit=False)
+            # the counters may have changed since the post was loaded
+            post.save(update_fields=['body', 'updated_at'])
             messages.success(request, 'Successfully edited post', 'info')
             return redirect(post.get_absolute_url())
         return render(request, self.template_name, {
@@ -152,57 +154,84 @@ class PostEditView(LoginRequiredMixin, PostOwnerRequiredMixin, View):
 
 class PostDeleteView(LoginRequiredMixin, PostOwnerRequiredMixin, View):
     def get(self, request, **kwargs):
-        get_object_or_404(Post, user=request.user, pk=kwargs['pk']).delete()
+        get_resolved_object(request, Post, pk=kwargs['pk']).delete()
         messages.success(request, 'Successfully deleted post', 'info')
         return redirect(request.user.get_posts_url())
 
 
 class PostLikeView(LoginRequiredMixin, View):
-    def get(self, request, **kwargs):
-        post = get_object_or_404(Post, pk=kwargs['pk'])
-
-        if not Like.objects.filter(user=request.user, post=post).exists():
-            like = Like.objects.create(user=request.user, post=post)
-
-            if request.user != post.user:
-                Notification.objects.create(
-                    from_user=request.user,
-                    to_user=post.user,
-                    notification_type='like',
-                    like=like
-                )
-        
+    async def get(self, request, **kwargs):
+        result = await sync_to_async(like_post)(request.user, kwargs['pk'])
+        if result is None:
+            raise Http404
+        if result[0]:
             messages.success(request, 'Successfully liked post', 'info')
-        return redirect(post.get_absolute_url())
+        return redirect('posts:post_detail', kwargs['pk'])
 
 
 class PostUnlikeView(LoginRequiredMixin, View):
-    def get(self, request, **kwargs):
-        post = get_object_or_404(Post, pk=kwargs['pk'])
-        like = Like.objects.filter(user=request.user, post=post)
-
-        if like.exists():
-            like.delete()
+    async def get(self, request, **kwargs):
+        result = await sync_to_async(unlike_post)(request.user, kwargs['pk'])
+        if result is None:
+            raise Http404
+        if result[0]:
             messages.success(request, 'Successfully unliked post', 'info')
-        return redirect(post.get_absolute_url())
+        return redirect('posts:post_detail', kwargs['pk'])
 
 
 class PostSaveView(LoginRequiredMixin, View):
-    def get(self, request, **kwargs):
-        post = get_object_or_404(Post, pk=kwargs['pk'])
-
-        if not Save.objects.filter(user=request.user, post=post).exists():
-            Save.objects.create(user=request.user, post=post)
+    async def get(self, request, **kwargs):
+        result = await sync_to_async(save_post)(request.user, kwargs['pk'])
+        if result is None:
+            raise Http404
+        if result[0]:
             messages.success(request, 'Successfully saved post', 'info')
-        return redirect(post.get_absolute_url())
+        return redirect('posts:post_detail', kwargs['pk'])
 
 
 class PostUnSaveView(LoginRequiredMixin, View):
-    def get(self, request, **kwargs):
-        post = get_object_or_404(Post, pk=kwargs['pk'])
-        saved = Save.objects.filter(user=request.user, post=post)
-
-        if saved.exists():
-            saved.delete()
+    async def get(self, request, **kwargs):
+        result = await sync_to_async(unsave_post)(request.user, kwargs['pk'])
+        if result is None:
+            raise Http404
+        if result[0]:
             messages.success(request, 'Successfully unsaved post', 'info')
-        return redirect(post.get_absolute_url())
\ No newline at end of file
+        return redirect('posts:post_detail', kwargs['pk'])
+
+
+class PostToggleAPIView(LoginRequiredMixin, View):
+    """
+    POST sets and DELETE clears the toggle, both return the new state and
+    count as JSON.
+    """
+    raise_exception = True
+    state_key = None
+    count_key = None
+    set_toggle = None
+    clear_toggle = None
+
+    async def toggle(self, request, toggle, state):
+        result = await sync_to_async(toggle)(request.user, self.kwargs['pk'])
+        if result is None:
+            return JsonResponse({'error': 'Post not found'}, status=404)
+        return JsonResponse({self.state_key: state, self.count_key: result[1]})
+
+    async def post(self, request, **kwargs):
+        return await self.toggle(request, self.set_toggle, True)
+
+    async def delete(self, request, **kwargs):
+        return await self.toggle(request, self.clear_toggle, False)
+
+
+class PostLikeAPIView(PostToggleAPIView):
+    state_key = 'liked'
+    count_key = 'likes_count'
+    set_toggle = staticmethod(like_post)
+    clear_toggle = staticmethod(unlike_post)
+
+
+class PostSaveAPIView(PostToggleAPIView):
+    state_key = 'saved'
+    count_key = 'saves_count'
+    set_toggle = staticmethod(save_post)
+    clear_toggle = staticmethod(unsave_post)
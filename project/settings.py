@@ -45,9 +45,13 @@ INSTALLED_APPS = [
     'posts',
     'accounts',
     'notifications',
+    'search',
+    'utils',
 ]
 
 MIDDLEWARE = [
+    'utils.middleware.RequestInstrumentationMiddleware',
+    'utils.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     # 'whitenoise.middleware.WhiteNoiseMiddleware', # WhiteNoise
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -62,7 +66,7 @@ ROOT_URLCONF = 'project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'utils.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -84,7 +88,7 @@ WSGI_APPLICATION = 'project.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_DATABASE', BASE_DIR / 'db.sqlite3'),
     }
 }
 
@@ -142,4 +146,161 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
+# Posts of accounts with at least this many followers are not fanned out
+# into follower timelines, they are merged in when the feed is read.
+FEED_CELEBRITY_FOLLOWERS_THRESHOLD = 10000
+FEED_BACKFILL_POSTS = 20
+
+# Profile fragment generations and unread notification counts live in the
+# default cache, which must be shared by all workers too: a directory of
+# files by default, set CACHE_REDIS_URL to use Redis. A per-process
+# LocMemCache fails the utils.caches.E001 system check.
+#
+# Sessions live in the 'sessions' cache (utils.sessions) and only logins
+# are written through to django_session. The cache must be shared by all
+# workers, or a logout on one worker leaves the session alive in the
+# others and OTP codes are lost between them: it is a directory of files
+# by default (one host), set SESSION_REDIS_URL to use Redis instead (needs
+# `pip install redis`). The file backend lists its directory on every
+# write to cull old entries, so keep it for development and single-host
+# setups with few users. A per-process LocMemCache fails the
+# utils.sessions.E001 system check. Run the delete_expired_sessions
+# command periodically. Messages are kept in a signed cookie instead of
+# the session.
+CACHES = {
+    'default': {
+        'BACKEND': 'utils.caches.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', BASE_DIR / '.cache' / 'default'),
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+    'sessions': {
+        'BACKEND': 'utils.caches.FileBasedCache',
+        'LOCATION': os.environ.get('SESSION_CACHE_DIR', BASE_DIR / '.cache' / 'sessions'),
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+if os.environ.get('CACHE_REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'utils.caches.RedisCache',
+        'LOCATION': os.environ['CACHE_REDIS_URL'],
+    }
+if os.environ.get('SESSION_REDIS_URL'):
+    CACHES['sessions'] = {
+        'BACKEND': 'utils.caches.RedisCache',
+        'LOCATION': os.environ['SESSION_REDIS_URL'],
+    }
+SESSION_ENGINE = 'utils.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_SWEEP_BATCH_SIZE = 1000
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Tests use caches in a temporary directory and do not log requests.
+TEST_RUNNER = 'utils.testing.TestRunner'
+
+# Unread notification counts are cached per user. Rows removed by cascade
+# deletes are only reflected after the entry expires.
+NOTIFICATIONS_UNREAD_CACHE_TIMEOUT = 60 * 5
+
+# Post and story notifications are sent to followers by the
+# run_fanout_jobs command. Inline mode runs the job right after the
+# request commits, which is handy in development.
+NOTIFICATIONS_FANOUT_BATCH_SIZE = 1000
+NOTIFICATIONS_FANOUT_INLINE = DEBUG
+# A worker claims a job for this many seconds and renews the lease after
+# every batch, a crashed worker's job is picked up once it expires.
+NOTIFICATIONS_FANOUT_LEASE = 60 * 5
+
+# Unread follow/like/comment notifications with the same target are
+# grouped into one row within this many seconds.
+NOTIFICATIONS_GROUP_WINDOW = 60 * 60 * 24
+
+# Retention enforced by the compact_notifications command: unread
+# notifications are kept NOTIFICATIONS_KEEP_UNREAD_DAYS days, read ones
+# NOTIFICATIONS_KEEP_READ_DAYS days and every user keeps at most the newest
+# NOTIFICATIONS_MAX_PER_USER. None disables a rule.
+NOTIFICATIONS_KEEP_UNREAD_DAYS = 90
+NOTIFICATIONS_KEEP_READ_DAYS = 30
+NOTIFICATIONS_MAX_PER_USER = 500
+NOTIFICATIONS_COMPACTION_BATCH_SIZE = 1000
+
+# Profile fragments are also invalidated by a per-user generation number.
+PROFILE_FRAGMENT_CACHE_TIMEOUT = 60 * 15
+
+# Stories are hidden after STORY_LIFETIME seconds and removed by the
+# delete_expired_stories command in chunks of STORY_SWEEP_BATCH_SIZE.
+STORY_LIFETIME = 60 * 60 * 24
+STORY_SWEEP_BATCH_SIZE = 1000
+
+# Deleted accounts are hidden at once and purged table by table by the
+# run_account_deletions command (or right after the request when inline).
+ACCOUNT_DELETION_BATCH_SIZE = 1000
+ACCOUNT_DELETION_INLINE = DEBUG
+
+# Avatars are resized to these sizes (px) by the process_avatars command
+# and stored under content-hashed names in MEDIA_ROOT/avatars/, which can
+# be served with a far-future Cache-Control header.
+AVATAR_SIZES = (48, 128, 512)
+AVATAR_PROCESSING_INLINE = DEBUG
+
+# Reads of the list views (utils.mixins.ReplicaReadMixin) go to one of the
+# DATABASE_REPLICAS aliases. SQLITE_REPLICAS=2 adds local SQLite copies of
+# the primary that `manage.py sync_replicas` refreshes. After a write the
+# client reads from the primary for DATABASE_REPLICA_PIN_SECONDS, which
+# must be longer than the replication lag.
+for number in range(1, int(os.environ.get('SQLITE_REPLICAS', 0)) + 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db-replica{number}.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_REPLICA_PIN_SECONDS = 10
+DATABASE_ROUTERS = ['utils.routers.ReplicaRouter']
+
+# Opt-in SQLite production profile (SQLITE_TUNING=1): the PRAGMAs are set
+# on every new connection (utils.sqlite) and connections are kept open, so
+# concurrent writers wait up to busy_timeout ms for the lock instead of
+# failing with "database is locked". Transactions stay DEFERRED: IMMEDIATE
+# ones hold the write lock for the whole atomic block, which serialized
+# the fan-out batches behind the like toggles and made them time out (see
+# benchmark_sqlite). Run `manage.py optimize_sqlite` periodically next to it.
+SQLITE_TUNING = os.environ.get('SQLITE_TUNING') == '1'
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,  # KiB
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+if SQLITE_TUNING:
+    for database in DATABASES.values():
+        database['CONN_MAX_AGE'] = 600
+        database['CONN_HEALTH_CHECKS'] = True
+
+# Per-request query/time instrumentation (utils.middleware). A sample of
+# INSTRUMENTATION_SAMPLE_RATE of the requests is logged as JSON lines at
+# INFO on the project.requests logger, requests over their query budget
+# at WARNING. Budgets are keyed by URL name, e.g. {'posts:posts': 10}.
+# Cache hits are counted by the utils.caches backends.
+INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('INSTRUMENTATION_SAMPLE_RATE', 0.01))
+INSTRUMENTATION_DEFAULT_QUERY_BUDGET = None
+INSTRUMENTATION_QUERY_BUDGETS = {}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'project.requests': {
+            'handlers': ['console'],
+            'level': os.environ.get('INSTRUMENTATION_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
 # ---- END MY CONFIGS ----
\ No newline at end of file
@@ -0,0 +1,127 @@
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, Q, FloatField, Value
+
+
+# model label -> (SQLite FTS5 table, indexed fields)
+SEARCH_INDEXES = {
+    'posts.Post': ('search_post_fts', ['body']),
+    settings.AUTH_USER_MODEL: ('search_user_fts', ['username', 'email', 'first_name', 'last_name', 'bio']),
+}
+
+# Lower ranks are better on every backend.
+SEARCH_ORDERING = ('search_rank', '-pk')
+
+
+def get_search_index(model):
+    return SEARCH_INDEXES.get(model._meta.label)
+
+
+def get_fts_query(search):
+    return ' '.join(f'"{term}"*' for term in re.findall(r'\w+', search))
+
+
+fts_tables_cache = {}
+
+
+def has_fts_tables(connection):
+    key = (connection.alias, str(connection.settings_dict['NAME']))
+    if key not in fts_tables_cache:
+        table_names = connection.introspection.table_names()
+        fts_tables_cache[key] = all(table in table_names for table, _ in SEARCH_INDEXES.values())
+    return fts_tables_cache[key]
+
+
+def get_fts_connection(using):
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and has_fts_tables(connection):
+        return connection
+    return None
+
+
+def search_queryset(queryset, search):
+    """
+    Filter `queryset` (posts or users) by a full-text `search` and annotate
+    each row with `search_rank`, to be ordered by SEARCH_ORDERING.
+    """
+    connection = connections[queryset.db]
+    _, fields = get_search_index(queryset.model)
+
+    if connection.vendor == 'sqlite' and has_fts_tables(connection):
+        return search_sqlite(queryset, search)
+    if connection.vendor == 'postgresql':
+        return search_postgresql(queryset, fields, search)
+
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f"{field}__icontains": search})
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def search_sqlite(queryset, search):
+    fts_query = get_fts_query(search)
+    if not fts_query:
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    return queryset.filter(
+        search_index__document__match=fts_query,
+    ).annotate(
+        search_rank=F('search_index__rank'),
+    )
+
+
+def get_search_vector(fields):
+    from django.contrib.postgres.search import SearchVector
+
+    return SearchVector(*fields, config='simple')
+
+
+def search_postgresql(queryset, fields, search):
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    vector = get_search_vector(fields)
+    query = SearchQuery(search, config='simple', search_type='websearch')
+    return queryset.annotate(
+        search_document=vector,
+        search_rank=SearchRank(vector, query) * Value(-1.0),
+    ).filter(search_document=query)
+
+
+def index_object(instance, connection):
+    table, fields = get_search_index(type(instance))
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {qn(table)} WHERE rowid = %s", [instance.pk])
+        cursor.execute(
+            f"INSERT INTO {qn(table)} (rowid, {', '.join(fields)}) "
+            f"VALUES (%s, {', '.join(['%s'] * len(fields))})",
+            [instance.pk] + [getattr(instance, field) for field in fields],
+        )
+
+
+def unindex_object(instance, connection):
+    table, _ = get_search_index(type(instance))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {connection.ops.quote_name(table)} WHERE rowid = %s", [instance.pk])
+
+
+def unindex_objects(model, pks, connection):
+    table, _ = get_search_index(model)
+    placeholders = ', '.join(['%s'] * len(pks))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {connection.ops.quote_name(table)} WHERE rowid IN ({placeholders})", pks)
+
+
+def rebuild_index(model, connection):
+    table, fields = get_search_index(model)
+    qn = connection.ops.quote_name
+    columns = ', '.join(fields)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {qn(table)}")
+        cursor.execute(
+            f"INSERT INTO {qn(table)} (rowid, {columns}) "
+            f"SELECT {qn(model._meta.pk.column)}, {columns} FROM {qn(model._meta.db_table)}"
+        )
+        cursor.execute(f"INSERT INTO {qn(table)} ({qn(table)}) VALUES ('optimize')")
@@ -0,0 +1,77 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts.models import Post
+from search.backends import rebuild_index, search_queryset, SEARCH_ORDERING
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare full-text search against body__icontains scans on generated posts (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--words', type=int, default=20000, help='Vocabulary size.')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        vocabulary = [f"w{i}x{rng.randint(100, 999)}" for i in range(options['words'])]
+
+        with transaction.atomic():
+            self.generate_posts(rng, vocabulary, options['posts'])
+            rebuild_index(Post, connection)
+
+            # a very common, a medium and a rare word, plus a two word query
+            terms = [vocabulary[0], vocabulary[len(vocabulary) // 10], vocabulary[-1]]
+            terms.append(f"{vocabulary[1]} {vocabulary[2]}")
+
+            self.stdout.write(f"{'query':>24} {'icontains ms':>14} {'full-text ms':>14}")
+            for term in terms:
+                scan = self.measure(
+                    lambda: list(
+                        Post.objects.filter(body__icontains=term)
+                        .order_by('-likes_count', '-comments_count', '-created_at', '-pk')[:10]
+                    ),
+                    options['repeat'],
+                )
+                fts = self.measure(
+                    lambda: list(search_queryset(Post.objects.all(), term).order_by(*SEARCH_ORDERING)[:10]),
+                    options['repeat'],
+                )
+                self.stdout.write(f"{term:>24} {scan:>14.2f} {fts:>14.2f}")
+
+            transaction.set_rollback(True)
+
+    def generate_posts(self, rng, vocabulary, count):
+        user = User.objects.create(
+            username='searchbench',
+            email='searchbench@example.com',
+            phone_number='searchbench',
+            first_name='Search',
+            last_name='Bench',
+        )
+        # Zipf-like word frequencies, like real text
+        weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+        batch_size = 10000
+        for start in range(0, count, batch_size):
+            Post.objects.bulk_create([
+                Post(user=user, body=' '.join(rng.choices(vocabulary, weights, k=12)))
+                for _ in range(min(batch_size, count - start))
+            ])
+
+    def measure(self, query, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            query()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+
+from posts.models import Post
+from search.backends import has_fts_tables, rebuild_index
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the SQLite FTS5 search tables of posts and people from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+
+        if connection.vendor != 'sqlite':
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Nothing to rebuild on {connection.vendor}, the search index is maintained by the database."
+                )
+            )
+            return
+        if not has_fts_tables(connection):
+            self.stdout.write(self.style.ERROR('Search tables are missing, run migrate first.'))
+            return
+
+        for model in (Post, User):
+            with transaction.atomic(using=connection.alias):
+                rebuild_index(model, connection)
+            self.stdout.write(
+                self.style.SUCCESS(f"Indexed {model.objects.using(connection.alias).count()} {model._meta.verbose_name_plural}.")
+            )
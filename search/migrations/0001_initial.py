@@ -0,0 +1,91 @@
+import django.db.models.deletion
+import search.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+SEARCH_INDEXES = [
+    ('posts', 'Post', 'search_post_fts', ['body']),
+    ('accounts', 'CustomUser', 'search_user_fts', ['username', 'email', 'first_name', 'last_name', 'bio']),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    qn = connection.ops.quote_name
+
+    for app_label, model_name, table, fields in SEARCH_INDEXES:
+        model = apps.get_model(app_label, model_name)
+
+        if connection.vendor == 'sqlite':
+            columns = ', '.join(fields)
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {qn(table)} USING fts5({columns}, tokenize='unicode61')"
+            )
+            schema_editor.execute(
+                f"INSERT INTO {qn(table)} (rowid, {columns}) "
+                f"SELECT {qn(model._meta.pk.column)}, {columns} FROM {qn(model._meta.db_table)}"
+            )
+        elif connection.vendor == 'postgresql':
+            from django.contrib.postgres.indexes import GinIndex
+            from django.contrib.postgres.search import SearchVector
+
+            schema_editor.add_index(
+                model,
+                GinIndex(SearchVector(*fields, config='simple'), name=f"{table}_idx"),
+            )
+
+
+def drop_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+
+    for app_label, model_name, table, fields in SEARCH_INDEXES:
+        if connection.vendor == 'sqlite':
+            schema_editor.execute(f"DROP TABLE IF EXISTS {connection.ops.quote_name(table)}")
+        elif connection.vendor == 'postgresql':
+            schema_editor.execute(f"DROP INDEX IF EXISTS {connection.ops.quote_name(table + '_idx')}")
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0007_user_counters'),
+        ('posts', '0005_timelineentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.CreateModel(
+            name='PostSearchIndex',
+            fields=[
+                ('post', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='posts.post')),
+                ('body', models.TextField()),
+                ('document', search.models.FullTextDocumentField(db_column='search_post_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'search_post_fts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='UserSearchIndex',
+            fields=[
+                ('user', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('username', models.TextField()),
+                ('email', models.TextField()),
+                ('first_name', models.TextField()),
+                ('last_name', models.TextField()),
+                ('bio', models.TextField()),
+                ('document', search.models.FullTextDocumentField(db_column='search_user_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'search_user_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.db import models
+
+from posts.models import Post
+
+
+class FullTextDocumentField(models.TextField):
+    """
+    The hidden column of an FTS5 table that has the table's own name.
+    `document__match` runs a full-text query over all indexed columns.
+    """
+
+
+@FullTextDocumentField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", lhs_params + rhs_params
+
+
+class PostSearchIndex(models.Model):
+    post = models.OneToOneField(
+        Post,
+        primary_key=True,
+        db_column='rowid',
+        on_delete=models.DO_NOTHING,
+        related_name='search_index',
+    )
+    body = models.TextField()
+    document = FullTextDocumentField(db_column='search_post_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'search_post_fts'
+
+
+class UserSearchIndex(models.Model):
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        primary_key=True,
+        db_column='rowid',
+        on_delete=models.DO_NOTHING,
+        related_name='search_index',
+    )
+    username = models.TextField()
+    email = models.TextField()
+    first_name = models.TextField()
+    last_name = models.TextField()
+    bio = models.TextField()
+    document = FullTextDocumentField(db_column='search_user_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'search_user_fts'
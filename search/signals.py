@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from posts.models import Post
+from .backends import get_fts_connection, get_search_index, index_object, unindex_object
+
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=User)
+def update_search_index(sender, instance, using, update_fields, **kwargs):
+    # e.g. last_login updates do not touch indexed fields
+    _, fields = get_search_index(sender)
+    if update_fields and not set(update_fields) & set(fields):
+        return
+
+    connection = get_fts_connection(using)
+    if connection is not None:
+        index_object(instance, connection)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=User)
+def remove_from_search_index(sender, instance, using, **kwargs):
+    connection = get_fts_connection(using)
+    if connection is not None:
+        unindex_object(instance, connection)
@@ -0,0 +1,53 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from posts.models import Post
+from utils.testing import create_user
+from .backends import SEARCH_ORDERING, search_queryset
+
+
+@skipUnless(connection.vendor == 'sqlite', 'the FTS5 index is SQLite specific')
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = create_user('alice', first_name='Alice', bio='Writes about databases')
+        cls.bob = create_user('bob')
+        cls.some = Post.objects.create(user=cls.alice, body='django is a web framework for perfectionists with deadlines')
+        cls.most = Post.objects.create(user=cls.alice, body='django django django')
+        cls.other = Post.objects.create(user=cls.bob, body='flask')
+
+    def search(self, queryset, search):
+        return list(search_queryset(queryset, search).order_by(*SEARCH_ORDERING))
+
+    def test_posts_are_ranked_by_relevance(self):
+        self.assertEqual(self.search(Post.objects.all(), 'django'), [self.most, self.some])
+
+    def test_terms_match_word_prefixes(self):
+        self.assertEqual(self.search(Post.objects.all(), 'perfection dead'), [self.some])
+        self.assertEqual(self.search(Post.objects.all(), '"; DROP'), [])
+
+    def test_users_are_searched_by_their_profile(self):
+        users = get_user_model().objects.all()
+        self.assertEqual(self.search(users, 'alice'), [self.alice])
+        self.assertEqual(self.search(users, 'databases'), [self.alice])
+
+    def test_edits_update_the_index(self):
+        self.other.body = 'django rest framework'
+        self.other.save()
+        self.assertIn(self.other, self.search(Post.objects.all(), 'django'))
+        self.assertEqual(self.search(Post.objects.all(), 'flask'), [])
+
+        self.bob.first_name = 'Robert'
+        self.bob.save(update_fields=['first_name'])
+        self.assertEqual(self.search(get_user_model().objects.all(), 'robert'), [self.bob])
+
+    def test_deletes_update_the_index(self):
+        pk = self.most.pk
+        self.most.delete()
+        self.assertEqual(self.search(Post.objects.all(), 'django'), [self.some])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM search_post_fts WHERE rowid = %s', [pk])
+            self.assertEqual(cursor.fetchone()[0], 0)
@@ -0,0 +1,37 @@
+// Like, save and follow buttons call the JSON toggle API and update in
+// place. The href is kept as the fallback when the request fails.
+document.addEventListener('click', async (event) => {
+    const button = event.target.closest('[data-toggle-url]');
+    if (!button || button.dataset.busy) {
+        return;
+    }
+    event.preventDefault();
+    button.dataset.busy = 'true';
+
+    const active = button.dataset.active === 'true';
+    try {
+        const response = await fetch(button.dataset.toggleUrl, {
+            method: active ? 'DELETE' : 'POST',
+            headers: {'X-CSRFToken': document.querySelector('meta[name="csrf-token"]').content},
+            credentials: 'same-origin',
+        });
+        if (!response.ok) {
+            throw new Error(response.statusText);
+        }
+        const data = await response.json();
+        const state = (data.liked ?? data.saved ?? data.followed) ? 1 : 0;
+        const labels = button.dataset.labels.split('|');
+        const classes = button.dataset.classes.split('|');
+        const count = button.dataset.count ? ` ${data[button.dataset.count]}` : '';
+
+        button.dataset.active = state ? 'true' : 'false';
+        button.href = button.dataset.hrefs.split('|')[state];
+        button.classList.remove(...classes[1 - state].split(' '));
+        button.classList.add(...classes[state].split(' '));
+        button.textContent = labels[state] + count;
+    } catch (error) {
+        window.location.href = button.href;
+    } finally {
+        delete button.dataset.busy;
+    }
+});
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class UtilsConfig(AppConfig):
+    name = 'utils'
+
+    def ready(self):
+        from .sqlite import tune_sqlite_connection
+
+        connection_created.connect(tune_sqlite_connection, dispatch_uid='utils.sqlite')
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+
+
+def get_default_host():
+    """The first concrete ALLOWED_HOSTS entry, or localhost."""
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def get_viewer(username=None):
+    """The named user, or the user following the most people."""
+    User = get_user_model()
+    if username:
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f"There is no user `{username}`")
+
+    viewer = User.objects.order_by('-following_count').first()
+    if viewer is None:
+        raise CommandError('There are no users, run seed_social_graph first.')
+    return viewer
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core import checks
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.core.cache.backends import filebased, redis
+
+from .instrumentation import current_metrics, record_cache_lookup
+
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def check_default_cache(app_configs, **kwargs):
+    backend = settings.CACHES[DEFAULT_CACHE_ALIAS]['BACKEND']
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        checks.Error(
+            f"The default cache uses {backend}, which is not shared between worker processes.",
+            hint=(
+                'Profile generations and unread counts changed on one worker would stay stale on the '
+                'others. Use the file based, Redis or Memcached backend.'
+            ),
+            id='utils.caches.E001',
+        )
+    ]
+
+
+class InstrumentedCacheMixin:
+    """
+    Count the get() lookups of a cache backend as hits or misses of the
+    sampled request (utils.middleware), e.g. template fragments, profile
+    generations, unread counts and sessions.
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self._missing_key, version=version)
+        record_cache_lookup(hit=value is not self._missing_key)
+        return default if value is self._missing_key else value
+
+    def incr(self, key, delta=1, version=None):
+        # some backends read the value back with get()
+        token = current_metrics.set(None)
+        try:
+            return super().incr(key, delta, version=version)
+        finally:
+            current_metrics.reset(token)
+
+
+class FileBasedCache(InstrumentedCacheMixin, filebased.FileBasedCache):
+    pass
+
+
+class RedisCache(InstrumentedCacheMixin, redis.RedisCache):
+    pass
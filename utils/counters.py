@@ -0,0 +1,84 @@
+from django.db import connections, router
+from django.db.models import Count, OuterRef, Q, Subquery, F
+from django.db.models.functions import Coalesce
+
+
+def update_counter(model, pk, field, delta):
+    objects = model.objects.filter(pk=pk)
+    if delta < 0:
+        objects = objects.filter(**{f"{field}__gte": -delta})
+    objects.update(**{field: F(field) + delta})
+
+
+def update_counter_returning(model, pk, field, delta):
+    """
+    update_counter() that returns the new value (UPDATE ... RETURNING),
+    or None when there is no such row.
+    """
+    connection = connections[router.db_for_write(model)]
+    qn = connection.ops.quote_name
+    column = qn(model._meta.get_field(field).column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {qn(model._meta.db_table)} "
+            f"SET {column} = CASE WHEN {column} + %s < 0 THEN 0 ELSE {column} + %s END "
+            f"WHERE {qn(model._meta.pk.column)} = %s RETURNING {column}",
+            [delta, delta, pk],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+def recount_counters(model, counters, batch_size=1000, dry_run=False):
+    """
+    Walk `model` in primary key batches and repair stored counters.
+    `counters` maps a counter field to (related model, foreign key field).
+    Returns (checked_count, drifted_count).
+    """
+    subqueries = {
+        field: count_subquery(related_model, fk_field)
+        for field, (related_model, fk_field) in counters.items()
+    }
+    drift_filter = Q()
+    for field in counters:
+        drift_filter |= ~Q(**{field: F(f"actual_{field}")})
+
+    last_pk = 0
+    checked_count = 0
+    drifted_count = 0
+
+    while True:
+        pks = list(
+            model.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            break
+        last_pk = pks[-1]
+        checked_count += len(pks)
+
+        drifted_pks = list(
+            model.objects.filter(pk__in=pks)
+            .annotate(**{f"actual_{field}": sq for field, sq in subqueries.items()})
+            .filter(drift_filter)
+            .values_list('pk', flat=True)
+        )
+        drifted_count += len(drifted_pks)
+
+        if drifted_pks and not dry_run:
+            model.objects.filter(pk__in=drifted_pks).update(**subqueries)
+    return checked_count, drifted_count
@@ -0,0 +1,39 @@
+from django.db import connections, models
+
+
+def delete_rows(queryset):
+    """
+    Delete the rows of `queryset` with one DELETE statement. Unlike
+    QuerySet.delete() nothing is loaded into memory and no signals are sent.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    qn = connection.ops.quote_name
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {qn(model._meta.db_table)} WHERE {qn(model._meta.pk.column)} IN ({sql})",
+            params,
+        )
+        return cursor.rowcount
+
+
+def get_cascade_relations(model):
+    return [
+        field for field in model._meta.get_fields(include_hidden=True)
+        if field.auto_created and not field.concrete
+        and (field.one_to_many or field.one_to_one)
+        and field.on_delete is models.CASCADE
+    ]
+
+
+def delete_cascade(queryset):
+    """
+    delete_rows() that first deletes, the same way, the rows pointing at
+    `queryset` through on_delete=CASCADE foreign keys.
+    """
+    for relation in get_cascade_relations(queryset.model):
+        delete_cascade(
+            relation.related_model._base_manager.filter(**{f"{relation.field.name}__in": queryset.values('pk')})
+        )
+    return delete_rows(queryset)
@@ -0,0 +1,9 @@
+from django.utils import timezone
+
+
+def get_throughput(count, started_at, finished_at=None):
+    """Rows per second of a background job, 0 before it starts."""
+    if started_at is None:
+        return 0
+    elapsed = ((finished_at or timezone.now()) - started_at).total_seconds()
+    return round(count / elapsed, 1) if elapsed > 0 else 0
@@ -0,0 +1,185 @@
+import http.client
+import json
+import os
+import shlex
+import socket
+import statistics
+import subprocess
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import Post
+from utils.benchmarks import get_default_host
+
+
+User = get_user_model()
+
+SERVER_COMMANDS = {
+    'wsgi': 'gunicorn project.wsgi:application --bind 127.0.0.1:{port} --workers {workers} --threads {threads}',
+    'asgi': 'uvicorn project.asgi:application --host 127.0.0.1 --port {port} --workers {workers} --no-access-log',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test the hot read and toggle endpoints under a WSGI (gunicorn) and an ASGI (uvicorn) '
+        'server and report throughput and latency percentiles as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', choices=list(SERVER_COMMANDS), default=list(SERVER_COMMANDS))
+        parser.add_argument('--wsgi-command', default=SERVER_COMMANDS['wsgi'])
+        parser.add_argument('--asgi-command', default=SERVER_COMMANDS['asgi'])
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=8, help='Threads per WSGI worker.')
+        parser.add_argument('--concurrency', type=int, default=32, help='Simultaneous clients, one user each.')
+        parser.add_argument('--rounds', type=int, default=10, help='Request sequences per client.')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--host', help='Host header to send (default: the first ALLOWED_HOSTS entry or localhost).')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        post = Post.objects.visible().order_by('-likes_count', '-comments_count').first()
+        if post is None:
+            raise CommandError('There are no posts, run seed_social_graph first.')
+        followed = post.user
+
+        self.host = options['host'] or get_default_host()
+        viewers = list(User.objects.exclude(pk=followed.pk).order_by('pk')[:options['concurrency']])
+        cookies = [self.get_session_cookie(viewer) for viewer in viewers]
+
+        # every client runs the same sequence, toggles are undone in the same round
+        self.paths = [
+            ('post_detail', post.get_absolute_url()),
+            ('notifications', reverse('notifications:notifications')),
+            ('like', post.get_like_url()),
+            ('unlike', post.get_unlike_url()),
+            ('save', post.get_save_url()),
+            ('unsave', post.get_unsave_url()),
+            ('follow', followed.get_follow_url()),
+            ('unfollow', followed.get_unfollow_url()),
+        ]
+
+        report = {
+            'concurrency': len(cookies),
+            'rounds': options['rounds'],
+            'workers': options['workers'],
+            'servers': {},
+        }
+        for server in options['servers']:
+            command = options[f'{server}_command'].format(
+                port=options['port'], workers=options['workers'], threads=options['threads'],
+            )
+            report['servers'][server] = self.run_server(command, options['port'], cookies, options['rounds'])
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def get_session_cookie(self, user):
+        client = Client()
+        client.force_login(user)
+        return f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+    def run_server(self, command, port, cookies, rounds):
+        self.stderr.write(f"Starting: {command}")
+        try:
+            process = subprocess.Popen(
+                shlex.split(command),
+                cwd=settings.BASE_DIR,
+                env={**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'project.settings')},
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except FileNotFoundError:
+            return {'command': command, 'skipped': f"{shlex.split(command)[0]} is not installed"}
+
+        try:
+            if not self.wait_for_port(port):
+                return {'command': command, 'skipped': 'the server did not start'}
+            # warm up workers, connections and caches
+            self.run_load(port, cookies[:1], 1)
+            result = self.run_load(port, cookies, rounds)
+            return {'command': command, **result}
+        finally:
+            process.terminate()
+            process.wait()
+
+    def wait_for_port(self, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=1):
+                    return True
+            except OSError:
+                time.sleep(0.2)
+        return False
+
+    def run_load(self, port, cookies, rounds):
+        timings = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+
+        def client(cookie):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            headers = {'Host': self.host, 'Cookie': cookie}
+            for _ in range(rounds):
+                for name, path in self.paths:
+                    start = time.perf_counter()
+                    try:
+                        connection.request('GET', path, headers=headers)
+                        response = connection.getresponse()
+                        response.read()
+                        ok = response.status < 400
+                    except (OSError, http.client.HTTPException):
+                        connection.close()
+                        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                        ok = False
+                    elapsed = (time.perf_counter() - start) * 1000
+                    with lock:
+                        if ok:
+                            timings[name].append(elapsed)
+                        else:
+                            errors[name] += 1
+            connection.close()
+
+        threads = [threading.Thread(target=client, args=(cookie,)) for cookie in cookies]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        all_timings = [timing for values in timings.values() for timing in values]
+        return {
+            'requests': len(all_timings),
+            'errors': sum(errors.values()),
+            'requests_per_second': round(len(all_timings) / elapsed, 1),
+            **self.get_percentiles(all_timings),
+            'endpoints': {
+                name: {**self.get_percentiles(timings[name]), 'errors': errors[name]}
+                for name, _ in self.paths
+            },
+        }
+
+    def get_percentiles(self, timings):
+        if len(timings) < 2:
+            return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+        percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+        return {
+            'p50_ms': round(percentiles[49], 2),
+            'p95_ms': round(percentiles[94], 2),
+            'p99_ms': round(percentiles[98], 2),
+        }
@@ -0,0 +1,191 @@
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+from notifications.fanout import run_fanout_job
+from notifications.models import FanOutJob
+from posts.models import Post
+from posts.toggles import like_post, unlike_post
+
+
+User = get_user_model()
+
+PROFILES = {
+    'default': '0',
+    'tuned': '1',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent like/unlike and notification fan-out writers against copies of the SQLite '
+        'database, once with the default settings and once with the SQLITE_TUNING profile, and '
+        'report throughput, latency percentiles and "database is locked" errors as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES))
+        parser.add_argument('--writers', type=int, default=8, help='Threads toggling likes.')
+        parser.add_argument('--fanout-writers', type=int, default=2, help='Threads running fan-out jobs.')
+        parser.add_argument('--fanout-batch-size', type=int, default=200)
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per profile.')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+        # internal, runs the writers in the current process and settings
+        parser.add_argument('--worker', action='store_true', help='Run the writers in this process.')
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('The database is not SQLite.')
+
+        if options['worker']:
+            self.stdout.write(json.dumps(self.run_writers(options)))
+            return
+
+        if not Post.objects.exists():
+            raise CommandError('There are no posts, run seed_social_graph first.')
+
+        report = {
+            'writers': options['writers'],
+            'fanout_writers': options['fanout_writers'],
+            'duration': options['duration'],
+            'profiles': {profile: self.run_profile(profile, options) for profile in options['profiles']},
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def run_profile(self, profile, options):
+        self.stderr.write(f"Running the {profile} profile for {options['duration']}s")
+        with tempfile.TemporaryDirectory() as directory:
+            # every profile starts from the same copy of the database
+            path = os.path.join(directory, 'benchmark.sqlite3')
+            primary = connections[DEFAULT_DB_ALIAS]
+            primary.ensure_connection()
+            copy = sqlite3.connect(path)
+            try:
+                primary.connection.backup(copy)
+                copy.execute('PRAGMA journal_mode = DELETE')
+            finally:
+                copy.close()
+
+            result = subprocess.run(
+                [
+                    sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_sqlite', '--worker',
+                    '--writers', str(options['writers']),
+                    '--fanout-writers', str(options['fanout_writers']),
+                    '--fanout-batch-size', str(options['fanout_batch_size']),
+                    '--duration', str(options['duration']),
+                ],
+                env={**os.environ, 'SQLITE_DATABASE': path, 'SQLITE_TUNING': PROFILES[profile]},
+                capture_output=True,
+                text=True,
+            )
+        if result.returncode != 0:
+            raise CommandError(f"The {profile} run failed:\n{result.stderr}")
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def run_writers(self, options):
+        user_ids = list(User.objects.values_list('pk', flat=True)[:1000])
+        post_ids = list(Post.objects.order_by('-pk').values_list('pk', flat=True)[:1000])
+        # fan-out for posts of accounts with followers
+        fanout_post_ids = list(
+            Post.objects.filter(user__followers_count__gt=0).order_by('-pk').values_list('pk', flat=True)[:100]
+        )
+        connections.close_all()
+
+        timings = {'toggle': [], 'fanout': []}
+        errors = {'toggle': 0, 'fanout': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def record(kind, operation):
+            start = time.perf_counter()
+            try:
+                operation()
+                ok = True
+            except OperationalError:
+                # "database is locked"
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if ok:
+                    timings[kind].append(elapsed)
+                else:
+                    errors[kind] += 1
+
+        def toggle_writer(seed):
+            generator = random.Random(seed)
+            users = {user.pk: user for user in User.objects.filter(pk__in=generator.sample(user_ids, min(len(user_ids), 50)))}
+            while time.monotonic() < deadline:
+                user = users[generator.choice(list(users))]
+                post_id = generator.choice(post_ids)
+                record('toggle', lambda: like_post(user, post_id))
+                record('toggle', lambda: unlike_post(user, post_id))
+            connections.close_all()
+
+        def fanout_writer(seed):
+            generator = random.Random(seed)
+            while time.monotonic() < deadline and fanout_post_ids:
+                post = Post.objects.get(pk=generator.choice(fanout_post_ids))
+
+                def fan_out():
+                    job = FanOutJob.objects.create(from_user_id=post.user_id, notification_type='post', post=post)
+                    run_fanout_job(job, batch_size=options['fanout_batch_size'])
+                record('fanout', fan_out)
+            connections.close_all()
+
+        threads = [threading.Thread(target=toggle_writer, args=(seed,)) for seed in range(options['writers'])]
+        threads += [
+            threading.Thread(target=fanout_writer, args=(seed,)) for seed in range(options['fanout_writers'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'journal_mode': self.get_journal_mode(),
+            'errors': sum(errors.values()),
+            **{
+                kind: {
+                    'operations': len(values),
+                    'operations_per_second': round(len(values) / elapsed, 1),
+                    'errors': errors[kind],
+                    **self.get_percentiles(values),
+                }
+                for kind, values in timings.items()
+            },
+        }
+
+    def get_journal_mode(self):
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            return cursor.fetchone()[0]
+
+    def get_percentiles(self, timings):
+        if len(timings) < 2:
+            return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+        percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+        return {
+            'p50_ms': round(percentiles[49], 2),
+            'p95_ms': round(percentiles[94], 2),
+            'p99_ms': round(percentiles[98], 2),
+        }
@@ -0,0 +1,57 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'Run PRAGMA optimize and checkpoint the write-ahead log of the SQLite primary database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep optimizing on a schedule.')
+        parser.add_argument('--interval', type=float, default=60 * 60, help='Seconds between runs in loop mode.')
+        parser.add_argument(
+            '--checkpoint-mode', default='TRUNCATE', choices=['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'],
+            help='TRUNCATE waits for readers and empties the WAL file, PASSIVE never blocks.',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor != 'sqlite':
+            self.stdout.write(self.style.WARNING('The database is not SQLite, nothing to do.'))
+            return
+
+        while True:
+            self.optimize(connection, options['checkpoint_mode'])
+
+            if not options['loop']:
+                break
+            # do not hold the connection while sleeping
+            connection.close()
+            time.sleep(options['interval'])
+
+    def optimize(self, connection, checkpoint_mode):
+        started = time.monotonic()
+        wal_path = f"{settings.DATABASES[DEFAULT_DB_ALIAS]['NAME']}-wal"
+        wal_size = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA optimize')
+            cursor.execute('PRAGMA journal_mode')
+            if cursor.fetchone()[0] != 'wal':
+                self.stdout.write(self.style.SUCCESS(f"Optimized in {time.monotonic() - started:.2f}s (not in WAL mode)."))
+                return
+            cursor.execute(f"PRAGMA wal_checkpoint({checkpoint_mode})")
+            busy, log_pages, checkpointed_pages = cursor.fetchone()
+
+        remaining = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+        message = (
+            f"Optimized and checkpointed {checkpointed_pages} of {log_pages} WAL pages in "
+            f"{time.monotonic() - started:.2f}s, WAL file {wal_size // 1024} KiB -> {remaining // 1024} KiB."
+        )
+        if busy:
+            self.stdout.write(self.style.WARNING(message + ' Readers or writers kept it from completing.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,49 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the SQLite primary database to the local SQLite replicas (SQLITE_REPLICAS), '
+        'standing in for replication while developing'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep copying on a schedule.')
+        parser.add_argument('--interval', type=float, default=2, help='Seconds between copies in loop mode.')
+
+    def handle(self, *args, **options):
+        aliases = [DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS]
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('There are no replicas, set SQLITE_REPLICAS.')
+        if any(connections[alias].vendor != 'sqlite' for alias in aliases):
+            raise CommandError('Only SQLite databases can be copied.')
+
+        while True:
+            self.sync()
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self):
+        started = time.monotonic()
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+
+        for alias in settings.DATABASE_REPLICAS:
+            # the backup API copies a consistent snapshot while others write
+            replica = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+            try:
+                primary.connection.backup(replica)
+            finally:
+                replica.close()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Copied the primary to {len(settings.DATABASE_REPLICAS)} replicas in {elapsed:.2f}s.")
+        )
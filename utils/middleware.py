@@ -0,0 +1,143 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .instrumentation import RequestMetrics, current_metrics, install_query_recorder
+from .routers import RequestRouting, current_routing
+
+
+logger = logging.getLogger('project.requests')
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Record query count, DB time, template render time and cache hits of a
+    sample of requests. They are sent in a Server-Timing header and logged
+    as one JSON line; views over their query budget log a warning.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+        connection_created.connect(install_query_recorder, dispatch_uid='utils.instrumentation')
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= settings.INSTRUMENTATION_SAMPLE_RATE:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.INSTRUMENTATION_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    def finish(self, request, response, metrics, start):
+        total_time = time.perf_counter() - start
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+            f'tpl;dur={metrics.template_time * 1000:.1f}',
+            f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"',
+            f'total;dur={total_time * 1000:.1f}',
+        ])
+        self.log(request, response, metrics, total_time)
+        return response
+
+    def log(self, request, response, metrics, total_time):
+        view_name = request.resolver_match.view_name if request.resolver_match else None
+        record = {
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'template_ms': round(metrics.template_time * 1000, 2),
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+            'total_ms': round(total_time * 1000, 2),
+        }
+        logger.info(json.dumps(record))
+
+        budget = settings.INSTRUMENTATION_QUERY_BUDGETS.get(
+            view_name, settings.INSTRUMENTATION_DEFAULT_QUERY_BUDGET
+        )
+        if budget is not None and metrics.queries > budget:
+            logger.warning(json.dumps({**record, 'event': 'query_budget_exceeded', 'budget': budget}))
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Track the database routing state of the request for
+    utils.routers.ReplicaRouter. A request that wrote sets a cookie that
+    keeps the client's reads on the primary for DATABASE_REPLICA_PIN_SECONDS.
+    """
+
+    sync_capable = True
+    async_capable = True
+    cookie_name = 'primary_pin'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = RequestRouting(pinned=self.cookie_name in request.COOKIES)
+        token = current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        return self.finish(routing, response)
+
+    async def __acall__(self, request):
+        routing = RequestRouting(pinned=self.cookie_name in request.COOKIES)
+        token = current_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        return self.finish(routing, response)
+
+    def finish(self, routing, response):
+        if routing.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                self.cookie_name, '1',
+                max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -1,43 +1,151 @@
 from django.contrib import messages
 from django.contrib.auth import get_user_model
-from django.shortcuts import redirect, get_object_or_404
+from django.contrib.auth.mixins import LoginRequiredMixin as BaseLoginRequiredMixin
+from django.shortcuts import redirect, get_object_or_404, aget_object_or_404
 
 from posts.models import Post
+from .routers import current_routing
 
 
 User = get_user_model()
 
+# Every mixin also works on views with async handlers (View.view_is_async):
+# dispatch() then returns a coroutine and uses the async ORM and
+# request.auser() instead of the lazy request.user.
+
+
+def get_identity_map(request):
+    if not hasattr(request, 'identity_map'):
+        request.identity_map = {}
+    return request.identity_map
+
+
+def get_resolved_object(request, model, **lookup):
+    """
+    get_object_or_404() that loads each (model, lookup) once per request, so
+    the view reuses the object its permission mixin resolved.
+    """
+    identity_map = get_identity_map(request)
+    key = (model, *lookup.items())
+    if key not in identity_map:
+        identity_map[key] = get_object_or_404(model, **lookup)
+    return identity_map[key]
+
+
+async def aget_resolved_object(request, model, **lookup):
+    identity_map = get_identity_map(request)
+    key = (model, *lookup.items())
+    if key not in identity_map:
+        identity_map[key] = await aget_object_or_404(model, **lookup)
+    return identity_map[key]
+
+
+def get_resolved_user(request, username):
+    # the signed in user is already loaded
+    if request.user.is_authenticated and request.user.username == username:
+        return request.user
+    return get_resolved_object(request, User, username=username)
+
+
+async def aget_resolved_user(request, username):
+    user = await request.auser()
+    if user.is_authenticated and user.username == username:
+        return user
+    return await aget_resolved_object(request, User, username=username)
+
+
+class LoginRequiredMixin(BaseLoginRequiredMixin):
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self.dispatch_login_async(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+    async def dispatch_login_async(self, request, *args, **kwargs):
+        # later sync code (e.g. templates) reuses the loaded user
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        return await super(BaseLoginRequiredMixin, self).dispatch(request, *args, **kwargs)
+
 
 class AnonymousRequiredMixin:
     def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self.dispatch_anonymous_async(request, *args, **kwargs)
         if request.user.is_authenticated:
             messages.error(request, 'Access Denied', 'danger')
             return redirect('social_network')
         return super().dispatch(request, *args, **kwargs)
 
+    async def dispatch_anonymous_async(self, request, *args, **kwargs):
+        if (await request.auser()).is_authenticated:
+            messages.error(request, 'Access Denied', 'danger')
+            return redirect('social_network')
+        return await super().dispatch(request, *args, **kwargs)
+
 
 class OwnerRequiredMixin:
     def dispatch(self, request, *args, **kwargs):
-        user = get_object_or_404(User, username=kwargs['username'])
+        if self.view_is_async:
+            return self.dispatch_owner_async(request, *args, **kwargs)
+        user = get_resolved_user(request, kwargs['username'])
         if request.user != user:
             messages.error(request, 'Access Denied', 'danger')
             return redirect('social_network')
         return super().dispatch(request, *args, **kwargs)
 
+    async def dispatch_owner_async(self, request, *args, **kwargs):
+        user = await aget_resolved_user(request, kwargs['username'])
+        if await request.auser() != user:
+            messages.error(request, 'Access Denied', 'danger')
+            return redirect('social_network')
+        return await super().dispatch(request, *args, **kwargs)
+
 
 class SelfForbiddenMixin:
     def dispatch(self, request, *args, **kwargs):
-        user = get_object_or_404(User, username=kwargs['username'])
+        if self.view_is_async:
+            return self.dispatch_self_forbidden_async(request, *args, **kwargs)
+        user = get_resolved_user(request, kwargs['username'])
         if request.user == user:
             messages.error(request, 'Access Denied', 'danger')
             return redirect('social_network')
         return super().dispatch(request, *args, **kwargs)
 
+    async def dispatch_self_forbidden_async(self, request, *args, **kwargs):
+        user = await aget_resolved_user(request, kwargs['username'])
+        if await request.auser() == user:
+            messages.error(request, 'Access Denied', 'danger')
+            return redirect('social_network')
+        return await super().dispatch(request, *args, **kwargs)
+
 
 class PostOwnerRequiredMixin:
     def dispatch(self, request, *args, **kwargs):
-        post = get_object_or_404(Post, pk=kwargs['pk'])
-        if request.user != post.user:
+        if self.view_is_async:
+            return self.dispatch_post_owner_async(request, *args, **kwargs)
+        post = get_resolved_object(request, Post, pk=kwargs['pk'])
+        if request.user.pk != post.user_id:
             messages.error(request, 'Access Denied', 'danger')
             return redirect(post.get_absolute_url())
-        return super().dispatch(request, *args, **kwargs)
\ No newline at end of file
+        return super().dispatch(request, *args, **kwargs)
+
+    async def dispatch_post_owner_async(self, request, *args, **kwargs):
+        post = await aget_resolved_object(request, Post, pk=kwargs['pk'])
+        if (await request.auser()).pk != post.user_id:
+            messages.error(request, 'Access Denied', 'danger')
+            return redirect(post.get_absolute_url())
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class ReplicaReadMixin:
+    """
+    Reads of the view may be served by a read replica (utils.routers).
+    Use it for list pages where a few seconds of lag is acceptable.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        routing = current_routing.get()
+        if routing is not None:
+            routing.replica_reads = True
+        return super().dispatch(request, *args, **kwargs)
@@ -1,9 +1,158 @@
-from django.core.paginator import Paginator
+from datetime import datetime
 
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
 
-def get_pagination_context(request, object_list, per_page):
-    paginator = Paginator(object_list, per_page)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
 
-    return page_obj
\ No newline at end of file
+CURSOR_SALT = 'utils.pagination.cursor'
+
+
+class CursorPage:
+    """
+    A page of a CursorPaginator. It can be used like a Django Page in
+    templates (iteration, truthiness, has_next/has_previous), but it has no
+    page numbers, only opaque next/previous cursors.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.next_query = ''
+        self.previous_query = ''
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator:
+    """
+    Keyset paginator: each page is fetched with a WHERE clause on the
+    ordering columns of the last seen row, so deep pages cost the same as
+    the first one and no COUNT(*) is run. The last ordering field must be
+    unique (e.g. the primary key) to break ties.
+    """
+
+    def __init__(self, object_list, per_page, ordering):
+        self.object_list = object_list.order_by(*ordering)
+        self.per_page = per_page
+        # a cursor only decodes in a list of the same model and ordering
+        self.salt = f"{CURSOR_SALT}:{self.object_list.model._meta.label}:{','.join(ordering)}"
+        self.fields = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+    def get_model_field(self, name):
+        model = self.object_list.model
+        if name == 'pk':
+            return model._meta.pk
+        try:
+            return model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+    def encode_cursor(self, obj, direction):
+        values = []
+        for name, _ in self.fields:
+            value = getattr(obj, name)
+            values.append(value.isoformat() if isinstance(value, datetime) else value)
+        return signing.dumps([direction, values], salt=self.salt, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            direction, values = signing.loads(cursor, salt=self.salt)
+        except (signing.BadSignature, TypeError, ValueError):
+            return None, None
+
+        if direction not in ('next', 'previous') or len(values) != len(self.fields):
+            return None, None
+
+        decoded = []
+        for (name, _), value in zip(self.fields, values):
+            field = self.get_model_field(name)
+            try:
+                decoded.append(field.to_python(value) if field is not None else value)
+            except (ValidationError, TypeError, ValueError):
+                return None, None
+        return direction, decoded
+
+    def get_position_filter(self, values, forward):
+        position = Q()
+        for i, (name, descending) in enumerate(self.fields):
+            lookup = 'lt' if descending == forward else 'gt'
+            condition = Q(**{f"{name}__{lookup}": values[i]})
+            for j, (previous_name, _) in enumerate(self.fields[:i]):
+                condition &= Q(**{previous_name: values[j]})
+            position |= condition
+        return position
+
+    def get_page_queryset(self, cursor):
+        direction, values = self.decode_cursor(cursor) if cursor else (None, None)
+
+        if values is None:
+            direction = 'next'
+            queryset = self.object_list
+        elif direction == 'next':
+            queryset = self.object_list.filter(self.get_position_filter(values, forward=True))
+        else:
+            queryset = self.object_list.filter(self.get_position_filter(values, forward=False)).reverse()
+
+        return direction, values, queryset[:self.per_page + 1]
+
+    def make_page(self, items, direction, values):
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+
+        if direction == 'previous':
+            items.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        return CursorPage(
+            items,
+            self.encode_cursor(items[-1], 'next') if has_next and items else None,
+            self.encode_cursor(items[0], 'previous') if has_previous and items else None,
+        )
+
+    def get_page(self, cursor):
+        direction, values, queryset = self.get_page_queryset(cursor)
+        return self.make_page(list(queryset), direction, values)
+
+    async def aget_page(self, cursor):
+        direction, values, queryset = self.get_page_queryset(cursor)
+        return self.make_page([obj async for obj in queryset], direction, values)
+
+
+def set_page_queries(request, page_obj):
+    query = request.GET.copy()
+    query.pop('page', None)
+    if page_obj.next_cursor:
+        query['cursor'] = page_obj.next_cursor
+        page_obj.next_query = query.urlencode()
+    if page_obj.previous_cursor:
+        query['cursor'] = page_obj.previous_cursor
+        page_obj.previous_query = query.urlencode()
+    return page_obj
+
+
+def get_cursor_pagination_context(request, object_list, per_page, ordering=('-created_at', '-pk')):
+    paginator = CursorPaginator(object_list, per_page, ordering)
+    return set_page_queries(request, paginator.get_page(request.GET.get('cursor')))
+
+
+async def aget_cursor_pagination_context(request, object_list, per_page, ordering=('-created_at', '-pk')):
+    paginator = CursorPaginator(object_list, per_page, ordering)
+    return set_page_queries(request, await paginator.aget_page(request.GET.get('cursor')))
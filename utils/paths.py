@@ -1,15 +1,10 @@
 import os
+import uuid
 
 from django.utils.text import slugify
-from django.conf import settings
 
 
 def get_user_image_upload_path(instance, filename):
+    # A new name for every upload, old files are removed by gc_avatars.
     username = slugify(instance.username)
-    filename = f"{username}{os.path.splitext(filename)[1]}"
-    file_path = f"accounts/{username}/{filename}"
-    full_path = os.path.join(settings.MEDIA_ROOT, file_path)
-
-    if os.path.isfile(full_path):
-        os.remove(full_path)
-    return file_path
\ No newline at end of file
+    return f"accounts/{username}/{uuid.uuid4().hex}{os.path.splitext(filename)[1].lower()}"
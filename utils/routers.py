@@ -0,0 +1,62 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class RequestRouting:
+    def __init__(self, pinned=False):
+        # the client wrote within DATABASE_REPLICA_PIN_SECONDS
+        self.pinned = pinned
+        # set by ReplicaReadMixin for views whose reads may lag behind
+        self.replica_reads = False
+        self.wrote = False
+        self.replica = None
+
+
+# set by utils.middleware.ReplicaRoutingMiddleware for each request
+current_routing = ContextVar('current_routing', default=None)
+
+
+class ReplicaRouter:
+    """
+    Send the reads of views using ReplicaReadMixin to one of
+    DATABASE_REPLICAS, chosen once per request, and everything else to the
+    primary. Clients that wrote recently read from the primary (read your
+    writes), as do requests that already wrote and open transactions.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        if (
+            routing is None
+            or not routing.replica_reads
+            or routing.pinned
+            or routing.wrote
+            or not settings.DATABASE_REPLICAS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+
+        if routing.replica is None:
+            routing.replica = random.choice(settings.DATABASE_REPLICAS)
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = current_routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas are copies of the primary
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
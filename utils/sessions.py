@@ -0,0 +1,163 @@
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.base import CreateError
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core import checks
+from django.core.cache import caches
+from django.db import router, transaction
+from django.utils import timezone
+
+from utils.caches import PROCESS_LOCAL_CACHES
+from utils.deletion import delete_rows
+
+
+KEY_PREFIX = 'utils.sessions'
+
+
+def check_session_cache(app_configs, **kwargs):
+    if settings.SESSION_ENGINE != __name__:
+        return []
+    backend = settings.CACHES[settings.SESSION_CACHE_ALIAS]['BACKEND']
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        checks.Error(
+            f"The session cache '{settings.SESSION_CACHE_ALIAS}' uses {backend}, which is not shared "
+            "between worker processes.",
+            hint='Logouts would not reach the other workers. Use the file based, Redis or Memcached backend.',
+            id='utils.sessions.E001',
+        )
+    ]
+
+
+def delete_expired_sessions_batch(batch_size):
+    # the cache entries expire on their own
+    model = SessionStore.get_model_class()
+    session_keys = list(
+        model.objects.filter(expire_date__lt=timezone.now())
+        .order_by('expire_date')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    if not session_keys:
+        return 0
+    return delete_rows(model.objects.filter(pk__in=session_keys))
+
+
+class SessionStore(DBStore):
+    """
+    Sessions live in the SESSION_CACHE_ALIAS cache. Only the login (the auth
+    keys) is written through to django_session, when it changes or when the
+    row is about to expire, so a session evicted from the cache keeps the
+    user logged in but loses the short-lived data, e.g. a pending OTP code.
+    """
+
+    cache_key_prefix = KEY_PREFIX
+    persistent_keys = (SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY, '_session_expiry')
+
+    def __init__(self, session_key=None):
+        self._cache = caches[settings.SESSION_CACHE_ALIAS]
+        # (session key, auth data, expire_date) of the django_session row
+        self._persisted = None
+        super().__init__(session_key)
+
+    @property
+    def cache_key(self):
+        return self.cache_key_prefix + self._get_or_create_session_key()
+
+    def get_persistent_data(self, data):
+        return {key: data[key] for key in self.persistent_keys if key in data}
+
+    def load(self):
+        try:
+            # the session data and the expire_date of its row
+            entry = self._cache.get(self.cache_key)
+        except Exception:
+            # invalid cache keys raise on some backends
+            entry = None
+        if entry is None:
+            session = self._get_session_from_db()
+            if session is None:
+                self._persisted = None
+                return {}
+            entry = (self.decode(session.session_data), session.expire_date)
+            self._cache.set(self.cache_key, entry, self.get_expiry_age(expiry=session.expire_date))
+        data, expire_date = entry
+        self._persisted = (self.session_key, self.get_persistent_data(data), expire_date)
+        return data
+
+    def exists(self, session_key):
+        # only used to pick new keys, a collision with a login evicted from
+        # the cache is as unlikely as with a live one
+        return bool(session_key) and (self.cache_key_prefix + session_key) in self._cache
+
+    def is_stored(self, persistent):
+        if self._persisted is None:
+            return False
+        session_key, stored, expire_date = self._persisted
+        if session_key != self.session_key or stored != persistent:
+            return False
+        if not persistent:
+            return True
+        # renew the row of an active login before it expires
+        return expire_date is not None and expire_date - timezone.now() > timedelta(seconds=self.get_expiry_age() / 2)
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        persistent = self.get_persistent_data(data)
+        stored = self.is_stored(persistent)
+        # the key is claimed before its row is written
+        if must_create and not self._cache.add(self.cache_key, (data, None), self.get_expiry_age()):
+            raise CreateError
+
+        if not stored:
+            self._persisted = (self.session_key, persistent, self.save_persistent_data(persistent, must_create))
+        expire_date = self._persisted[2]
+        if not must_create or expire_date is not None:
+            self._cache.set(self.cache_key, (data, expire_date), self.get_expiry_age())
+
+    def save_persistent_data(self, data, must_create):
+        if not data:
+            if not must_create:
+                self.model.objects.filter(session_key=self.session_key).delete()
+            return None
+        session = self.create_model_instance(data)
+        using = router.db_for_write(self.model, instance=session)
+        # the row exists if it was loaded or written with auth data
+        stored = self._persisted is not None and self._persisted[0] == self.session_key and self._persisted[1]
+        with transaction.atomic(using=using):
+            session.save(using=using, force_insert=not stored)
+        return session.expire_date
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self._cache.delete(self.cache_key_prefix + session_key)
+        self.model.objects.filter(session_key=session_key).delete()
+
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def aexists(self, session_key):
+        return await sync_to_async(self.exists)(session_key)
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create)
+
+    async def adelete(self, session_key=None):
+        return await sync_to_async(self.delete)(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        while delete_expired_sessions_batch(settings.SESSION_SWEEP_BATCH_SIZE) == settings.SESSION_SWEEP_BATCH_SIZE:
+            pass
+
+    @classmethod
+    async def aclear_expired(cls):
+        await sync_to_async(cls.clear_expired)()
@@ -0,0 +1,13 @@
+from django.conf import settings
+
+
+def tune_sqlite_connection(sender, connection, **kwargs):
+    """
+    connection_created receiver that applies SQLITE_PRAGMAS to new SQLite
+    connections when the SQLITE_TUNING profile is on.
+    """
+    if connection.vendor != 'sqlite' or not settings.SQLITE_TUNING:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
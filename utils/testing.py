@@ -0,0 +1,51 @@
+import logging
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+def create_user(username, **fields):
+    """
+    Create an account whose email and phone number are derived from the
+    username, with the password `password`.
+    """
+    return get_user_model().objects.create_user(**{
+        'username': username,
+        'email': f"{username}@example.com",
+        'phone_number': username,
+        'password': 'password',
+        **fields,
+    })
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Run the tests against file based caches in a temporary directory, so
+    they neither read nor clear the caches of a development server, and
+    without the request log.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_settings = override_settings(CACHES={
+            alias: {
+                'BACKEND': 'utils.caches.FileBasedCache',
+                'LOCATION': f"{self.cache_dir}/{alias}",
+            }
+            for alias in settings.CACHES
+        })
+        self.cache_settings.enable()
+        self.request_logger = logging.getLogger('project.requests')
+        self.request_log_level = self.request_logger.level
+        self.request_logger.setLevel(logging.CRITICAL)
+
+    def teardown_test_environment(self, **kwargs):
+        self.request_logger.setLevel(self.request_log_level)
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,29 @@
+from django.db import connections, router
+
+
+def insert_ignore(model, where=None, **values):
+    """
+    Insert one row with INSERT ... ON CONFLICT DO NOTHING, so a row that
+    already exists under one of the model's unique constraints is left
+    alone. With `where` the row is only inserted if that queryset has rows.
+    Returns whether a row was inserted. No signals are sent.
+    """
+    connection = connections[router.db_for_write(model)]
+    qn = connection.ops.quote_name
+    instance = model(**values)
+    fields = [field for field in model._meta.local_concrete_fields if not field.primary_key]
+
+    params = [field.get_db_prep_save(field.pre_save(instance, True), connection) for field in fields]
+    sql = (
+        f"INSERT INTO {qn(model._meta.db_table)} ({', '.join(qn(field.column) for field in fields)}) "
+        f"SELECT {', '.join(['%s'] * len(fields))}"
+    )
+    if where is not None:
+        where_sql, where_params = where.order_by().values('pk').query.sql_with_params()
+        sql += f" WHERE EXISTS ({where_sql})"
+        params.extend(where_params)
+    sql += " ON CONFLICT DO NOTHING"
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount == 1
@@ -0,0 +1,47 @@
+from accounts.models import Relation
+from posts.models import Like, Save
+
+
+def get_viewer_state(viewer, post_ids=(), user_ids=()):
+    """
+    Return the sets of liked, saved and followed ids for the given page of
+    post and user ids, with one query per relation that is asked for.
+    Unordered, so each is answered from the (user, post) unique index.
+    """
+    state = {'liked': set(), 'saved': set(), 'followed': set()}
+    if not viewer.is_authenticated:
+        return state
+
+    if post_ids:
+        state['liked'] = set(
+            Like.objects.filter(user=viewer, post_id__in=post_ids).order_by().values_list('post_id', flat=True)
+        )
+        state['saved'] = set(
+            Save.objects.filter(user=viewer, post_id__in=post_ids).order_by().values_list('post_id', flat=True)
+        )
+    if user_ids:
+        state['followed'] = set(
+            Relation.objects.filter(from_user=viewer, to_user_id__in=user_ids)
+            .order_by()
+            .values_list('to_user_id', flat=True)
+        )
+    return state
+
+
+def attach_post_viewer_state(viewer, posts):
+    posts = list(posts)
+    state = get_viewer_state(viewer, post_ids=[post.pk for post in posts])
+    for post in posts:
+        post.is_liked = post.pk in state['liked']
+        post.is_saved = post.pk in state['saved']
+    return posts
+
+
+def attach_user_viewer_state(viewer, users):
+    users = list(users)
+    others = [user.pk for user in users if user.pk != viewer.pk]
+    state = get_viewer_state(viewer, user_ids=others)
+    for user in users:
+        user.is_followed = user.pk in state['followed']
+        user.is_self = user.pk == viewer.pk
+    return users